@@ -1,10 +1,22 @@
 #!/bin/sh
+set -e
 
 echo "Esperando a que la base de datos esté lista..."
-sleep 5
+python manage.py esperar_db --timeout "${ESPERAR_DB_TIMEOUT:-60}"
 
 echo "Aplicando migraciones..."
 python manage.py migrate --noinput
 
-echo "Iniciando servidor..."
+if [ "${MODO_SERVIDOR:-desarrollo}" = "produccion" ]; then
+    echo "Iniciando gunicorn (modo producción)..."
+    # Cada worker vuelca ahí sus métricas para que /metrics las sume
+    export TAREAS_METRICAS_DIR="${TAREAS_METRICAS_DIR:-/tmp/tarea-api-metricas}"
+    if [ "${GUNICORN_ASGI:-false}" = "true" ]; then
+        export GUNICORN_WORKER_CLASS="${GUNICORN_WORKER_CLASS:-uvicorn.workers.UvicornWorker}"
+        exec gunicorn -c gunicorn.conf.py tarea_api.asgi:application
+    fi
+    exec gunicorn -c gunicorn.conf.py tarea_api.wsgi:application
+fi
+
+echo "Iniciando servidor de desarrollo..."
 exec python manage.py runserver 0.0.0.0:8000
@@ -0,0 +1,52 @@
+"""Configuración de gunicorn para ``MODO_SERVIDOR=produccion`` (ver entrypoint.sh).
+
+Todo se puede ajustar con variables de entorno; los valores por defecto
+dimensionan el pool de workers según las CPU del contenedor.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Workers pre-forkeados: 2 × CPU + 1 es el punto de partida habitual para
+# cargas que alternan CPU (expansión de recurrencias) y espera de la base de datos
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+
+if 'uvicorn' in worker_class:
+    # Bajo ASGI Django abre conexiones desde hilos distintos en cada petición:
+    # las persistentes no se reutilizan, mejor cerrarlas o usar DB_POOL
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Reciclar workers de vez en cuando acota el crecimiento de memoria; el
+# jitter evita que todos se reinicien a la vez
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+# GUNICORN_ACCESSLOG vacío desactiva el registro de accesos (prueba_carga)
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
+
+
+def on_starting(server):
+    # Los contadores de /metrics empiezan de cero en cada arranque del maestro
+    directorio = os.getenv('TAREAS_METRICAS_DIR')
+    if directorio and os.path.isdir(directorio):
+        for nombre in os.listdir(directorio):
+            if nombre.startswith('metricas-'):
+                os.remove(os.path.join(directorio, nombre))
+
+
+def child_exit(server, worker):
+    # Cada worker reciclado deja su volcado: se acumula y se borra su fichero
+    directorio = os.getenv('TAREAS_METRICAS_DIR')
+    if directorio and os.path.isdir(directorio):
+        from tarea_api.metricas import retirar_proceso
+
+        retirar_proceso(worker.pid, directorio)
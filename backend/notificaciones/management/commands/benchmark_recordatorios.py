@@ -0,0 +1,121 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notificaciones import recordatorios
+from notificaciones.models import Notificacion
+from tareas import compactas
+from tareas.models import Tarea, TareaCompletada
+from tareas.utils import generar_ocurrencias_en_rango
+from usuarios.models import Usuario
+
+
+def por_usuario(desde, hasta):
+    """Referencia ingenua: cada usuario, cada tarea expandida en la ventana."""
+    primera, ultima = recordatorios.fechas_en(desde, hasta)
+    if primera > ultima:
+        return set()
+    claves = set()
+    for usuario_id in Usuario.objects.order_by('pk').values_list('pk', flat=True):
+        completadas = defaultdict(set)
+        for tarea_id, fecha in TareaCompletada.objects.filter(
+            tarea__creado_por_id=usuario_id, fecha__range=(primera, ultima)
+        ).values_list('tarea_id', 'fecha'):
+            completadas[tarea_id].add(fecha)
+        tareas = list(Tarea.objects.filter(creado_por_id=usuario_id, activa=True))
+        if compactas.habilitadas():
+            for tarea_id, fechas in compactas.completadas_desde([t.pk for t in tareas], primera).items():
+                completadas[tarea_id].update(fechas)
+        for tarea in tareas:
+            if tarea.repeticion == 'ninguna' and tarea.estado == 'completada':
+                continue
+            for fecha in generar_ocurrencias_en_rango(tarea, primera, ultima):
+                if fecha not in completadas[tarea.pk]:
+                    claves.add((tarea.pk, fecha))
+    return claves
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el motor de recordatorios sobre todas las tareas de la base de datos (p. ej. '
+        '100.000 de generar_datos_sinteticos) frente al recorrido usuario a usuario, para varias '
+        'ventanas que empiezan en el vencimiento de mañana.  La escritura se deshace al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizontes', default='60,1440,10080', help='Minutos de cada ventana, separados por comas.'
+        )
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument(
+            '--sin-referencia', action='store_true', help='No mide el recorrido usuario a usuario.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            horizontes = [int(minutos) for minutos in options['horizontes'].split(',')]
+        except ValueError:
+            raise CommandError('--horizontes debe ser una lista de minutos, p. ej. 60,1440')
+        tareas = Tarea.objects.filter(activa=True).count()
+        if not tareas:
+            raise CommandError('No hay tareas; ejecute antes generar_datos_sinteticos.')
+
+        desde = recordatorios.vence_en(timezone.localdate() + timedelta(days=1))
+        self.stdout.write(f'{tareas} tareas activas; ventanas desde {timezone.localtime(desde):%Y-%m-%d %H:%M}.')
+        self.stdout.write(
+            f"{'horizonte':>10} {'avisos':>8} {'motor (ms)':>11} {'consultas':>10} "
+            f"{'escritura (ms)':>15} {'por usuario (ms)':>17} {'consultas':>10} {'coinciden':>10}"
+        )
+        for minutos in horizontes:
+            hasta = desde + timedelta(minutes=minutos)
+            motor, consultas, avisos = self._medir(
+                lambda: recordatorios.pendientes(desde, hasta), options['repeticiones']
+            )
+
+            with transaction.atomic():
+                inicio = time.perf_counter()
+                Notificacion.objects.bulk_create(
+                    avisos, batch_size=recordatorios.TAMANO_LOTE, ignore_conflicts=True
+                )
+                escritura = (time.perf_counter() - inicio) * 1000
+                transaction.set_rollback(True)
+
+            referencia, consultas_referencia, coinciden = None, None, '-'
+            if not options['sin_referencia']:
+                referencia, consultas_referencia, esperadas = self._medir(
+                    lambda: por_usuario(desde, hasta), 1
+                )
+                coinciden = 'sí' if esperadas == {(aviso.tarea_id, aviso.fecha) for aviso in avisos} else 'no'
+
+            self.stdout.write(
+                f'{minutos:>8}m {len(avisos):>8} {motor:>11.1f} {consultas:>10} {escritura:>15.1f} '
+                f"{_formato(referencia):>17} {_formato(consultas_referencia):>10} {coinciden:>10}"
+            )
+
+    def _medir(self, funcion, repeticiones):
+        """Mejor tiempo en ms de ``repeticiones`` llamadas, consultas y resultado de la última."""
+        mejor = None
+        for _ in range(repeticiones):
+            # Sin CaptureQueriesContext: la referencia pasa de su límite de 9000 consultas
+            consultas = []
+
+            def contar(execute, sql, params, many, context):
+                consultas.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(contar):
+                inicio = time.perf_counter()
+                resultado = funcion()
+                transcurrido = (time.perf_counter() - inicio) * 1000
+            mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+        return mejor, len(consultas), resultado
+
+
+def _formato(valor):
+    if valor is None:
+        return '-'
+    return f'{valor:.1f}' if isinstance(valor, float) else str(valor)
@@ -0,0 +1,71 @@
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from notificaciones import recordatorios
+from tareas.proxima import barrer_proximas_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Planificador de recordatorios: cada --intervalo segundos crea las notificaciones de las '
+        'ocurrencias que vencen en los próximos NOTIFICACIONES_ANTICIPACION_MINUTOS.  Cada pasada '
+        'empieza donde terminó la anterior; al cambiar la fecha local recalcula las próximas '
+        'ocurrencias vencidas.  Proceso de larga duración: termina con SIGTERM o Ctrl+C.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=60, help='Segundos entre pasadas.')
+        parser.add_argument(
+            '--anticipacion', type=int, default=None,
+            help='Minutos de antelación (por defecto NOTIFICACIONES_ANTICIPACION_MINUTOS).',
+        )
+        parser.add_argument(
+            '--recuperar', type=int, default=0,
+            help='Minutos hacia atrás que cubre la primera pasada, p. ej. tras una parada.',
+        )
+        parser.add_argument('--una-vez', action='store_true', help='Una sola pasada y termina.')
+
+    def handle(self, *args, **options):
+        anticipacion = (
+            recordatorios.anticipacion()
+            if options['anticipacion'] is None
+            else timedelta(minutes=options['anticipacion'])
+        )
+        parar = threading.Event()
+        if not options['una_vez']:
+            signal.signal(signal.SIGTERM, lambda *_: parar.set())
+
+        desde = timezone.now() - timedelta(minutes=options['recuperar'])
+        barrido = None
+        try:
+            while not parar.is_set():
+                close_old_connections()
+                ahora = timezone.now()
+                hasta = ahora + anticipacion
+                try:
+                    hoy = timezone.localdate(ahora)
+                    if hoy != barrido:
+                        barrer_proximas_vencidas(hoy)
+                        barrido = hoy
+                    creadas = recordatorios.despachar(desde, hasta, hoy)
+                except DatabaseError as error:
+                    # Se reintenta la misma ventana en la siguiente pasada
+                    self.stderr.write(f'{ahora:%Y-%m-%d %H:%M:%S} error de base de datos: {error}')
+                else:
+                    if creadas:
+                        self.stdout.write(
+                            f'{ahora:%Y-%m-%d %H:%M:%S} {creadas} recordatorios '
+                            f'(vencen antes de {timezone.localtime(hasta):%Y-%m-%d %H:%M}).'
+                        )
+                    desde = hasta
+                if options['una_vez']:
+                    break
+                parar.wait(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Despachador detenido.'))
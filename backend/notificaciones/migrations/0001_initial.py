@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tareas', '0014_completadas_mes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notificacion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('vence_en', models.DateTimeField()),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('leida_en', models.DateTimeField(blank=True, null=True)),
+                ('tarea', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to='tareas.tarea')),
+                ('usuario', models.ForeignKey(db_column='usuario_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notificaciones',
+                'ordering': ['-vence_en', '-id'],
+                'indexes': [models.Index(fields=['usuario', 'vence_en'], name='notificaciones_usuario_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tarea', 'fecha'), name='notificaciones_ocurrencia_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import models
+
+from tareas.models import Tarea
+from usuarios.models import Usuario
+
+
+class Notificacion(models.Model):
+    """Recordatorio de una ocurrencia que vence, escrito por ``notificaciones.recordatorios``."""
+
+    id = models.BigAutoField(primary_key=True)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='notificaciones',
+        db_column='usuario_id',
+        db_index=False,
+    )
+    tarea = models.ForeignKey(
+        Tarea, on_delete=models.CASCADE, related_name='notificaciones', db_index=False
+    )
+    # Día de la ocurrencia y momento en que vence
+    fecha = models.DateField()
+    vence_en = models.DateTimeField()
+    creada_en = models.DateTimeField(auto_now_add=True)
+    leida_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'notificaciones'
+        ordering = ['-vence_en', '-id']
+        constraints = [
+            # Una por ocurrencia: repetir una ventana del despachador no duplica
+            models.UniqueConstraint(fields=['tarea', 'fecha'], name='notificaciones_ocurrencia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'vence_en'], name='notificaciones_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea_id} vence {self.vence_en}"
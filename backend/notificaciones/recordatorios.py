@@ -0,0 +1,146 @@
+"""Motor de recordatorios: ocurrencias de todos los usuarios que vencen pronto.
+
+La ocurrencia del día ``fecha`` vence a la hora local
+``NOTIFICACIONES_HORA_VENCIMIENTO`` de ese día.  El motor no recorre usuarios
+ni expande todas sus tareas: parte de ``Tarea.proxima_ocurrencia`` (la primera
+ocurrencia no completada desde hoy, con el índice ``tareas_proxima_idx``) y
+solo lee las tareas cuya próxima ocurrencia cae entre hoy y el final de la
+ventana.  Esas se expanden en una mezcla ordenada por vencimiento
+(``iterar_ocurrencias_ordenadas``) y, si tienen más de una ocurrencia en la
+ventana, las completadas posteriores a la próxima se descartan con una
+consulta por lote.
+
+``proxima_ocurrencia`` se recalcula al escribir y con el barrido diario
+(``barrer_proximas_vencidas``), que ``despachar_recordatorios`` lanza cada vez
+que cambia la fecha local.  Las notificaciones se escriben con
+``bulk_create``; la restricción única por ocurrencia hace que repetir una
+ventana no duplique nada.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from tareas import compactas
+from tareas.models import Tarea, TareaCompletada
+from tareas.utils import iterar_ocurrencias_ordenadas
+
+from .models import Notificacion
+
+
+TAMANO_LOTE = 500
+CAMPOS_TAREA = (
+    'id_tarea',
+    'creado_por',
+    'fecha_entrega',
+    'repeticion',
+    'intervalo_repeticion',
+    'fecha_fin_repeticion',
+    'proxima_ocurrencia',
+)
+
+
+def hora_vencimiento() -> time:
+    return time(getattr(settings, 'NOTIFICACIONES_HORA_VENCIMIENTO', 9))
+
+
+def anticipacion() -> timedelta:
+    return timedelta(minutes=getattr(settings, 'NOTIFICACIONES_ANTICIPACION_MINUTOS', 60))
+
+
+def vence_en(fecha: date) -> datetime:
+    return timezone.make_aware(datetime.combine(fecha, hora_vencimiento()))
+
+
+def fechas_en(desde: datetime, hasta: datetime) -> Tuple[date, date]:
+    """Primera y última fecha cuyas ocurrencias vencen en ``[desde, hasta)``.
+
+    Si ninguna vence en la ventana la primera es posterior a la última.
+    """
+    desfase = datetime.combine(date.min, hora_vencimiento()) - datetime.min
+    primera = (timezone.localtime(desde) - desfase).date()
+    if vence_en(primera) < desde:
+        primera += timedelta(days=1)
+    ultima = (timezone.localtime(hasta) - desfase).date()
+    if vence_en(ultima) >= hasta:
+        ultima -= timedelta(days=1)
+    return primera, ultima
+
+
+def _completadas(tareas: Iterable[Tarea], desde: date, hasta: date) -> Set[Tuple[int, date]]:
+    """Ocurrencias ``(tarea_id, fecha)`` completadas de ``tareas`` en ``[desde, hasta]``."""
+    ids = [tarea.pk for tarea in tareas]
+    completadas: Set[Tuple[int, date]] = set()
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        lote = ids[inicio:inicio + TAMANO_LOTE]
+        completadas.update(
+            TareaCompletada.objects.filter(tarea_id__in=lote, fecha__range=(desde, hasta))
+            .order_by()
+            .values_list('tarea_id', 'fecha')
+        )
+        if compactas.habilitadas():
+            for tarea_id, fechas in compactas.completadas_desde(lote, desde).items():
+                completadas.update((tarea_id, fecha) for fecha in fechas if fecha <= hasta)
+    return completadas
+
+
+def pendientes(desde: datetime, hasta: datetime, hoy: Optional[date] = None) -> List[Notificacion]:
+    """Notificaciones sin guardar de las ocurrencias no completadas que vencen en ``[desde, hasta)``.
+
+    Ordenadas por vencimiento y, a igual vencimiento, por tarea.  Las
+    ocurrencias anteriores a la próxima de su tarea se consideran resueltas.
+    """
+    primera, ultima = fechas_en(desde, hasta)
+    if primera > ultima:
+        return []
+    hoy = hoy or timezone.localdate()
+
+    # Una tarea con la próxima ocurrencia hoy también vence mañana si es diaria
+    tareas = list(
+        Tarea.objects.filter(
+            activa=True,
+            creado_por__isnull=False,
+            proxima_ocurrencia__range=(min(hoy, primera), ultima),
+        ).only(*CAMPOS_TAREA)
+    )
+    # Solo las recurrentes cuya próxima es anterior a la última fecha pueden
+    # tener en la ventana ocurrencias posteriores ya completadas
+    completadas = _completadas(
+        [
+            tarea
+            for tarea in tareas
+            if tarea.repeticion != 'ninguna' and tarea.proxima_ocurrencia < ultima
+        ],
+        primera,
+        ultima,
+    )
+
+    vencimientos = {}
+    notificaciones = []
+    for fecha, tarea in iterar_ocurrencias_ordenadas(tareas, primera, ultima):
+        if fecha < tarea.proxima_ocurrencia or (tarea.pk, fecha) in completadas:
+            continue
+        if fecha not in vencimientos:
+            vencimientos[fecha] = vence_en(fecha)
+        notificaciones.append(
+            Notificacion(
+                usuario_id=tarea.creado_por_id,
+                tarea=tarea,
+                fecha=fecha,
+                vence_en=vencimientos[fecha],
+            )
+        )
+    return notificaciones
+
+
+def despachar(desde: datetime, hasta: datetime, hoy: Optional[date] = None) -> int:
+    """Escribe las notificaciones de ``pendientes(desde, hasta)``.
+
+    Devuelve cuántas había pendientes; las que ya existían se ignoran al insertar.
+    """
+    notificaciones = pendientes(desde, hasta, hoy)
+    Notificacion.objects.bulk_create(notificaciones, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+    return len(notificaciones)
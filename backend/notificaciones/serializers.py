@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import Notificacion
+
+
+class NotificacionSerializer(serializers.ModelSerializer):
+    titulo = serializers.CharField(source='tarea.titulo', read_only=True)
+
+    class Meta:
+        model = Notificacion
+        fields = ('id', 'tarea', 'titulo', 'fecha', 'vence_en', 'creada_en', 'leida_en')
+        read_only_fields = fields
@@ -0,0 +1,227 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tareas import sinteticos
+from tareas.estados import aplicar_estado
+from tareas.models import Tarea
+from tareas.proxima import actualizar_proxima_ocurrencia
+from usuarios.models import Usuario
+
+from . import recordatorios
+from .models import Notificacion
+
+
+@override_settings(NOTIFICACIONES_HORA_VENCIMIENTO=9)
+class RecordatoriosTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='recordatorios@example.com',
+            nombre='Recordatorios',
+            password='testpass123',
+        )
+        self.hoy = timezone.localdate()
+        self.manana = self.hoy + timedelta(days=1)
+        self.diaria = Tarea.objects.create(
+            titulo='Diaria', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=3), creado_por=self.usuario,
+        )
+        self.unica = Tarea.objects.create(
+            titulo='Única', categoria='trabajo', fecha_entrega=self.manana, creado_por=self.usuario,
+        )
+        self.semanal = Tarea.objects.create(
+            titulo='Semanal', categoria='estudio', repeticion='semanal',
+            fecha_entrega=self.hoy + timedelta(days=3), creado_por=self.usuario,
+        )
+        # Ninguna de estas debe avisar
+        Tarea.objects.create(
+            titulo='Hecha', categoria='trabajo', estado='completada',
+            fecha_entrega=self.manana, creado_por=self.usuario,
+        )
+        Tarea.objects.create(
+            titulo='Inactiva', categoria='personal', repeticion='diaria', activa=False,
+            fecha_entrega=self.hoy, creado_por=self.usuario,
+        )
+
+    def _ventana(self, fecha, dias=0):
+        vence = recordatorios.vence_en(fecha)
+        return vence - timedelta(minutes=1), vence + timedelta(days=dias, minutes=1)
+
+    def _claves(self, notificaciones):
+        return [(notificacion.tarea_id, notificacion.fecha) for notificacion in notificaciones]
+
+    def test_fechas_de_una_ventana(self):
+        """Test para verificar que la ventana es semiabierta respecto al vencimiento"""
+        vence = recordatorios.vence_en(self.manana)
+        self.assertEqual(timezone.localtime(vence).hour, 9)
+        self.assertEqual(recordatorios.fechas_en(vence, vence + timedelta(minutes=1)), (self.manana, self.manana))
+        primera, ultima = recordatorios.fechas_en(vence - timedelta(hours=1), vence)
+        self.assertGreater(primera, ultima)
+        self.assertEqual(
+            recordatorios.fechas_en(vence, vence + timedelta(days=2)),
+            (self.manana, self.manana + timedelta(days=1)),
+        )
+
+    def test_pendientes_de_manana(self):
+        """Test para verificar qué ocurrencias vencen mañana y que las completadas no avisan"""
+        desde, hasta = self._ventana(self.manana)
+        with self.assertNumQueries(2):
+            notificaciones = recordatorios.pendientes(desde, hasta)
+        self.assertEqual(
+            self._claves(notificaciones),
+            [(self.diaria.id_tarea, self.manana), (self.unica.id_tarea, self.manana)],
+        )
+        self.assertEqual(notificaciones[0].usuario_id, self.usuario.pk)
+        self.assertEqual(notificaciones[0].vence_en, recordatorios.vence_en(self.manana))
+
+        aplicar_estado(self.diaria, self.manana, 'completada')
+        self.assertEqual(
+            self._claves(recordatorios.pendientes(desde, hasta)), [(self.unica.id_tarea, self.manana)]
+        )
+
+    def test_solo_lee_tareas_con_la_proxima_en_la_ventana(self):
+        """Test para verificar que una tarea cuya próxima ocurrencia es posterior no se expande"""
+        aplicar_estado(self.diaria, self.hoy, 'completada')
+        aplicar_estado(self.diaria, self.manana, 'completada')
+        actualizar_proxima_ocurrencia(self.diaria)
+        self.assertEqual(self.diaria.proxima_ocurrencia, self.manana + timedelta(days=1))
+
+        desde, hasta = self._ventana(self.manana)
+        # Sin tareas con más de una ocurrencia en la ventana no hace falta consultar completadas
+        with self.assertNumQueries(1):
+            notificaciones = recordatorios.pendientes(desde, hasta)
+        self.assertEqual(self._claves(notificaciones), [(self.unica.id_tarea, self.manana)])
+
+    def test_ventana_de_una_semana(self):
+        """Test para verificar el orden por vencimiento y las ocurrencias posteriores a la próxima"""
+        aplicar_estado(self.diaria, self.hoy + timedelta(days=4), 'completada')
+        desde, hasta = self._ventana(self.manana, dias=6)
+
+        claves = self._claves(recordatorios.pendientes(desde, hasta))
+
+        diarias = [
+            (self.diaria.id_tarea, self.manana + timedelta(days=dias))
+            for dias in range(7)
+            if dias != 3
+        ]
+        esperadas = sorted(
+            diarias + [(self.unica.id_tarea, self.manana), (self.semanal.id_tarea, self.semanal.fecha_entrega)],
+            key=lambda clave: (clave[1], clave[0]),
+        )
+        self.assertEqual(claves, esperadas)
+
+    def test_despachar_no_duplica(self):
+        """Test para verificar que repetir una ventana no escribe notificaciones nuevas"""
+        desde, hasta = self._ventana(self.manana)
+        recordatorios.despachar(desde, hasta)
+        recordatorios.despachar(desde, hasta)
+
+        self.assertEqual(Notificacion.objects.count(), 2)
+        self.assertEqual(set(Notificacion.objects.values_list('usuario_id', flat=True)), {self.usuario.pk})
+
+    def test_comando_una_pasada(self):
+        """Test para verificar que el despachador crea los avisos de su anticipación y es idempotente"""
+        salida = StringIO()
+        call_command('despachar_recordatorios', una_vez=True, anticipacion=2 * 24 * 60, stdout=salida)
+
+        self.assertIn('Despachador detenido', salida.getvalue())
+        self.assertTrue(Notificacion.objects.filter(tarea=self.unica, fecha=self.manana).exists())
+        self.assertTrue(Notificacion.objects.filter(tarea=self.diaria, fecha=self.manana).exists())
+        self.assertFalse(Notificacion.objects.filter(tarea=self.semanal).exists())
+
+        total = Notificacion.objects.count()
+        call_command('despachar_recordatorios', una_vez=True, anticipacion=2 * 24 * 60, stdout=StringIO())
+        self.assertEqual(Notificacion.objects.count(), total)
+
+    def test_benchmark_y_borrado_de_sinteticos(self):
+        """Test para verificar que el benchmark coincide con la referencia y no deja notificaciones"""
+        sinteticos.generar(sinteticos.Configuracion(usuarios=3, tareas_por_usuario=10, dias_historia=30, semilla=5))
+        salida = StringIO()
+
+        call_command('benchmark_recordatorios', horizontes='60,10080', repeticiones=1, stdout=salida)
+
+        lineas = salida.getvalue().splitlines()
+        self.assertTrue(lineas[-1].endswith('sí'))
+        self.assertTrue(lineas[-2].endswith('sí'))
+        self.assertFalse(Notificacion.objects.exists())
+
+        desde, hasta = self._ventana(self.manana, dias=6)
+        recordatorios.despachar(desde, hasta)
+        sinteticos.borrar()
+        self.assertEqual(
+            set(Notificacion.objects.values_list('usuario_id', flat=True)), {self.usuario.pk}
+        )
+
+
+class NotificacionesAPITestCase(APITestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='avisos@example.com',
+            nombre='Avisos',
+            password='testpass123',
+        )
+        otro = Usuario.objects.create_user(
+            email='otro@example.com',
+            nombre='Otro',
+            password='testpass123',
+        )
+        hoy = timezone.localdate()
+        tarea = Tarea.objects.create(
+            titulo='Diaria', categoria='personal', repeticion='diaria',
+            fecha_entrega=hoy, creado_por=self.usuario,
+        )
+        ajena = Tarea.objects.create(
+            titulo='Ajena', categoria='personal', fecha_entrega=hoy, creado_por=otro,
+        )
+        self.notificaciones = [
+            Notificacion.objects.create(
+                usuario=self.usuario,
+                tarea=tarea,
+                fecha=hoy + timedelta(days=dias),
+                vence_en=recordatorios.vence_en(hoy + timedelta(days=dias)),
+            )
+            for dias in range(3)
+        ]
+        Notificacion.objects.create(usuario=otro, tarea=ajena, fecha=hoy, vence_en=recordatorios.vence_en(hoy))
+        self.client.force_authenticate(user=self.usuario)
+
+    def test_listar_notificaciones(self):
+        """Test para verificar que se listan solo las del usuario, de la más tardía a la más temprana"""
+        respuesta = self.client.get('/api/notificaciones/')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['count'], 3)
+        self.assertEqual(
+            [item['id'] for item in respuesta.data['results']],
+            [notificacion.id for notificacion in reversed(self.notificaciones)],
+        )
+        self.assertEqual(respuesta.data['results'][0]['titulo'], 'Diaria')
+
+    def test_marcar_leidas(self):
+        """Test para verificar que se marcan como leídas por ids o todas"""
+        respuesta = self.client.post(
+            '/api/notificaciones/leer/', {'ids': [self.notificaciones[0].id]}, format='json'
+        )
+        self.assertEqual(respuesta.data, {'leidas': 1})
+
+        no_leidas = self.client.get('/api/notificaciones/', {'no_leidas': 1}).data
+        self.assertEqual(no_leidas['count'], 2)
+
+        self.assertEqual(self.client.post('/api/notificaciones/leer/', {}, format='json').data, {'leidas': 2})
+        self.assertEqual(Notificacion.objects.filter(leida_en__isnull=True).count(), 1)
+
+        respuesta = self.client.post('/api/notificaciones/leer/', {'ids': 'todas'}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requiere_autenticacion(self):
+        """Test para verificar que sin autenticación no se accede a las notificaciones"""
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/notificaciones/').status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import LeerNotificacionesAPIView, NotificacionListAPIView
+
+urlpatterns = [
+    path('', NotificacionListAPIView.as_view(), name='notificaciones'),
+    path('leer/', LeerNotificacionesAPIView.as_view(), name='notificaciones-leer'),
+]
@@ -0,0 +1,45 @@
+from django.utils import timezone
+from rest_framework import generics, permissions, status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Notificacion
+from .serializers import NotificacionSerializer
+
+
+class NotificacionPaginacion(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 200
+
+
+class NotificacionListAPIView(generics.ListAPIView):
+    """Notificaciones del usuario, de la que vence más tarde a la más temprana.
+
+    ``?no_leidas=1`` deja solo las que no se han marcado como leídas.
+    """
+
+    serializer_class = NotificacionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificacionPaginacion
+
+    def get_queryset(self):
+        notificaciones = Notificacion.objects.filter(usuario=self.request.user).select_related('tarea')
+        if self.request.query_params.get('no_leidas') in ('1', 'true'):
+            notificaciones = notificaciones.filter(leida_en__isnull=True)
+        return notificaciones
+
+
+class LeerNotificacionesAPIView(APIView):
+    """Marca como leídas las notificaciones de ``ids`` o, sin ``ids``, todas las del usuario."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        notificaciones = Notificacion.objects.filter(usuario=request.user, leida_en__isnull=True)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(id_, int) for id_ in ids):
+                return Response({'error': 'ids debe ser una lista de enteros'}, status=status.HTTP_400_BAD_REQUEST)
+            notificaciones = notificaciones.filter(pk__in=ids)
+        return Response({'leidas': notificaciones.update(leida_en=timezone.now())})
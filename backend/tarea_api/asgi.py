@@ -0,0 +1,27 @@
+"""
+ASGI config for tarea_api project.
+
+Las peticiones ASGI se resuelven con ``tarea_api.urls_asgi``, que sirve las
+lecturas de ocurrencias con vistas asíncronas; el resto de rutas son las
+mismas que bajo WSGI.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tarea_api.settings')
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+
+class TareasASGIHandler(ASGIHandler):
+    def create_request(self, scope, body_file):
+        request, error = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.TAREAS_ASGI_URLCONF
+        return request, error
+
+
+django.setup(set_prefix=False)
+application = TareasASGIHandler()
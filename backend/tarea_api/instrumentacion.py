@@ -0,0 +1,182 @@
+"""Instrumentación por petición: consultas, tiempo de base de datos y de Python.
+
+Con ``TAREAS_INSTRUMENTACION`` cada respuesta lleva una cabecera
+``Server-Timing`` y se escribe una línea JSON en el logger
+``tarea_api.instrumentacion``; las peticiones que superan
+``TAREAS_INSTRUMENTACION_LENTA_MS`` registran además sus sentencias más lentas.
+Con ``TAREAS_METRICAS`` la misma medición alimenta ``tarea_api.metricas``.  Sin
+ninguna de las dos el middleware lanza ``MiddlewareNotUsed`` y Django ni
+siquiera lo incluye en la cadena.
+
+La medición en curso vive en una ``ContextVar``: ``sync_to_async`` la copia a
+los hilos donde se ejecutan las consultas de las vistas asíncronas, y fuera de
+una petición medida ``contar`` y el envoltorio de consultas no hacen nada.
+"""
+import heapq
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metricas
+
+
+logger = logging.getLogger(__name__)
+
+_medicion: ContextVar[Optional['Medicion']] = ContextVar('tareas_medicion', default=None)
+
+
+class Medicion:
+    def __init__(self, sentencias_lentas: int):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.contadores: Dict[str, int] = {}
+        # (caché, 'acierto' | 'fallo') -> lecturas
+        self.caches: Dict[Tuple[str, str], int] = {}
+        self._limite = sentencias_lentas
+        # Montículo de mínimos con las ``_limite`` sentencias más lentas
+        self._lentas: List[Tuple[float, int, str]] = []
+
+    def registrar_consulta(self, sql: str, duracion: float) -> None:
+        self.consultas += 1
+        self.tiempo_db += duracion
+        entrada = (duracion, self.consultas, sql)
+        if len(self._lentas) < self._limite:
+            heapq.heappush(self._lentas, entrada)
+        elif self._lentas and duracion > self._lentas[0][0]:
+            heapq.heapreplace(self._lentas, entrada)
+
+    def sentencias_lentas(self) -> List[Tuple[float, str]]:
+        return [(duracion, sql) for duracion, _, sql in sorted(self._lentas, reverse=True)]
+
+
+def contar(nombre: str, cantidad: int = 1) -> None:
+    """Suma ``cantidad`` al contador ``nombre`` de la petición medida, si la hay."""
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.contadores[nombre] = medicion.contadores.get(nombre, 0) + cantidad
+
+
+def contar_cache(cache: str, aciertos: int, fallos: int = 0) -> None:
+    """Anota lecturas de ``cache`` en la petición medida, si la hay."""
+    medicion = _medicion.get()
+    if medicion is None:
+        return
+    for resultado, cantidad in (('acierto', aciertos), ('fallo', fallos)):
+        if cantidad:
+            clave = (cache, resultado)
+            medicion.caches[clave] = medicion.caches.get(clave, 0) + cantidad
+
+
+def _envoltorio_consultas(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+def _instalar(connection, **kwargs) -> None:
+    if _envoltorio_consultas not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_envoltorio_consultas)
+
+
+def cabecera_server_timing(medicion: Medicion, total: float) -> str:
+    metricas = [
+        f'db;dur={medicion.tiempo_db * 1000:.1f};desc="{medicion.consultas} consultas"',
+        f'app;dur={max(total - medicion.tiempo_db, 0) * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    metricas += [f'{nombre};desc="{valor}"' for nombre, valor in sorted(medicion.contadores.items())]
+    return ', '.join(metricas)
+
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.cabeceras = getattr(settings, 'TAREAS_INSTRUMENTACION', False)
+        self.metricas = metricas.habilitadas()
+        if not self.cabeceras and not self.metricas:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.umbral_lenta = getattr(settings, 'TAREAS_INSTRUMENTACION_LENTA_MS', 500) / 1000
+        self.sentencias_lentas = getattr(settings, 'TAREAS_INSTRUMENTACION_SENTENCIAS', 5)
+
+        # Las conexiones nuevas (de cualquier hilo) y las que ya estén abiertas
+        connection_created.connect(_instalar, dispatch_uid='tarea_api.instrumentacion')
+        for connection in connections.all(initialized_only=True):
+            _instalar(connection)
+
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        medicion = Medicion(self.sentencias_lentas)
+        marca = _medicion.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(marca)
+        return self._terminar(request, response, medicion)
+
+    async def __acall__(self, request):
+        medicion = Medicion(self.sentencias_lentas)
+        marca = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(marca)
+        return self._terminar(request, response, medicion)
+
+    def _terminar(self, request, response, medicion: Medicion):
+        # El cuerpo de las respuestas en streaming se genera después: no entra en la medición
+        total = time.perf_counter() - medicion.inicio
+        if self.metricas:
+            metricas.registrar_peticion(request, response, medicion, total)
+        if not self.cabeceras:
+            return response
+
+        response['Server-Timing'] = cabecera_server_timing(medicion, total)
+
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(medicion.tiempo_db * 1000, 2),
+            'python_ms': round(max(total - medicion.tiempo_db, 0) * 1000, 2),
+            'consultas': medicion.consultas,
+            **medicion.contadores,
+        }
+        logger.info(json.dumps(datos, ensure_ascii=False))
+        if total >= self.umbral_lenta:
+            logger.warning(
+                json.dumps(
+                    {
+                        **datos,
+                        'lenta': True,
+                        'sentencias': [
+                            {'ms': round(duracion * 1000, 2), 'sql': sql}
+                            for duracion, sql in medicion.sentencias_lentas()
+                        ],
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return response
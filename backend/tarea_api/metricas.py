@@ -0,0 +1,315 @@
+"""Registro de métricas en proceso, expuesto en formato de texto de Prometheus.
+
+Con ``TAREAS_METRICAS`` el middleware de ``tarea_api.instrumentacion`` anota
+cada petición (latencia por ruta, consultas, tareas cargadas, ocurrencias
+expandidas, cortes por ``MAX_OCCURRENCIAS_SEGURIDAD`` y aciertos de las
+cachés) y ``GET /metrics`` devuelve el resultado.  La ruta solo responde a
+las direcciones de ``INTERNAL_IPS`` (sin ``X-Forwarded-For``: una petición que
+llega por un proxy local no es local) o a quien envíe el token de
+``TAREAS_METRICAS_TOKEN``; para los demás no existe.
+
+Todos los valores son sumables (los histogramas se guardan como sus
+contadores ``_bucket``, ``_sum`` y ``_count``), así que agregar procesos es
+sumar.  Con ``TAREAS_METRICAS_DIR`` cada worker vuelca sus valores a
+``<dir>/metricas-<pid>.json`` como mucho cada
+``TAREAS_METRICAS_VOLCADO_SEGUNDOS`` y la lectura suma todos los ficheros; sin
+él las métricas son solo del proceso que atiende.  Cuando un worker termina
+(gunicorn los recicla tras ``max_requests``), el maestro suma sus valores a
+``metricas-retirados.json`` y borra su fichero (``retirar_proceso``, desde el
+hook ``child_exit``): los contadores no retroceden y el directorio no crece.
+Todo se borra al arrancar el servidor (``limpiar_directorio``).
+"""
+import atexit
+import glob
+import hmac
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+RETIRADOS = 'metricas-retirados.json'
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CANTIDAD = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+# nombre -> (tipo, ayuda, buckets)
+DEFINICIONES = {
+    'tarea_api_peticion_segundos': (
+        'histogram', 'Duración de las peticiones por ruta.', BUCKETS_SEGUNDOS,
+    ),
+    'tarea_api_peticiones_total': ('counter', 'Peticiones atendidas por ruta y estado.', None),
+    'tarea_api_consultas_por_peticion': (
+        'histogram', 'Consultas SQL por petición.', BUCKETS_CANTIDAD,
+    ),
+    'tarea_api_db_segundos_total': ('counter', 'Tiempo en la base de datos por ruta.', None),
+    'tarea_api_tareas_por_peticion': (
+        'histogram', 'Tareas cargadas de la base de datos por petición.', BUCKETS_CANTIDAD,
+    ),
+    'tarea_api_ocurrencias_expandidas_total': (
+        'counter', 'Ocurrencias expandidas por ruta.', None,
+    ),
+    'tarea_api_cortes_max_ocurrencias_total': (
+        'counter', 'Expansiones cortadas por MAX_OCCURRENCIAS_SEGURIDAD.', None,
+    ),
+    'tarea_api_cache_total': (
+        'counter', 'Lecturas de caché por caché y resultado (acierto o fallo).', None,
+    ),
+}
+
+
+def habilitadas() -> bool:
+    return getattr(settings, 'TAREAS_METRICAS', False)
+
+
+def _directorio() -> Optional[str]:
+    return getattr(settings, 'TAREAS_METRICAS_DIR', None) or None
+
+
+class Registro:
+    def __init__(self):
+        self._cerrojo = threading.Lock()
+        self._valores: Dict[Tuple[str, Etiquetas], float] = defaultdict(float)
+        self._ultimo_volcado = 0.0
+
+    def reiniciar(self) -> None:
+        with self._cerrojo:
+            self._valores.clear()
+            self._ultimo_volcado = 0.0
+
+    def incrementar(self, nombre: str, cantidad: float = 1, **etiquetas) -> None:
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._cerrojo:
+            self._valores[clave] += cantidad
+
+    def observar(self, nombre: str, valor: float, **etiquetas) -> None:
+        base = tuple(sorted(etiquetas.items()))
+        buckets = DEFINICIONES[nombre][2]
+        with self._cerrojo:
+            for limite in buckets:
+                if valor <= limite:
+                    self._valores[(f'{nombre}_bucket', base + (('le', _numero(limite)),))] += 1
+            self._valores[(f'{nombre}_bucket', base + (('le', '+Inf'),))] += 1
+            self._valores[(f'{nombre}_sum', base)] += valor
+            self._valores[(f'{nombre}_count', base)] += 1
+
+    def valores(self) -> Dict[Tuple[str, Etiquetas], float]:
+        with self._cerrojo:
+            return dict(self._valores)
+
+    def volcar(self, forzar: bool = False) -> None:
+        """Escribe los valores del proceso en su fichero, si hay directorio."""
+        directorio = _directorio()
+        if directorio is None:
+            return
+        ahora = time.monotonic()
+        intervalo = getattr(settings, 'TAREAS_METRICAS_VOLCADO_SEGUNDOS', 5)
+        if not forzar and ahora - self._ultimo_volcado < intervalo:
+            return
+        self._ultimo_volcado = ahora
+
+        _escribir(_fichero(directorio, os.getpid()), _filas(self.valores()))
+
+
+registro = Registro()
+# Un worker recién forkeado no debe volver a contar lo del proceso padre
+os.register_at_fork(after_in_child=registro.reiniciar)
+
+
+@atexit.register
+def _volcar_al_salir() -> None:
+    try:
+        registro.volcar(forzar=True)
+    except Exception:  # pragma: no cover - el proceso está terminando
+        pass
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def _fichero(directorio: str, pid: int) -> str:
+    return os.path.join(directorio, f'metricas-{pid}.json')
+
+
+def _filas(valores: Dict[Tuple[str, Etiquetas], float]) -> list:
+    return [[nombre, list(etiquetas), valor] for (nombre, etiquetas), valor in valores.items()]
+
+
+def _sumar(total: Dict[Tuple[str, Etiquetas], float], filas: list) -> None:
+    for nombre, etiquetas, valor in filas:
+        total[(nombre, tuple(tuple(par) for par in etiquetas))] += valor
+
+
+def _leer(ruta: str):
+    try:
+        with open(ruta) as fichero:
+            return json.load(fichero)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir(destino: str, datos) -> None:
+    directorio = os.path.dirname(destino)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as fichero:
+        json.dump(datos, fichero)
+    # Reemplazo atómico: quien lee nunca ve un fichero a medias
+    os.replace(temporal, destino)
+
+
+def retirar_proceso(pid: int, directorio: Optional[str] = None) -> None:
+    """Suma el volcado de un worker terminado a ``RETIRADOS`` y borra su fichero.
+
+    ``RETIRADOS`` anota también los pids sumados cuyo fichero aún no se ha
+    borrado, para que ``agregados`` no los cuente dos veces entre la escritura
+    y el borrado.
+    """
+    directorio = directorio or _directorio()
+    if directorio is None:
+        return
+    filas = _leer(_fichero(directorio, pid))
+    if filas is None:
+        return
+
+    anterior = _leer(os.path.join(directorio, RETIRADOS)) or {'pids': [], 'valores': []}
+    total: Dict[Tuple[str, Etiquetas], float] = defaultdict(float)
+    _sumar(total, anterior['valores'])
+    _sumar(total, filas)
+    pids = [otro for otro in anterior['pids'] if os.path.exists(_fichero(directorio, otro))] + [pid]
+    _escribir(os.path.join(directorio, RETIRADOS), {'pids': pids, 'valores': _filas(total)})
+    for otro in pids:
+        try:
+            os.remove(_fichero(directorio, otro))
+        except FileNotFoundError:
+            pass
+
+
+def limpiar_directorio(directorio: Optional[str] = None) -> None:
+    directorio = directorio or _directorio()
+    if directorio is None:
+        return
+    for ruta in glob.glob(os.path.join(directorio, 'metricas-*.json')):
+        os.remove(ruta)
+
+
+def agregados() -> Dict[Tuple[str, Etiquetas], float]:
+    """Suma de todos los procesos (o solo este, sin ``TAREAS_METRICAS_DIR``)."""
+    directorio = _directorio()
+    if directorio is None:
+        return registro.valores()
+
+    registro.volcar(forzar=True)
+    retirados_ruta = os.path.join(directorio, RETIRADOS)
+    volcados = {
+        ruta: _leer(ruta)
+        for ruta in glob.glob(os.path.join(directorio, 'metricas-*.json'))
+        if ruta != retirados_ruta
+    }
+    # Después de los volcados: un worker retirado entre medias aparece en ``pids``
+    retirados = _leer(retirados_ruta) or {'pids': [], 'valores': []}
+    sumados = {_fichero(directorio, pid) for pid in retirados['pids']}
+
+    total: Dict[Tuple[str, Etiquetas], float] = defaultdict(float)
+    _sumar(total, retirados['valores'])
+    for ruta, filas in volcados.items():
+        if filas is not None and ruta not in sumados:
+            _sumar(total, filas)
+    return total
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _base(nombre: str) -> str:
+    for sufijo in ('_bucket', '_sum', '_count'):
+        if nombre.endswith(sufijo) and nombre[: -len(sufijo)] in DEFINICIONES:
+            return nombre[: -len(sufijo)]
+    return nombre
+
+
+def _orden(item):
+    (nombre, etiquetas), _ = item
+    # Los buckets de un histograma van en orden creciente de ``le``
+    le = dict(etiquetas).get('le')
+    return (
+        _base(nombre),
+        [par for par in etiquetas if par[0] != 'le'],
+        nombre,
+        math.inf if le == '+Inf' else float(le or 0),
+    )
+
+
+def texto_prometheus(valores: Dict[Tuple[str, Etiquetas], float]) -> str:
+    lineas = []
+    anterior = None
+    for (nombre, etiquetas), valor in sorted(valores.items(), key=_orden):
+        base = _base(nombre)
+        if base != anterior:
+            anterior = base
+            if base in DEFINICIONES:
+                tipo, ayuda, _ = DEFINICIONES[base]
+                lineas += [f'# HELP {base} {ayuda}', f'# TYPE {base} {tipo}']
+        texto = ','.join(f'{clave}="{_escapar(str(dato))}"' for clave, dato in etiquetas)
+        lineas.append(f'{nombre}{{{texto}}} {_numero(valor)}' if texto else f'{nombre} {_numero(valor)}')
+    return '\n'.join(lineas) + '\n'
+
+
+def ruta_de(request) -> str:
+    coincidencia = getattr(request, 'resolver_match', None)
+    return coincidencia.view_name if coincidencia is not None else 'sin_ruta'
+
+
+def registrar_peticion(request, response, medicion, total: float) -> None:
+    ruta = ruta_de(request)
+    registro.observar('tarea_api_peticion_segundos', total, ruta=ruta, metodo=request.method)
+    registro.incrementar(
+        'tarea_api_peticiones_total', ruta=ruta, metodo=request.method, estado=str(response.status_code)
+    )
+    registro.observar('tarea_api_consultas_por_peticion', medicion.consultas, ruta=ruta)
+    registro.incrementar('tarea_api_db_segundos_total', medicion.tiempo_db, ruta=ruta)
+    registro.observar('tarea_api_tareas_por_peticion', medicion.contadores.get('tareas', 0), ruta=ruta)
+    if medicion.contadores.get('ocurrencias'):
+        registro.incrementar(
+            'tarea_api_ocurrencias_expandidas_total', medicion.contadores['ocurrencias'], ruta=ruta
+        )
+    if medicion.contadores.get('cortes'):
+        registro.incrementar(
+            'tarea_api_cortes_max_ocurrencias_total', medicion.contadores['cortes'], ruta=ruta
+        )
+    for (cache, resultado), cantidad in medicion.caches.items():
+        registro.incrementar('tarea_api_cache_total', cantidad, cache=cache, resultado=resultado)
+    registro.volcar()
+
+
+def autorizada(request) -> bool:
+    token = getattr(settings, 'TAREAS_METRICAS_TOKEN', None)
+    if token:
+        esquema, _, valor = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if esquema.lower() == 'bearer' and hmac.compare_digest(valor.encode(), token.encode()):
+            return True
+    return (
+        'HTTP_X_FORWARDED_FOR' not in request.META
+        and request.META.get('REMOTE_ADDR') in getattr(settings, 'INTERNAL_IPS', ())
+    )
+
+
+def vista(request):
+    """``GET /metrics``; 404 si las métricas no están activadas o la petición no está autorizada."""
+    if not habilitadas() or not autorizada(request):
+        raise Http404()
+    return HttpResponse(
+        texto_prometheus(agregados()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,52 @@
+"""Sondas de vida y de disponibilidad para el orquestador.
+
+``vivo`` solo confirma que el proceso atiende.  ``listo`` comprueba además que
+la base de datos responde y que no quedan migraciones pendientes, así que un
+worker nuevo no recibe tráfico antes de que el esquema esté al día.
+"""
+from django.db import DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+
+# Una vez aplicadas, las migraciones no vuelven a quedar pendientes en este
+# proceso: no hace falta cargar el grafo en cada sonda
+_migraciones_al_dia = False
+
+
+def base_de_datos_lista(alias: str = 'default') -> bool:
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError:
+        return False
+    return True
+
+
+def migraciones_pendientes(alias: str = 'default') -> bool:
+    global _migraciones_al_dia
+    if _migraciones_al_dia:
+        return False
+    executor = MigrationExecutor(connections[alias])
+    pendientes = bool(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+    _migraciones_al_dia = not pendientes
+    return pendientes
+
+
+@never_cache
+@require_GET
+def vivo(request):
+    return JsonResponse({'estado': 'vivo'})
+
+
+@never_cache
+@require_GET
+def listo(request):
+    if not base_de_datos_lista():
+        return JsonResponse({'estado': 'no_listo', 'motivo': 'base_de_datos'}, status=503)
+    if migraciones_pendientes():
+        return JsonResponse({'estado': 'no_listo', 'motivo': 'migraciones'}, status=503)
+    return JsonResponse({'estado': 'listo'})
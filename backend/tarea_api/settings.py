@@ -1,5 +1,6 @@
 from datetime import timedelta
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,9 +43,12 @@ INSTALLED_APPS = [
     # Apps del proyecto
     'usuarios',
     'tareas',
+    'notificaciones',
 ]
 
 MIDDLEWARE = [
+    # Sin TAREAS_INSTRUMENTACION ni TAREAS_METRICAS se descarta al arrancar (MiddlewareNotUsed)
+    'tarea_api.instrumentacion.InstrumentacionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +60,12 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'tarea_api.urls'
+# Las peticiones ASGI usan esta URLconf, con vistas asíncronas para las
+# lecturas de ocurrencias (ver tarea_api/asgi.py)
+TAREAS_ASGI_URLCONF = 'tarea_api.urls_asgi'
+
+WSGI_APPLICATION = 'tarea_api.wsgi.application'
+ASGI_APPLICATION = 'tarea_api.asgi.application'
 
 TEMPLATES = [
     {
@@ -78,7 +88,7 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.autenticacion.JWTAuthenticationCacheada',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -90,6 +100,12 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Usuarios autenticados que cada proceso guarda en memoria (0 = sin caché).
+# Los cambios se ven al instante en el proceso que los hace y tras este
+# plazo en los demás workers.
+USUARIOS_CACHE_AUTENTICACION_SEGUNDOS = int(os.getenv('USUARIOS_CACHE_AUTENTICACION_SEGUNDOS', '30'))
+USUARIOS_CACHE_AUTENTICACION_MAX = int(os.getenv('USUARIOS_CACHE_AUTENTICACION_MAX', '10000'))
+
 if _env_bool('USE_SQLITE_FOR_TESTS') or os.getenv('GITHUB_ACTIONS') or os.getenv('CI'):
     DATABASES = {
         'default': {
@@ -106,8 +122,40 @@ else:
             'PASSWORD': os.getenv('DB_PASSWORD', 'Fernando041611'),
             'HOST': os.getenv('DB_HOST', 'nuevastecnologias.csbqgcma6jn2.us-east-1.rds.amazonaws.com'),
             'PORT': os.getenv('DB_PORT', '5432'),
+            # Conexiones persistentes por worker; se comprueban antes de
+            # reutilizarlas para no fallar tras un reinicio de Postgres
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
+    if _env_bool('DB_POOL'):
+        # Pool de psycopg 3 (requiere psycopg[pool]); excluye CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+                'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+                'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+            },
+        }
+
+# Con varios procesos conviene un backend compartido (archivo, Redis...) para
+# que la invalidación por señales llegue a todos los workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'tarea-api'),
+    },
+    # Teselas mensuales de ocurrencias (tareas.teselas).  En archivo por defecto
+    # para que la invalidación llegue a todos los workers de la máquina.
+    'teselas': {
+        'BACKEND': os.getenv('TAREAS_TESELAS_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'TAREAS_TESELAS_UBICACION', os.path.join(tempfile.gettempdir(), 'tarea-api-teselas')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('TAREAS_TESELAS_MAX_ENTRADAS', '20000'))},
+    },
+}
 
 CORS_ALLOWED_ORIGINS = _env_list(
     'CORS_ALLOWED_ORIGINS',
@@ -136,4 +184,97 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = 'static/'
+
+# Meses por delante que se mantienen en la tabla tareas_ocurrencias
+TAREAS_HORIZONTE_OCURRENCIAS_MESES = int(os.getenv('TAREAS_HORIZONTE_OCURRENCIAS_MESES', '18'))
+
+# Segundos que se guardan las estadísticas por usuario (la clave incluye la versión de datos)
+TAREAS_CACHE_ESTADISTICAS_SEGUNDOS = int(os.getenv('TAREAS_CACHE_ESTADISTICAS_SEGUNDOS', '300'))
+
+# Versión de datos por usuario (ETag).  Solo se cachea si la caché es
+# compartida entre procesos; vacío = detectarlo a partir de CACHE_BACKEND.
+TAREAS_CACHE_VERSIONES = _env_bool('TAREAS_CACHE_VERSIONES') if os.getenv('TAREAS_CACHE_VERSIONES') else None
+TAREAS_CACHE_VERSIONES_SEGUNDOS = int(os.getenv('TAREAS_CACHE_VERSIONES_SEGUNDOS', '3600'))
+
+# Teselas mensuales: meses alrededor de hoy que se cachean y su duración
+TAREAS_TESELAS_MESES_ATRAS = int(os.getenv('TAREAS_TESELAS_MESES_ATRAS', '12'))
+TAREAS_TESELAS_MESES_ADELANTE = int(os.getenv('TAREAS_TESELAS_MESES_ADELANTE', '18'))
+TAREAS_TESELAS_SEGUNDOS = int(os.getenv('TAREAS_TESELAS_SEGUNDOS', '3600'))
+
+# Días hacia atrás de estados de ocurrencias que se publican en el feed iCalendar
+TAREAS_ICAL_DIAS_ESTADOS = int(os.getenv('TAREAS_ICAL_DIAS_ESTADOS', '365'))
+
+# Archivo de estados de ocurrencia (archivar_estados): días que siguen en la
+# tabla caliente.  Por encima del feed iCalendar y de las teselas para que las
+# lecturas habituales no toquen el archivo.
+TAREAS_ARCHIVO_DIAS = int(os.getenv('TAREAS_ARCHIVO_DIAS', '400'))
+
+# Completadas sin notas de tareas recurrentes como mapas de bits por mes
+# (tareas.compactas).  Antes de desactivarlo: compactar_completadas --expandir
+TAREAS_COMPLETADAS_COMPACTAS = _env_bool('TAREAS_COMPLETADAS_COMPACTAS')
+
+# Sincronización incremental (/api/tareas/cambios/): días que se guardan las
+# lápidas de borrados y segundos que se releen antes de cada cursor
+TAREAS_SYNC_RETENCION_DIAS = int(os.getenv('TAREAS_SYNC_RETENCION_DIAS', '30'))
+TAREAS_SYNC_MARGEN_SEGUNDOS = int(os.getenv('TAREAS_SYNC_MARGEN_SEGUNDOS', '5'))
+
+# Vistas ASGI: lanzar las consultas independientes de una petición en hilos y
+# conexiones distintas.  Vacío = sí salvo con SQLite.
+TAREAS_CONSULTAS_PARALELAS = (
+    _env_bool('TAREAS_CONSULTAS_PARALELAS') if os.getenv('TAREAS_CONSULTAS_PARALELAS') else None
+)
+
+# Paginación por cursor de /api/tareas/ (opcional: ?page_size= o ?cursor=)
+TAREAS_TAMANO_PAGINA = int(os.getenv('TAREAS_TAMANO_PAGINA', '50'))
+TAREAS_TAMANO_PAGINA_MAXIMO = int(os.getenv('TAREAS_TAMANO_PAGINA_MAXIMO', '200'))
+# Instrumentación por petición (tarea_api/instrumentacion.py): cabecera
+# Server-Timing y una línea JSON por petición; por encima del umbral se
+# registran también las sentencias SQL más lentas
+TAREAS_INSTRUMENTACION = _env_bool('TAREAS_INSTRUMENTACION')
+TAREAS_INSTRUMENTACION_LENTA_MS = int(os.getenv('TAREAS_INSTRUMENTACION_LENTA_MS', '500'))
+TAREAS_INSTRUMENTACION_SENTENCIAS = int(os.getenv('TAREAS_INSTRUMENTACION_SENTENCIAS', '5'))
+
+# Métricas en formato Prometheus en /metrics (tarea_api/metricas.py).  Con
+# varios workers, cada uno vuelca las suyas en TAREAS_METRICAS_DIR y /metrics
+# las suma; sin directorio solo se ven las del worker que atiende
+TAREAS_METRICAS = _env_bool('TAREAS_METRICAS')
+TAREAS_METRICAS_DIR = os.getenv('TAREAS_METRICAS_DIR') or None
+TAREAS_METRICAS_VOLCADO_SEGUNDOS = int(os.getenv('TAREAS_METRICAS_VOLCADO_SEGUNDOS', '5'))
+# /metrics solo responde a INTERNAL_IPS sin proxy delante o a quien envíe
+# «Authorization: Bearer <TAREAS_METRICAS_TOKEN>»; al resto, 404
+INTERNAL_IPS = _env_list('INTERNAL_IPS', ['127.0.0.1', '::1'])
+TAREAS_METRICAS_TOKEN = os.getenv('TAREAS_METRICAS_TOKEN') or None
+
+# Perfilado bajo demanda (tareas/perfilado.py, solo personal): dónde se guardan
+# los perfiles y con qué perfilador ('cprofile' o 'pyinstrument')
+TAREAS_PERFILES_DIR = os.getenv('TAREAS_PERFILES_DIR', os.path.join(tempfile.gettempdir(), 'tarea-api-perfiles'))
+TAREAS_PERFILADOR = os.getenv('TAREAS_PERFILADOR', 'cprofile')
+
+# Recordatorios (notificaciones/recordatorios.py): hora local a la que vence la
+# ocurrencia de un día y minutos de antelación con los que despachar_recordatorios
+# crea su notificación
+NOTIFICACIONES_HORA_VENCIMIENTO = int(os.getenv('NOTIFICACIONES_HORA_VENCIMIENTO', '9'))
+NOTIFICACIONES_ANTICIPACION_MINUTOS = int(os.getenv('NOTIFICACIONES_ANTICIPACION_MINUTOS', '60'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tarea_api.instrumentacion': {
+            'handlers': ['consola'],
+            'level': os.getenv('TAREAS_INSTRUMENTACION_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+        # Auditoría de los perfilados como otro usuario
+        'tareas.perfilado': {
+            'handlers': ['consola'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,8 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from . import metricas, salud
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/usuarios/', include('usuarios.urls')),
     path('api/tareas/', include('tareas.urls')),
+    path('api/notificaciones/', include('notificaciones.urls')),
+    path('api/salud/vivo/', salud.vivo, name='salud-vivo'),
+    path('api/salud/listo/', salud.listo, name='salud-listo'),
+    path('metrics', metricas.vista, name='metricas'),
 ]
@@ -0,0 +1,13 @@
+"""URLconf de las peticiones que llegan por ASGI.
+
+Las mismas rutas que ``tarea_api.urls``, con las lecturas de ocurrencias y
+estadísticas servidas por vistas asíncronas.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as urlpatterns_wsgi
+
+urlpatterns = [
+    path('api/tareas/', include('tareas.urls_async')),
+    *urlpatterns_wsgi,
+]
@@ -0,0 +1,11 @@
+"""
+WSGI config for tarea_api project.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tarea_api.settings')
+
+application = get_wsgi_application()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TareasConfig(AppConfig):
+    name = 'tareas'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,208 @@
+"""Archivo de estados de ocurrencia antiguos (``tareas_ocurrencia_estado_archivo``).
+
+Las tareas diarias escriben una fila de estado por día para siempre, pero las
+vistas de calendario casi siempre miran los últimos meses.  ``archivar_estados``
+mueve por lotes las filas con ``fecha`` anterior al corte (hoy menos
+``TAREAS_ARCHIVO_DIAS``) a la tabla de archivo, que en PostgreSQL está
+particionada por mes.  Las lecturas por ventana (``estados``) solo consultan
+el archivo cuando la ventana empieza antes del corte.
+
+Invariante: el archivo solo guarda fechas anteriores al corte y una ocurrencia
+está en una tabla o en la otra, nunca en las dos.  Las escrituras sobre una
+fecha archivada borran la fila del archivo (``olvidar``) y la nueva vive en la
+tabla caliente hasta la siguiente pasada.  Mover filas no cambia lo que ve el
+usuario, así que no incrementa versiones ni invalida teselas; devolverlas a la
+tabla caliente (si se sube ``TAREAS_ARCHIVO_DIAS``) sí.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import teselas
+from .models import OcurrenciaEstado, OcurrenciaEstadoArchivada
+from .versiones import incrementar_versiones
+
+
+CAMPOS_LECTURA = ('tarea_id', 'fecha', 'estado', 'marcada_en', 'notas')
+CAMPOS_COPIA = ['estado', 'marcada_en', 'notas', 'creado_en', 'actualizado_en']
+TAMANO_LOTE = 500
+
+_particiones: Set[date] = set()
+
+
+def dias() -> int:
+    return getattr(settings, 'TAREAS_ARCHIVO_DIAS', 400)
+
+
+def corte(hoy: Optional[date] = None) -> date:
+    """Primera fecha que sigue en la tabla caliente."""
+    return (hoy or timezone.localdate()) - timedelta(days=dias())
+
+
+def alcanza(desde: Optional[date]) -> bool:
+    """Si una ventana que empieza en ``desde`` (``None`` = sin límite) llega al archivo."""
+    return desde is None or desde < corte()
+
+
+def _en_rango(condicion: Q, desde: Optional[date], hasta: Optional[date]) -> Q:
+    if desde is not None:
+        condicion &= Q(fecha__gte=desde)
+    if hasta is not None:
+        condicion &= Q(fecha__lte=hasta)
+    return condicion
+
+
+def archivados(condicion: Q, desde: Optional[date] = None, hasta: Optional[date] = None):
+    """Filas del archivo que cumplen ``condicion``, sin las que ya no llegan al corte."""
+    return OcurrenciaEstadoArchivada.objects.filter(
+        _en_rango(condicion, desde, hasta), fecha__lt=corte()
+    )
+
+
+def estados(condicion: Q, desde: Optional[date] = None, hasta: Optional[date] = None):
+    """Estados que cumplen ``condicion`` con ``fecha`` en ``[desde, hasta]``.
+
+    Si la ventana no llega al corte es la consulta de siempre sobre la tabla
+    caliente; si llega, un ``UNION ALL`` con el archivo.  Las filas del archivo
+    salen como instancias de ``OcurrenciaEstado`` con solo ``CAMPOS_LECTURA``.
+    """
+    calientes = OcurrenciaEstado.objects.filter(_en_rango(condicion, desde, hasta)).only(
+        *CAMPOS_LECTURA
+    )
+    if not alcanza(desde):
+        return calientes
+    return calientes.union(archivados(condicion, desde, hasta).only(*CAMPOS_LECTURA), all=True)
+
+
+def olvidar(claves: List[Tuple[int, date]]) -> None:
+    """Borra del archivo las ocurrencias ``(tarea_id, fecha)`` que se van a reescribir."""
+    limite = corte()
+    claves = [(tarea_id, fecha) for tarea_id, fecha in claves if fecha < limite]
+    for inicio in range(0, len(claves), TAMANO_LOTE):
+        condicion = Q()
+        for tarea_id, fecha in claves[inicio:inicio + TAMANO_LOTE]:
+            condicion |= Q(tarea_id=tarea_id, fecha=fecha)
+        OcurrenciaEstadoArchivada.objects.filter(condicion).delete()
+
+
+def _mes(fecha: date) -> date:
+    return fecha.replace(day=1)
+
+
+def asegurar_particiones(fechas: Iterable[date]) -> None:
+    """En PostgreSQL crea las particiones mensuales que falten para ``fechas``."""
+    if connection.vendor != 'postgresql':
+        return
+    tabla = OcurrenciaEstadoArchivada._meta.db_table
+    for mes in {_mes(fecha) for fecha in fechas} - _particiones:
+        siguiente = mes + relativedelta(months=1)
+        with connection.cursor() as cursor:
+            # Las fechas son nuestras: DDL sin parámetros, que PostgreSQL no admite
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {tabla}_p{mes:%Y_%m} PARTITION OF {tabla} '
+                f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+            )
+        _particiones.add(mes)
+
+
+def borrar_sin_senales(modelo, ids: List[int]) -> None:
+    """DELETE por clave primaria sin ``post_delete``: mover filas no es borrarlas."""
+    marcas = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {modelo._meta.db_table} WHERE {modelo._meta.pk.column} IN ({marcas})', ids
+        )
+
+
+def borrar_claves_sin_senales(modelo, claves: List[Tuple[int, date]]) -> List[Tuple[int, date]]:
+    """Borra las filas de ``modelo`` de las ocurrencias ``(tarea_id, fecha)`` sin ``post_delete``.
+
+    Un SELECT y un DELETE por lote, sea cual sea su tamaño.  Devuelve las
+    ocurrencias que tenían fila: versiones, teselas y lápidas quedan a cargo
+    de quien llama.
+    """
+    borradas: List[Tuple[int, date]] = []
+    for inicio in range(0, len(claves), TAMANO_LOTE):
+        lote = set(claves[inicio:inicio + TAMANO_LOTE])
+        ids = []
+        # Superconjunto con dos IN en lugar de un OR por ocurrencia
+        for id_, tarea_id, fecha in modelo.objects.filter(
+            tarea_id__in={tarea_id for tarea_id, _ in lote},
+            fecha__in={fecha for _, fecha in lote},
+        ).values_list('id', 'tarea_id', 'fecha'):
+            if (tarea_id, fecha) in lote:
+                ids.append(id_)
+                borradas.append((tarea_id, fecha))
+        if ids:
+            borrar_sin_senales(modelo, ids)
+    return borradas
+
+
+def _copias(modelo, filas) -> list:
+    return [
+        modelo(
+            tarea_id=fila.tarea_id,
+            fecha=fila.fecha,
+            **{campo: getattr(fila, campo) for campo in CAMPOS_COPIA},
+        )
+        for fila in filas
+    ]
+
+
+def archivar_lote(limite: date, tamano: int, despues_de: int = 0) -> Tuple[int, int]:
+    """Mueve al archivo hasta ``tamano`` filas con ``fecha < limite`` e ``id > despues_de``.
+
+    Cada lote es una transacción que bloquea sus filas calientes, así una
+    escritura concurrente sobre la misma ocurrencia espera y no se pierde.
+    Devuelve ``(filas movidas, último id)``; sin filas el id no cambia.
+    """
+    with transaction.atomic():
+        filas = list(
+            OcurrenciaEstado.objects.select_for_update()
+            .filter(fecha__lt=limite, id__gt=despues_de)
+            .order_by('id')[:tamano]
+        )
+        if not filas:
+            return 0, despues_de
+        asegurar_particiones(fila.fecha for fila in filas)
+        OcurrenciaEstadoArchivada.objects.bulk_create(
+            _copias(OcurrenciaEstadoArchivada, filas),
+            update_conflicts=True,
+            unique_fields=['tarea', 'fecha'],
+            update_fields=CAMPOS_COPIA,
+        )
+        borrar_sin_senales(OcurrenciaEstado, [fila.id for fila in filas])
+    return len(filas), filas[-1].id
+
+
+def restaurar_lote(limite: date, tamano: int) -> int:
+    """Devuelve a la tabla caliente hasta ``tamano`` filas archivadas con ``fecha >= limite``.
+
+    Solo hay tales filas si se subió ``TAREAS_ARCHIVO_DIAS``: vuelven a ser
+    visibles, así que se incrementan las versiones de sus dueños.  Si la
+    ocurrencia ya tiene fila caliente, gana esa.
+    """
+    with transaction.atomic():
+        filas = list(
+            OcurrenciaEstadoArchivada.objects.select_for_update(of=('self',))
+            .filter(fecha__gte=limite)
+            .select_related('tarea')
+            .order_by('id')[:tamano]
+        )
+        if not filas:
+            return 0
+        OcurrenciaEstado.objects.bulk_create(
+            _copias(OcurrenciaEstado, filas), ignore_conflicts=True
+        )
+        borrar_sin_senales(OcurrenciaEstadoArchivada, [fila.id for fila in filas])
+
+    incrementar_versiones(fila.tarea.creado_por_id for fila in filas)
+    teselas.invalidar_fechas((fila.tarea.creado_por_id, fila.fecha) for fila in filas)
+    return len(filas)
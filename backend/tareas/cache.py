@@ -0,0 +1,44 @@
+"""Caché por usuario de los datos derivados de sus tareas.
+
+Las claves incluyen la versión de los datos del usuario (``tareas.versiones``),
+así que una escritura deja obsoletas las entradas anteriores en todos los
+procesos sin tener que borrarlas.
+"""
+from datetime import date
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from tarea_api.instrumentacion import contar_cache
+
+
+def _clave_estadisticas(usuario_id: int, version: int, hoy: date) -> str:
+    return f'tareas:estadisticas:{usuario_id}:{version}:{hoy.isoformat()}'
+
+
+def obtener_estadisticas(usuario_id: int, version: int, hoy: date) -> Optional[dict]:
+    datos = cache.get(_clave_estadisticas(usuario_id, version, hoy))
+    contar_cache('estadisticas', datos is not None, datos is None)
+    return datos
+
+
+def guardar_estadisticas(usuario_id: int, version: int, hoy: date, datos: dict) -> None:
+    cache.set(
+        _clave_estadisticas(usuario_id, version, hoy),
+        datos,
+        getattr(settings, 'TAREAS_CACHE_ESTADISTICAS_SEGUNDOS', 300),
+    )
+
+
+async def aobtener_estadisticas(usuario_id: int, version: int, hoy: date) -> Optional[dict]:
+    datos = await cache.aget(_clave_estadisticas(usuario_id, version, hoy))
+    contar_cache('estadisticas', datos is not None, datos is None)
+    return datos
+
+
+async def aguardar_estadisticas(usuario_id: int, version: int, hoy: date, datos: dict) -> None:
+    await cache.aset(
+        _clave_estadisticas(usuario_id, version, hoy),
+        datos,
+        getattr(settings, 'TAREAS_CACHE_ESTADISTICAS_SEGUNDOS', 300),
+    )
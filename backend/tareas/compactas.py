@@ -0,0 +1,302 @@
+"""Completadas compactas: un mapa de bits por tarea y mes (``tareas_completadas_mes``).
+
+Con ``TAREAS_COMPLETADAS_COMPACTAS`` una ocurrencia completada sin notas de
+una tarea recurrente no escribe una fila en ``tareas_ocurrencia_estado``: pone
+a 1 el bit ``día - 1`` del entero ``dias`` de su mes.  Un hábito diario ocupa
+así 12 filas al año en lugar de 365, una ventana se lee con unos pocos mapas y
+las rachas y tasas de cumplimiento son conteos de bits.  A cambio se pierde la
+marca de tiempo exacta: esas ocurrencias salen con ``completada_en`` nulo.  Las
+que llevan notas y las que están en proceso siguen siendo filas.  Una
+ocurrencia está en las filas o en el mapa, nunca en los dos.
+
+Activar el ajuste no migra nada: ``compactar_completadas`` convierte las filas
+que ya existen y ``compactar_completadas --expandir`` deshace la conversión,
+que hay que hacer antes de desactivarlo porque sin él los mapas no se leen.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import archivo, teselas
+from .models import CompletadasMes, OcurrenciaEstado, Tarea
+from .utils import generar_ocurrencias_en_rango
+from .versiones import incrementar_versiones
+
+
+Clave = Tuple[int, date]
+
+TAMANO_LOTE = 500
+
+
+def habilitadas() -> bool:
+    return getattr(settings, 'TAREAS_COMPLETADAS_COMPACTAS', False)
+
+
+def aplica(tarea: Tarea) -> bool:
+    """Si los estados de ``tarea`` pasan por los mapas de bits."""
+    return habilitadas() and tarea.repeticion != 'ninguna'
+
+
+def mes_de(fecha: date) -> date:
+    return fecha.replace(day=1)
+
+
+def bit(fecha: date) -> int:
+    return 1 << (fecha.day - 1)
+
+
+def mascara(mes: date, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+    """Bits de los días de ``mes`` dentro de ``[desde, hasta]``."""
+    inicio = max(mes, desde) if desde is not None else mes
+    fin = (mes + relativedelta(months=1)) - timedelta(days=1)
+    if hasta is not None:
+        fin = min(fin, hasta)
+    if inicio > fin:
+        return 0
+    return ((1 << fin.day) - 1) & ~((1 << (inicio.day - 1)) - 1)
+
+
+def fechas(mes: date, dias: int) -> Iterator[date]:
+    """Fechas de los bits a 1 de ``dias``, en orden."""
+    while dias:
+        menor = dias & -dias
+        yield mes.replace(day=menor.bit_length())
+        dias ^= menor
+
+
+def estado(tarea_id: int, fecha: date, tarea: Optional[Tarea] = None) -> OcurrenciaEstado:
+    """Una completada compacta con la forma de una fila, para los que esperan filas."""
+    fila = OcurrenciaEstado(
+        tarea_id=tarea_id, fecha=fecha, estado='completada', marcada_en=None, notas=None
+    )
+    if tarea is not None:
+        fila.tarea = tarea
+    return fila
+
+
+# Los mapas de estados solo leen ``marcada_en`` y ``notas``: vale una instancia
+# compartida para todas las completadas compactas
+COMPLETADA = OcurrenciaEstado(estado='completada', marcada_en=None, notas=None)
+
+
+def mapas_en(condicion: Q, desde: Optional[date] = None, hasta: Optional[date] = None):
+    """Mapas que cumplen ``condicion`` y tocan ``[desde, hasta]``, sin evaluar."""
+    consulta = CompletadasMes.objects.filter(condicion)
+    if desde is not None:
+        consulta = consulta.filter(mes__gte=mes_de(desde))
+    if hasta is not None:
+        consulta = consulta.filter(mes__lte=hasta)
+    return consulta
+
+
+def claves(filas: Iterable[CompletadasMes], desde=None, hasta=None) -> Iterator[Clave]:
+    for fila in filas:
+        for fecha in fechas(fila.mes, fila.dias & mascara(fila.mes, desde, hasta)):
+            yield fila.tarea_id, fecha
+
+
+def completar_mapas(
+    mapas: Dict[str, Dict], filas: Iterable[CompletadasMes], desde: date, hasta: date
+) -> Dict[str, Dict]:
+    """Añade las completadas compactas a los mapas de ``_repartir_estados``."""
+    completadas = mapas['completadas']
+    for clave in claves(filas, desde, hasta):
+        completadas.setdefault(clave, COMPLETADA)
+    return mapas
+
+
+def como_estados(filas: Iterable[CompletadasMes], desde=None, hasta=None) -> List[OcurrenciaEstado]:
+    """Completadas compactas como filas sin guardar, en orden ``(fecha, tarea_id)``."""
+    estados = []
+    for fila in filas:
+        tarea = fila.tarea if CompletadasMes.tarea.is_cached(fila) else None
+        for fecha in fechas(fila.mes, fila.dias & mascara(fila.mes, desde, hasta)):
+            estados.append(estado(fila.tarea_id, fecha, tarea))
+    estados.sort(key=lambda item: (item.fecha, item.tarea_id))
+    return estados
+
+
+def completadas_desde(tarea_ids: Iterable[int], desde: date) -> Dict[int, Set[date]]:
+    """Fechas completadas de forma compacta en o después de ``desde``, por tarea."""
+    resultado: Dict[int, Set[date]] = defaultdict(set)
+    for tarea_id, fecha in claves(mapas_en(Q(tarea_id__in=list(tarea_ids)), desde), desde):
+        resultado[tarea_id].add(fecha)
+    return resultado
+
+
+def completada_el(fecha: date) -> Exists:
+    """Condición, para una consulta de ``Tarea``, de tener ``fecha`` completada en su mapa."""
+    return Exists(
+        CompletadasMes.objects.filter(tarea=OuterRef('pk'), mes=mes_de(fecha))
+        .alias(marcado=F('dias').bitand(bit(fecha)))
+        .filter(marcado__gt=0)
+    )
+
+
+def cumplimiento(tarea: Tarea, desde: date, hasta: date, hoy: Optional[date] = None) -> Dict:
+    """Ocurrencias esperadas y completadas de ``tarea`` en ``[desde, hasta]`` y su racha.
+
+    Esperadas y completadas se reducen a un entero por mes, así que la tasa y
+    la racha son conteos de bits.  La racha cuenta las ocurrencias completadas
+    seguidas que terminan en la última de la ventana; la de ``hoy``, si sigue
+    pendiente, no la corta.  Sin ``TAREAS_COMPLETADAS_COMPACTAS`` los bits se
+    arman con las filas.
+    """
+    esperadas: Dict[date, int] = defaultdict(int)
+    for fecha in generar_ocurrencias_en_rango(tarea, desde, hasta):
+        esperadas[mes_de(fecha)] |= bit(fecha)
+
+    hechas: Dict[date, int] = defaultdict(int)
+    for fila in archivo.estados(Q(tarea_id=tarea.pk, estado='completada'), desde, hasta):
+        hechas[mes_de(fila.fecha)] |= bit(fila.fecha)
+    if habilitadas():
+        for _, fecha in claves(mapas_en(Q(tarea_id=tarea.pk), desde, hasta), desde, hasta):
+            hechas[mes_de(fecha)] |= bit(fecha)
+
+    total = sum(dias.bit_count() for dias in esperadas.values())
+    completadas = sum((dias & hechas[mes]).bit_count() for mes, dias in esperadas.items())
+
+    hoy = hoy or timezone.localdate()
+    pendientes_hoy = bit(hoy) if desde <= hoy <= hasta and not hechas[mes_de(hoy)] & bit(hoy) else 0
+    racha = 0
+    for mes in sorted(esperadas, reverse=True):
+        dias = esperadas[mes] & ~(pendientes_hoy if mes == mes_de(hoy) else 0)
+        faltan = dias & ~hechas[mes]
+        # Solo cuentan las completadas por encima de la última que falta
+        racha += (dias >> faltan.bit_length()).bit_count()
+        if faltan:
+            break
+
+    return {
+        'esperadas': total,
+        'completadas': completadas,
+        'tasa': round(completadas / total, 4) if total else None,
+        'racha': racha,
+    }
+
+
+def aplicar(cambios: Dict[Clave, bool]) -> List[Clave]:
+    """Pone a 1 (``True``) o a 0 (``False``) el bit de cada ocurrencia.
+
+    Una transacción con los mapas afectados bloqueados; los que quedan a cero
+    se borran.  Devuelve las ocurrencias que estaban marcadas y dejan de
+    estarlo, para registrar su borrado.
+    """
+    por_mes: Dict[Tuple[int, date], Dict[date, bool]] = defaultdict(dict)
+    for (tarea_id, fecha), completada in cambios.items():
+        por_mes[(tarea_id, mes_de(fecha))][fecha] = completada
+    if not por_mes:
+        return []
+
+    limpiadas: List[Clave] = []
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Un superconjunto con dos IN en lugar de un OR por mapa
+        existentes = {
+            (fila.tarea_id, fila.mes): fila
+            for fila in CompletadasMes.objects.select_for_update().filter(
+                tarea_id__in={tarea_id for tarea_id, _ in por_mes},
+                mes__in={mes for _, mes in por_mes},
+            )
+        }
+        nuevas, cambiadas, vacias = [], [], []
+        for (tarea_id, mes), dias_cambiados in por_mes.items():
+            fila = existentes.get((tarea_id, mes))
+            dias = fila.dias if fila is not None else 0
+            for fecha, completada in dias_cambiados.items():
+                if completada:
+                    dias |= bit(fecha)
+                elif dias & bit(fecha):
+                    dias &= ~bit(fecha)
+                    limpiadas.append((tarea_id, fecha))
+
+            if fila is None:
+                if dias:
+                    nuevas.append(CompletadasMes(tarea_id=tarea_id, mes=mes, dias=dias))
+            elif not dias:
+                vacias.append(fila.pk)
+            elif dias != fila.dias:
+                fila.dias = dias
+                fila.actualizado_en = ahora
+                cambiadas.append(fila)
+
+        if nuevas:
+            CompletadasMes.objects.bulk_create(nuevas)
+        if cambiadas:
+            CompletadasMes.objects.bulk_update(cambiadas, ['dias', 'actualizado_en'])
+        if vacias:
+            CompletadasMes.objects.filter(pk__in=vacias).delete()
+    return limpiadas
+
+
+def _mediodia(fecha: date) -> datetime:
+    return timezone.make_aware(datetime.combine(fecha, time(12)))
+
+
+def compactar_lote(tarea_ids: List[int]) -> int:
+    """Convierte en bits las completadas sin notas de ``tarea_ids``, en una transacción.
+
+    Solo las filas de la tabla caliente; las archivadas siguen como filas.
+    Devuelve cuántas filas se convirtieron.
+    """
+    with transaction.atomic():
+        filas = list(
+            OcurrenciaEstado.objects.select_for_update(of=('self',))
+            .filter(tarea_id__in=tarea_ids, estado='completada')
+            .filter(Q(notas__isnull=True) | Q(notas=''))
+            .exclude(tarea__repeticion='ninguna')
+            .values_list('id', 'tarea_id', 'fecha', 'tarea__creado_por_id')
+        )
+        if not filas:
+            return 0
+        aplicar({(tarea_id, fecha): True for _, tarea_id, fecha, _ in filas})
+        archivo.borrar_sin_senales(OcurrenciaEstado, [fila[0] for fila in filas])
+
+    # ``completada_en`` pasa a ser nulo: es un cambio visible
+    incrementar_versiones(usuario_id for _, _, _, usuario_id in filas)
+    teselas.invalidar_fechas((usuario_id, fecha) for _, _, fecha, usuario_id in filas)
+    return len(filas)
+
+
+def expandir_lote(tarea_ids: List[int]) -> int:
+    """Deshace ``compactar_lote``: cada bit vuelve a ser una fila, marcada a mediodía.
+
+    Si la ocurrencia ya tiene fila, se conserva esa.  Devuelve cuántas
+    ocurrencias se expandieron.
+    """
+    with transaction.atomic():
+        mapas = list(
+            CompletadasMes.objects.select_for_update(of=('self',))
+            .filter(tarea_id__in=tarea_ids)
+            .values_list('id', 'tarea_id', 'mes', 'dias', 'tarea__creado_por_id')
+        )
+        if not mapas:
+            return 0
+        expandidas = [
+            (tarea_id, fecha, usuario_id)
+            for _, tarea_id, mes, dias, usuario_id in mapas
+            for fecha in fechas(mes, dias)
+        ]
+        OcurrenciaEstado.objects.bulk_create(
+            [
+                OcurrenciaEstado(
+                    tarea_id=tarea_id, fecha=fecha, estado='completada', marcada_en=_mediodia(fecha)
+                )
+                for tarea_id, fecha, _ in expandidas
+            ],
+            batch_size=TAMANO_LOTE,
+            ignore_conflicts=True,
+        )
+        archivo.borrar_sin_senales(CompletadasMes, [mapa[0] for mapa in mapas])
+
+    incrementar_versiones(usuario_id for _, _, usuario_id in expandidas)
+    teselas.invalidar_fechas((usuario_id, fecha) for _, fecha, usuario_id in expandidas)
+    return len(expandidas)
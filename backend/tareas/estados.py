@@ -0,0 +1,142 @@
+"""Escritura de estados de ocurrencia sobre ``tareas_ocurrencia_estado``."""
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import archivo, compactas, teselas
+from .models import OcurrenciaEstado, OcurrenciaEstadoArchivada, Tarea
+from .sincronizacion import registrar_eliminacion, registrar_eliminaciones
+from .versiones import incrementar_version, incrementar_versiones
+
+
+CAMPOS_UPSERT = ['estado', 'notas', 'marcada_en', 'actualizado_en']
+TAMANO_LOTE = 500
+
+
+def aplicar_estado(
+    tarea: Tarea, fecha: date, estado: str, notas: Optional[str] = None
+) -> Optional[OcurrenciaEstado]:
+    """Deja la ocurrencia en ``estado`` con una sola sentencia.
+
+    ``pendiente`` borra la fila; los demás estados hacen un upsert sobre la
+    clave única ``(tarea, fecha)``.  Devuelve la fila escrita o ``None``.  Con
+    completadas compactas, una completada sin notas solo marca su bit y se
+    devuelve una fila sin guardar.
+    """
+    desmarcada = False
+    if compactas.aplica(tarea):
+        compacta = estado == 'completada' and not notas
+        desmarcada = bool(compactas.aplicar({(tarea.id_tarea, fecha): compacta}))
+        if compacta:
+            # La fila que hubiera (en proceso o con notas) deja de valer
+            OcurrenciaEstado.objects.filter(tarea=tarea, fecha=fecha).delete()
+            archivo.olvidar([(tarea.id_tarea, fecha)])
+            incrementar_version(tarea.creado_por_id)
+            teselas.invalidar(tarea.creado_por_id, [fecha])
+            return compactas.estado(tarea.id_tarea, fecha, tarea)
+
+    if estado == 'pendiente':
+        OcurrenciaEstado.objects.filter(tarea=tarea, fecha=fecha).delete()
+        archivo.olvidar([(tarea.id_tarea, fecha)])
+        if desmarcada:
+            # Un bit no emite post_delete
+            registrar_eliminacion(tarea.creado_por_id, 'ocurrencia', tarea.id_tarea, fecha)
+            incrementar_version(tarea.creado_por_id)
+            teselas.invalidar(tarea.creado_por_id, [fecha])
+        return None
+
+    fila = OcurrenciaEstado(
+        tarea=tarea,
+        fecha=fecha,
+        estado=estado,
+        notas=notas or None,
+        marcada_en=timezone.now(),
+    )
+    OcurrenciaEstado.objects.bulk_create(
+        [fila],
+        update_conflicts=True,
+        unique_fields=['tarea', 'fecha'],
+        update_fields=CAMPOS_UPSERT,
+    )
+    # Después del upsert: si archivar_estados estaba moviendo la fila, ya
+    # terminó.  Si se queda a medias, la siguiente pasada pisa el archivo con
+    # la fila caliente.
+    archivo.olvidar([(tarea.id_tarea, fecha)])
+    # bulk_create no emite post_save
+    incrementar_version(tarea.creado_por_id)
+    teselas.invalidar(tarea.creado_por_id, [fecha])
+    return fila
+
+
+def aplicar_estados(
+    cambios: Iterable[Tuple[Tarea, date, str, Optional[str]]],
+) -> Dict[Tuple[int, date], Optional[OcurrenciaEstado]]:
+    """Aplica muchos cambios de estado en una transacción.
+
+    Los estados distintos de ``pendiente`` se escriben con upserts por lotes y
+    los ``pendiente`` con un DELETE por lote, sin ``post_delete``: versiones,
+    teselas y lápidas se escriben una vez para todo el lote, así que el número
+    de consultas no crece con los cambios.  Si una ocurrencia aparece varias
+    veces gana el último cambio.  Devuelve la fila final de cada ocurrencia
+    (``None`` si quedó pendiente).  Las completadas compactas se escriben con
+    ``compactas.aplicar`` en la misma transacción.
+    """
+    ahora = timezone.now()
+    finales: Dict[Tuple[int, date], Tuple[Tarea, str, Optional[str]]] = {}
+    for tarea, fecha, estado, notas in cambios:
+        finales[(tarea.id_tarea, fecha)] = (tarea, estado, notas)
+
+    # Ocurrencia -> si queda marcada en su mapa de bits
+    bits: Dict[Tuple[int, date], bool] = {}
+    filas = []
+    borrar = []
+    resultado: Dict[Tuple[int, date], Optional[OcurrenciaEstado]] = {}
+    for (tarea_id, fecha), (tarea, estado, notas) in finales.items():
+        if compactas.aplica(tarea):
+            bits[(tarea_id, fecha)] = estado == 'completada' and not notas
+            if bits[(tarea_id, fecha)]:
+                borrar.append((tarea_id, fecha))
+                resultado[(tarea_id, fecha)] = compactas.estado(tarea_id, fecha, tarea)
+                continue
+        if estado == 'pendiente':
+            borrar.append((tarea_id, fecha))
+            resultado[(tarea_id, fecha)] = None
+            continue
+        fila = OcurrenciaEstado(
+            tarea=tarea, fecha=fecha, estado=estado, notas=notas or None, marcada_en=ahora
+        )
+        filas.append(fila)
+        resultado[(tarea_id, fecha)] = fila
+
+    with transaction.atomic():
+        if filas:
+            OcurrenciaEstado.objects.bulk_create(
+                filas,
+                batch_size=TAMANO_LOTE,
+                update_conflicts=True,
+                unique_fields=['tarea', 'fecha'],
+                update_fields=CAMPOS_UPSERT,
+            )
+        borradas = archivo.borrar_claves_sin_senales(OcurrenciaEstado, borrar)
+        corte = archivo.corte()
+        borradas += archivo.borrar_claves_sin_senales(
+            OcurrenciaEstadoArchivada, [clave for clave in finales if clave[1] < corte]
+        )
+        borradas += compactas.aplicar(bits)
+        # Solo las que quedan pendientes dejan lápida; las demás se informan por su fila o su bit
+        registrar_eliminaciones(
+            (finales[clave][0].creado_por_id, 'ocurrencia', *clave)
+            for clave in dict.fromkeys(borradas)
+            if finales[clave][1] == 'pendiente'
+        )
+
+    incrementar_versiones(tarea.creado_por_id for tarea, _, _ in finales.values())
+    teselas.invalidar_fechas(
+        (tarea.creado_por_id, fecha) for (_, fecha), (tarea, _, _) in finales.items()
+    )
+
+    return resultado
@@ -0,0 +1,222 @@
+"""Exportación de las tareas de un usuario como iCalendar (RFC 5545).
+
+Cada tarea es un ``VTODO`` con su ``RRULE``, de modo que el tamaño del feed
+depende del número de tareas y no del de ocurrencias: los clientes expanden la
+regla por su cuenta.  Los estados de ocurrencias recientes se publican como
+``VTODO`` con ``RECURRENCE-ID`` que sobrescriben esa fecha.
+
+Los clientes de calendario no pueden enviar el JWT, así que el feed acepta un
+``token`` firmado con ``django.core.signing`` que identifica al usuario y lleva
+su ``ical_secreto``: rotar el secreto revoca los enlaces emitidos, y los
+usuarios inactivos no tienen feed.
+"""
+from __future__ import annotations
+
+import secrets
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional
+
+from django.core import signing
+
+from usuarios.cache import invalidar_usuario
+from usuarios.models import Usuario
+
+from .models import OcurrenciaEstado, Tarea
+
+
+SAL_TOKEN = 'tareas.ical'
+PRODID = '-//Tarea API//Tareas//ES'
+
+ESTADOS_VTODO = {
+    'pendiente': 'NEEDS-ACTION',
+    'en_proceso': 'IN-PROCESS',
+    'completada': 'COMPLETED',
+}
+
+FRECUENCIAS = {
+    'diaria': 'DAILY',
+    'personalizada': 'DAILY',
+    'semanal': 'WEEKLY',
+    'mensual': 'MONTHLY',
+}
+
+
+def secreto(usuario: Usuario, rotar: bool = False) -> str:
+    """``ical_secreto`` vigente del usuario; lo genera si aún no tiene o si se pide ``rotar``.
+
+    ``usuario`` puede venir de la caché de autenticación con un secreto ya
+    sustituido, así que el valor se lee siempre de la base de datos.  Sin
+    ``rotar`` solo se escribe si sigue vacío: dos peticiones a la vez acaban
+    con el mismo secreto y ninguna revoca los enlaces de la otra.
+    """
+    filas = Usuario.objects.filter(pk=usuario.pk)
+    valor = '' if rotar else filas.values_list('ical_secreto', flat=True).get()
+    if not valor:
+        (filas if rotar else filas.filter(ical_secreto='')).update(ical_secreto=secrets.token_hex(16))
+        # update() no envía post_save: la caché de este proceso se vacía a mano
+        invalidar_usuario(usuario.pk)
+        valor = filas.values_list('ical_secreto', flat=True).get()
+    usuario.ical_secreto = valor
+    return valor
+
+
+def firmar_token(usuario: Usuario, rotar: bool = False) -> str:
+    return signing.dumps(
+        {'u': usuario.pk, 's': secreto(usuario, rotar)}, salt=SAL_TOKEN, compress=True
+    )
+
+
+def usuario_de_token(token: str) -> Optional[int]:
+    """Id del usuario del token si la firma, el secreto vigente y el usuario activo cuadran."""
+    try:
+        datos = signing.loads(token, salt=SAL_TOKEN)
+        usuario_id, valor = int(datos['u']), str(datos['s'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    if not valor:
+        return None
+    activo = Usuario.objects.filter(
+        pk=usuario_id, is_active=True, activo=True, ical_secreto=valor
+    ).exists()
+    return usuario_id if activo else None
+
+
+def _fecha(valor: date) -> str:
+    return valor.strftime('%Y%m%d')
+
+
+def _marca_utc(valor: datetime) -> str:
+    return valor.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _texto(valor: str) -> str:
+    return (
+        valor.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _plegar(linea: str) -> str:
+    """Parte las líneas de más de 75 octetos sin cortar caracteres UTF-8."""
+    crudo = linea.encode('utf-8')
+    if len(crudo) <= 75:
+        return linea
+
+    partes = []
+    limite = 75
+    while crudo:
+        corte = min(limite, len(crudo))
+        # No partir una secuencia multibyte: retroceder hasta un inicio de carácter
+        while corte < len(crudo) and (crudo[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(crudo[:corte].decode('utf-8'))
+        crudo = crudo[corte:]
+        limite = 74  # el espacio inicial de la continuación cuenta
+    return '\r\n '.join(partes)
+
+
+def regla_rrule(tarea: Tarea) -> Optional[str]:
+    """``RRULE`` equivalente a la recurrencia de la tarea.
+
+    Las mensuales cuyo día no existe en un mes caen en el último día, igual
+    que ``relativedelta``; con ``BYMONTHDAY=d,-1;BYSETPOS=1`` se toma el
+    primero de {día d, último día} de cada mes.
+    """
+    frecuencia = FRECUENCIAS.get(tarea.repeticion)
+    if not frecuencia or not tarea.fecha_entrega:
+        return None
+
+    partes = [f'FREQ={frecuencia}', f'INTERVAL={tarea.intervalo_repeticion or 1}']
+    if frecuencia == 'MONTHLY':
+        dia = tarea.fecha_entrega.day
+        if dia > 28:
+            partes.append(f'BYMONTHDAY={dia},-1;BYSETPOS=1')
+        else:
+            partes.append(f'BYMONTHDAY={dia}')
+    if tarea.fecha_fin_repeticion:
+        partes.append(f'UNTIL={_fecha(tarea.fecha_fin_repeticion)}')
+    return ';'.join(partes)
+
+
+def _uid(tarea: Tarea) -> str:
+    return f'tarea-{tarea.id_tarea}@tarea-api'
+
+
+def _comunes(tarea: Tarea) -> List[str]:
+    lineas = [
+        f'UID:{_uid(tarea)}',
+        f'DTSTAMP:{_marca_utc(tarea.fecha_creacion)}',
+        f'SUMMARY:{_texto(tarea.titulo)}',
+        f'CATEGORIES:{_texto(tarea.categoria)}',
+    ]
+    if tarea.descripcion:
+        lineas.append(f'DESCRIPTION:{_texto(tarea.descripcion)}')
+    return lineas
+
+
+def _vtodo(tarea: Tarea) -> List[str]:
+    lineas = ['BEGIN:VTODO', *_comunes(tarea)]
+    if tarea.fecha_entrega:
+        lineas += [
+            f'DTSTART;VALUE=DATE:{_fecha(tarea.fecha_entrega)}',
+            f'DUE;VALUE=DATE:{_fecha(tarea.fecha_entrega)}',
+        ]
+
+    regla = regla_rrule(tarea)
+    if regla:
+        lineas.append(f'RRULE:{regla}')
+        lineas.append('STATUS:NEEDS-ACTION')
+    else:
+        lineas.append(f'STATUS:{ESTADOS_VTODO.get(tarea.estado, "NEEDS-ACTION")}')
+    lineas.append('END:VTODO')
+    return lineas
+
+
+def _vtodo_ocurrencia(tarea: Tarea, estado: OcurrenciaEstado) -> List[str]:
+    lineas = [
+        'BEGIN:VTODO',
+        *_comunes(tarea),
+        f'RECURRENCE-ID;VALUE=DATE:{_fecha(estado.fecha)}',
+        f'DTSTART;VALUE=DATE:{_fecha(estado.fecha)}',
+        f'DUE;VALUE=DATE:{_fecha(estado.fecha)}',
+        f'STATUS:{ESTADOS_VTODO[estado.estado]}',
+    ]
+    if estado.estado == 'completada':
+        # Las completadas compactas no guardan el instante
+        if estado.marcada_en is not None:
+            lineas.append(f'COMPLETED:{_marca_utc(estado.marcada_en)}')
+        lineas.append('PERCENT-COMPLETE:100')
+    if estado.notas:
+        lineas.append(f'COMMENT:{_texto(estado.notas)}')
+    lineas.append('END:VTODO')
+    return lineas
+
+
+def generar_calendario(
+    tareas: Iterable[Tarea], estados: Iterable[OcurrenciaEstado], nombre: str = 'Tareas'
+) -> str:
+    """Arma el ``VCALENDAR``; ``estados`` solo se usan para tareas recurrentes."""
+    tareas = list(tareas)
+    recurrentes: Dict[int, Tarea] = {
+        tarea.id_tarea: tarea for tarea in tareas if regla_rrule(tarea)
+    }
+
+    lineas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_texto(nombre)}',
+    ]
+    for tarea in tareas:
+        lineas += _vtodo(tarea)
+    for estado in estados:
+        tarea = recurrentes.get(estado.tarea_id)
+        if tarea is not None:
+            lineas += _vtodo_ocurrencia(tarea, estado)
+    lineas.append('END:VCALENDAR')
+
+    return ''.join(_plegar(linea) + '\r\n' for linea in lineas)
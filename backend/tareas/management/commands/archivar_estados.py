@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tareas import archivo
+from tareas.models import OcurrenciaEstado
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a tareas_ocurrencia_estado_archivo los estados de ocurrencia anteriores a '
+        'hoy menos TAREAS_ARCHIVO_DIAS, por lotes de una transacción cada uno.  Se puede '
+        'interrumpir y volver a lanzar: continúa donde quedó.  Programarlo a diario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por transacción.')
+        parser.add_argument(
+            '--max-lotes', type=int, default=0, help='Se detiene tras estos lotes (0 = sin límite).'
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0, help='Segundos de espera entre lotes.'
+        )
+        parser.add_argument(
+            '--simular', action='store_true', help='Solo cuenta las filas que se moverían.'
+        )
+
+    def handle(self, *args, **options):
+        corte = archivo.corte()
+        if options['simular']:
+            pendientes = OcurrenciaEstado.objects.filter(fecha__lt=corte).count()
+            self.stdout.write(f'{pendientes} estados anteriores al {corte} por archivar.')
+            return
+
+        lotes = 0
+
+        def seguir():
+            return not options['max_lotes'] or lotes < options['max_lotes']
+
+        # Filas que el archivo ya no debe tener (se subió TAREAS_ARCHIVO_DIAS)
+        restauradas = 0
+        while seguir():
+            cantidad = archivo.restaurar_lote(corte, options['lote'])
+            if not cantidad:
+                break
+            restauradas += cantidad
+            lotes += 1
+            time.sleep(options['pausa'])
+
+        movidas, ultimo = 0, 0
+        while seguir():
+            cantidad, ultimo = archivo.archivar_lote(corte, options['lote'], ultimo)
+            if not cantidad:
+                break
+            movidas += cantidad
+            lotes += 1
+            self.stdout.write(f'Lote {lotes}: {movidas} estados archivados (id <= {ultimo}).')
+            time.sleep(options['pausa'])
+
+        if restauradas:
+            self.stdout.write(f'{restauradas} estados posteriores al corte devueltos a la tabla caliente.')
+        self.stdout.write(
+            self.style.SUCCESS(f'{movidas} estados anteriores al {corte} archivados en {lotes} lotes.')
+        )
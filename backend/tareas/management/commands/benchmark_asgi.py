@@ -0,0 +1,283 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import count
+from statistics import quantiles
+from urllib.parse import urlencode, urlsplit
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tareas import teselas
+from tareas.management.commands.prueba_carga import (
+    SERVIDORES,
+    ConexionHTTP,
+    esperar_servidor,
+    iniciar_servidor,
+    parar_servidor,
+)
+from tareas.models import Tarea
+from usuarios.models import Usuario
+
+
+EMAIL_TEMPORAL = 'benchmark-asgi@example.invalid'
+ENDPOINTS = ('calendario', 'ocurrencias_rango', 'estadisticas')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la aplicación WSGI (hilos) y la ASGI (corrutinas) con N clientes '
+        'concurrentes: peticiones/s y latencias p50/p99.  Por defecto llama a ambas en el '
+        'mismo proceso; con --servidores arranca cada servidor y mide por HTTP.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='calendario')
+        parser.add_argument('--clientes', type=int, default=16)
+        parser.add_argument('--peticiones', type=int, default=400)
+        parser.add_argument(
+            '--email',
+            help='Usuario existente cuyas tareas se consultan. Sin él se crea uno temporal.',
+        )
+        parser.add_argument('--tareas', type=int, default=200, help='Tareas del usuario temporal.')
+        parser.add_argument(
+            '--meses',
+            type=int,
+            default=1,
+            help='Meses de la ventana. Empieza pasada la ventana de teselas para medir las consultas.',
+        )
+        parser.add_argument(
+            '--servidores',
+            help=f"Servidores a comparar por HTTP, separados por comas ({', '.join(SERVIDORES)}).",
+        )
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Dirección de los servidores.')
+
+    def handle(self, *args, **options):
+        # Import diferido: cargar las aplicaciones ejecuta django.setup()
+        from tarea_api.asgi import application as aplicacion_asgi
+        from tarea_api.wsgi import application as aplicacion_wsgi
+
+        servidores = []
+        if options['servidores']:
+            servidores = options['servidores'].split(',')
+            desconocidos = set(servidores) - set(SERVIDORES)
+            if desconocidos:
+                raise CommandError(f"Servidores desconocidos: {', '.join(sorted(desconocidos))}")
+            url = urlsplit(options['url'])
+            if url.scheme != 'http' or not url.hostname:
+                raise CommandError('--url debe ser http://host:puerto')
+            self.host, self.puerto = url.hostname, url.port or 80
+
+        usuario, temporal = self._usuario(options)
+        try:
+            ruta, parametros = self._peticion(options)
+            cabeceras = {'Authorization': f'Bearer {AccessToken.for_user(usuario)}'}
+            clientes, peticiones = options['clientes'], options['peticiones']
+
+            self.stdout.write(
+                f'{ruta}?{parametros} · {clientes} clientes · {peticiones} peticiones por modo'
+            )
+            self.stdout.write(
+                f"{'modo':<13} {'pet/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errores':>8}"
+            )
+            if servidores:
+                for modo in servidores:
+                    self._medir_servidor(modo, ruta, parametros, cabeceras, clientes, peticiones)
+                return
+            for modo, medir in (('wsgi', self._medir_wsgi), ('asgi', self._medir_asgi)):
+                aplicacion = aplicacion_wsgi if modo == 'wsgi' else aplicacion_asgi
+                # Una pasada de calentamiento (conexiones, imports, URLconf)
+                medir(aplicacion, ruta, parametros, cabeceras, 1, 1)
+                duracion, latencias, errores = medir(
+                    aplicacion, ruta, parametros, cabeceras, clientes, peticiones
+                )
+                self._informar(modo, duracion, latencias, errores)
+        finally:
+            if temporal:
+                usuario.delete()
+
+    def _usuario(self, options):
+        if options['email']:
+            try:
+                return Usuario.objects.get(email=options['email']), False
+            except Usuario.DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['email']}")
+
+        Usuario.objects.filter(email=EMAIL_TEMPORAL).delete()
+        usuario = Usuario.objects.create_user(
+            email=EMAIL_TEMPORAL, nombre='Benchmark', password=None
+        )
+        reglas = ('ninguna', 'diaria', 'semanal', 'mensual', 'personalizada')
+        hoy = timezone.localdate()
+        Tarea.objects.bulk_create(
+            Tarea(
+                titulo=f'benchmark {i}',
+                categoria='personal',
+                repeticion=reglas[i % len(reglas)],
+                intervalo_repeticion=1 + i % 3,
+                fecha_entrega=hoy - timedelta(days=(i * 37) % 1500),
+                creado_por=usuario,
+            )
+            for i in range(options['tareas'])
+        )
+        return usuario, True
+
+    def _peticion(self, options):
+        ruta = f"/api/tareas/{options['endpoint']}/"
+        if options['endpoint'] == 'estadisticas':
+            return ruta, ''
+        _, ultimo_cacheable = teselas.ventana_cacheable()
+        inicio = ultimo_cacheable + relativedelta(months=1)
+        fin = inicio + relativedelta(months=options['meses']) - timedelta(days=1)
+        return ruta, urlencode({'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat()})
+
+    def _medir_wsgi(self, aplicacion, ruta, parametros, cabeceras, clientes, peticiones):
+        turnos = count()
+
+        def cliente():
+            latencias, errores = [], 0
+            while next(turnos) < peticiones:
+                entorno = {
+                    'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': ruta,
+                    'QUERY_STRING': parametros,
+                    'SERVER_NAME': 'localhost',
+                    'SERVER_PORT': '80',
+                    'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'wsgi.url_scheme': 'http',
+                    'wsgi.input': io.BytesIO(),
+                    'wsgi.errors': io.StringIO(),
+                }
+                entorno.update(
+                    ('HTTP_' + nombre.upper().replace('-', '_'), valor)
+                    for nombre, valor in cabeceras.items()
+                )
+                estado = []
+                inicio = time.perf_counter()
+                respuesta = aplicacion(entorno, lambda status, headers: estado.append(status))
+                b''.join(respuesta)
+                respuesta.close()
+                latencias.append(time.perf_counter() - inicio)
+                errores += not estado[0].startswith('200')
+            return latencias, errores
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clientes) as hilos:
+            resultados = list(hilos.map(lambda _: cliente(), range(clientes)))
+        return self._juntar(time.perf_counter() - inicio, resultados)
+
+    def _medir_asgi(self, aplicacion, ruta, parametros, cabeceras, clientes, peticiones):
+        turnos = count()
+        cabeceras_asgi = [
+            (nombre.lower().encode(), valor.encode()) for nombre, valor in cabeceras.items()
+        ]
+
+        async def una_peticion():
+            mensajes = []
+            entregado = False
+
+            async def recibir():
+                nonlocal entregado
+                if not entregado:
+                    entregado = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # Nunca hay desconexión: el handler cancela esta espera al terminar
+                await asyncio.Future()
+
+            async def enviar(mensaje):
+                mensajes.append(mensaje)
+
+            await aplicacion(
+                {
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': 'GET',
+                    'scheme': 'http',
+                    'path': ruta,
+                    'raw_path': ruta.encode(),
+                    'query_string': parametros.encode(),
+                    'root_path': '',
+                    'headers': cabeceras_asgi,
+                    'client': ('127.0.0.1', 0),
+                    'server': ('localhost', 80),
+                },
+                recibir,
+                enviar,
+            )
+            return mensajes[0]['status']
+
+        async def cliente():
+            latencias, errores = [], 0
+            while next(turnos) < peticiones:
+                inicio = time.perf_counter()
+                codigo = await una_peticion()
+                latencias.append(time.perf_counter() - inicio)
+                errores += codigo != 200
+            return latencias, errores
+
+        async def principal():
+            return await asyncio.gather(*(cliente() for _ in range(clientes)))
+
+        inicio = time.perf_counter()
+        resultados = asyncio.run(principal())
+        return self._juntar(time.perf_counter() - inicio, resultados)
+
+    def _medir_servidor(self, modo, ruta, parametros, cabeceras, clientes, peticiones):
+        servidor = iniciar_servidor(modo, self.host, self.puerto)
+        try:
+            asyncio.run(esperar_servidor(servidor, self.host, self.puerto))
+            # Calentamiento: una petición por cliente para repartirlas entre los workers
+            self._medir_http(ruta, parametros, cabeceras, clientes, clientes)
+            duracion, latencias, errores = self._medir_http(
+                ruta, parametros, cabeceras, clientes, peticiones
+            )
+        finally:
+            parar_servidor(servidor)
+        self._informar(modo, duracion, latencias, errores)
+
+    def _medir_http(self, ruta, parametros, cabeceras, clientes, peticiones):
+        turnos = count()
+        destino = f'{ruta}?{parametros}' if parametros else ruta
+
+        async def cliente():
+            conexion = ConexionHTTP(self.host, self.puerto)
+            latencias, errores = [], 0
+            try:
+                while next(turnos) < peticiones:
+                    inicio = time.perf_counter()
+                    try:
+                        codigo, _, _ = await conexion.peticion('GET', destino, cabeceras=cabeceras)
+                    except (OSError, asyncio.IncompleteReadError):
+                        codigo = 0
+                        await conexion.cerrar()
+                    latencias.append(time.perf_counter() - inicio)
+                    errores += codigo != 200
+            finally:
+                await conexion.cerrar()
+            return latencias, errores
+
+        async def principal():
+            return await asyncio.gather(*(cliente() for _ in range(clientes)))
+
+        inicio = time.perf_counter()
+        resultados = asyncio.run(principal())
+        return self._juntar(time.perf_counter() - inicio, resultados)
+
+    def _juntar(self, duracion, resultados):
+        latencias = [latencia for parcial, _ in resultados for latencia in parcial]
+        return duracion, latencias, sum(errores for _, errores in resultados)
+
+    def _informar(self, modo, duracion, latencias, errores):
+        if len(latencias) > 1:
+            percentiles = quantiles(latencias, n=100, method='inclusive')
+            p50, p99 = percentiles[49], percentiles[98]
+        else:
+            p50 = p99 = latencias[0]
+        self.stdout.write(
+            f'{modo:<13} {len(latencias) / duracion:>8.1f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f} {errores:>8}'
+        )
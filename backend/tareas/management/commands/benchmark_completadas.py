@@ -0,0 +1,130 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from tareas import compactas, sinteticos
+from tareas.management.commands.benchmark_endpoints import percentiles
+from tareas.models import CompletadasMes, OcurrenciaEstado, Tarea
+from tareas.views import TareaViewSet
+
+
+def bytes_de_tabla(modelo):
+    """Bytes de los registros vivos de la tabla (y sus índices en SQLite), o ``None``.
+
+    Se mide dentro de la transacción del benchmark, así que no puede usar el
+    tamaño de los ficheros: las filas borradas siguen ocupando hasta un VACUUM.
+    """
+    tabla = modelo._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'SELECT COALESCE(SUM(pg_column_size(t.*)), 0) FROM {tabla} t')
+        elif connection.vendor == 'sqlite':
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        'SELECT COALESCE(SUM(d.payload), 0) FROM dbstat d '
+                        'JOIN sqlite_schema s ON s.name = d.name WHERE s.tbl_name = %s',
+                        [tabla],
+                    )
+            except DatabaseError:  # SQLite compilado sin dbstat
+                return None
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara filas y mapas de bits (TAREAS_COMPLETADAS_COMPACTAS) para las completadas de los '
+        'usuarios sintéticos: espacio de las tablas y latencia de _mapas_estados y del cumplimiento '
+        'en una ventana.  Compacta dentro de una transacción que se deshace al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20, help='Usuarios sintéticos medidos.')
+        parser.add_argument('--dias', type=int, default=365, help='Días de la ventana, hasta hoy.')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--dominio', default=sinteticos.DOMINIO)
+        parser.add_argument('--semilla', type=int, default=0)
+
+    def handle(self, *args, **options):
+        usuarios = sinteticos.muestra_de_usuarios(
+            options['usuarios'], options['dominio'], options['semilla']
+        )
+        if not usuarios:
+            raise CommandError(
+                f"No hay usuarios @{options['dominio']}; ejecute antes generar_datos_sinteticos."
+            )
+        self.repeticiones = options['repeticiones']
+        self.hasta = timezone.localdate()
+        self.desde = self.hasta - timedelta(days=options['dias'] - 1)
+        self.tareas = {
+            usuario.pk: list(
+                Tarea.objects.filter(creado_por=usuario, activa=True).exclude(repeticion='ninguna')
+            )
+            for usuario in usuarios
+        }
+
+        with transaction.atomic():
+            with override_settings(TAREAS_COMPLETADAS_COMPACTAS=False):
+                filas = self._medir()
+            with override_settings(TAREAS_COMPLETADAS_COMPACTAS=True):
+                ids = list(
+                    Tarea.objects.filter(creado_por__email__endswith=f"@{options['dominio']}")
+                    .exclude(repeticion='ninguna')
+                    .order_by('pk')
+                    .values_list('pk', flat=True)
+                )
+                for inicio in range(0, len(ids), 500):
+                    compactas.compactar_lote(ids[inicio:inicio + 500])
+                bits = self._medir()
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'medición':<32} {'filas':>18} {'mapas de bits':>18}"
+        )
+        for nombre in filas:
+            antes, despues = filas[nombre], bits[nombre]
+            self.stdout.write(f'{nombre:<32} {_formato(antes):>18} {_formato(despues):>18}')
+
+    def _medir(self):
+        vista = TareaViewSet()
+        resultado = {
+            'filas de estado': OcurrenciaEstado.objects.count(),
+            'mapas de bits': CompletadasMes.objects.count(),
+            'bytes de estados': bytes_de_tabla(OcurrenciaEstado),
+            'bytes de mapas': bytes_de_tabla(CompletadasMes),
+        }
+
+        def mapas(tareas):
+            vista._mapas_estados(tareas, self.desde, self.hasta)
+
+        def cumplimiento(tareas):
+            for tarea in tareas:
+                compactas.cumplimiento(tarea, self.desde, self.hasta, self.hasta)
+
+        for nombre, funcion in (('_mapas_estados', mapas), ('cumplimiento', cumplimiento)):
+            latencias, consultas = [], 0
+            for tareas in self.tareas.values():
+                if not tareas:
+                    continue
+                for _ in range(self.repeticiones):
+                    with CaptureQueriesContext(connection) as capturadas:
+                        inicio = time.perf_counter()
+                        funcion(tareas)
+                        latencias.append(time.perf_counter() - inicio)
+                    consultas = max(consultas, len(capturadas))
+            if latencias:
+                p50, p95 = percentiles(latencias)
+                resultado[f'{nombre} p50 (ms)'] = round(p50, 2)
+                resultado[f'{nombre} p95 (ms)'] = round(p95, 2)
+                resultado[f'{nombre} consultas'] = consultas
+        return resultado
+
+
+def _formato(valor):
+    return '-' if valor is None else str(valor)
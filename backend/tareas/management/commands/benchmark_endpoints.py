@@ -0,0 +1,284 @@
+import json
+import platform
+import time
+from datetime import timedelta
+from itertools import cycle
+from statistics import quantiles
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tareas import sinteticos, utils
+from tareas.ical import firmar_token
+from tareas.models import Tarea
+from tareas.views import TareaViewSet
+from usuarios import cache as cache_usuarios
+
+
+def percentiles(latencias):
+    """p50 y p95 en milisegundos."""
+    if len(latencias) > 1:
+        cortes = quantiles(latencias, n=100, method='inclusive')
+        return cortes[49] * 1000, cortes[94] * 1000
+    return latencias[0] * 1000, latencias[0] * 1000
+
+
+def comparar(actual, base, umbral):
+    """Mediciones de ``actual`` que empeoran respecto a ``base``.
+
+    Es regresión si la p50 crece más que ``umbral`` (fracción) o si se hacen
+    más consultas: lo segundo no depende del ruido de la máquina.
+    """
+    regresiones = []
+    for nombre, medida in actual['resultados'].items():
+        anterior = base.get('resultados', {}).get(nombre)
+        if anterior is None:
+            continue
+        if medida['consultas'] > anterior['consultas']:
+            regresiones.append(
+                f"{nombre}: {anterior['consultas']} -> {medida['consultas']} consultas"
+            )
+        if anterior['p50_ms'] > 0 and medida['p50_ms'] > anterior['p50_ms'] * (1 + umbral):
+            regresiones.append(
+                f"{nombre}: p50 {anterior['p50_ms']:.2f} -> {medida['p50_ms']:.2f} ms"
+            )
+    return regresiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cada acción de TareaViewSet y las funciones de tareas.utils sobre usuarios '
+        'sintéticos (generar_datos_sinteticos): consultas, p50 y p95.  Puede guardar el '
+        'resultado en JSON y compararlo con una medición anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20, help='Usuarios sintéticos muestreados.')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Llamadas por usuario y medición.')
+        parser.add_argument('--dominio', default=sinteticos.DOMINIO)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument(
+            '--frio',
+            action='store_true',
+            help='Vacía las cachés (fuera del tiempo medido) antes de cada llamada.',
+        )
+        parser.add_argument('--solo', help='Solo las mediciones cuyo nombre contenga este texto.')
+        parser.add_argument('--salida', help='Guarda el resultado en este fichero JSON.')
+        parser.add_argument('--base', help='JSON de una medición anterior con la que comparar.')
+        parser.add_argument(
+            '--umbral',
+            type=float,
+            default=0.2,
+            help='Aumento relativo de la p50 que se considera regresión (0.2 = 20%%).',
+        )
+
+    def handle(self, *args, **options):
+        usuarios = sinteticos.muestra_de_usuarios(
+            options['usuarios'], options['dominio'], options['semilla']
+        )
+        if not usuarios:
+            raise CommandError(
+                f"No hay usuarios @{options['dominio']}; ejecute antes generar_datos_sinteticos."
+            )
+
+        self.fabrica = APIRequestFactory()
+        self.frio = options['frio']
+        self.repeticiones = options['repeticiones']
+        mediciones = [*self._acciones(), *self._funciones()]
+        if options['solo']:
+            mediciones = [m for m in mediciones if options['solo'] in m[0]]
+
+        resultados = {}
+        self.stdout.write(f"{'medición':<40} {'consultas':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'errores':>8}")
+        for nombre, preparar in mediciones:
+            latencias, consultas, errores = [], 0, 0
+            for usuario in usuarios:
+                llamada = preparar(usuario)
+                if llamada is None:
+                    continue
+                for _ in range(self.repeticiones):
+                    duracion, cantidad, correcta = self._medir(llamada)
+                    latencias.append(duracion)
+                    consultas = max(consultas, cantidad)
+                    errores += not correcta
+            if not latencias:
+                continue
+            p50, p95 = percentiles(latencias)
+            resultados[nombre] = {
+                'muestras': len(latencias),
+                'consultas': consultas,
+                'p50_ms': round(p50, 3),
+                'p95_ms': round(p95, 3),
+                'errores': errores,
+            }
+            self.stdout.write(f'{nombre:<40} {consultas:>9} {p50:>9.2f} {p95:>9.2f} {errores:>8}')
+
+        informe = {
+            'metadatos': {
+                'fecha': timezone.now().isoformat(),
+                'motor': connection.vendor,
+                'python': platform.python_version(),
+                'usuarios': len(usuarios),
+                'tareas': Tarea.objects.filter(creado_por__in=usuarios).count(),
+                'repeticiones': self.repeticiones,
+                'frio': self.frio,
+            },
+            'resultados': resultados,
+        }
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(informe, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
+
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as fichero:
+                    base = json.load(fichero)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"No se pudo leer la base {options['base']}: {error}")
+            if base.get('metadatos', {}).get('frio') != self.frio:
+                self.stderr.write('Aviso: la base se midió con otro estado de las cachés (--frio).')
+            regresiones = comparar(informe, base, options['umbral'])
+            if regresiones:
+                raise CommandError('Regresiones respecto a la base:\n' + '\n'.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la base.'))
+
+    def _medir(self, llamada):
+        if self.frio:
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            cache_usuarios.limpiar()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            correcta = llamada()
+            duracion = time.perf_counter() - inicio
+        return duracion, len(capturadas), correcta
+
+    def _vista(self, acciones, preparar_peticion=None):
+        """``preparar(usuario)`` para una acción; ``preparar_peticion(usuario)`` da la petición.
+
+        Devuelve ``(parametros, datos, kwargs)`` o ``None`` si el usuario no tiene
+        con qué medir; ``datos`` es una función para que cada llamada varíe.
+        """
+        vista = TareaViewSet.as_view(acciones)
+        metodo = next(iter(acciones))
+
+        def preparar(usuario):
+            parametros, datos, kwargs = {}, None, {}
+            if preparar_peticion is not None:
+                preparada = preparar_peticion(usuario)
+                if preparada is None:
+                    return None
+                parametros, datos, kwargs = preparada
+
+            def llamada():
+                if metodo == 'get':
+                    request = self.fabrica.get('/api/tareas/', parametros)
+                else:
+                    request = self.fabrica.post('/api/tareas/', datos(), format='json')
+                force_authenticate(request, user=usuario)
+                respuesta = vista(request, **kwargs)
+                if hasattr(respuesta, 'render'):
+                    respuesta.render()
+                return respuesta.status_code < 400
+            return llamada
+
+        return preparar
+
+    def _acciones(self):
+        hoy = timezone.localdate()
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        mes = {'fecha_inicio': inicio_mes.isoformat(), 'fecha_fin': fin_mes.isoformat()}
+
+        def detalle(usuario):
+            tarea = sinteticos.tarea_de_muestra(usuario, recurrente=False)
+            return None if tarea is None else ({}, None, {'pk': tarea.pk})
+
+        def alternar_ocurrencia(usuario):
+            tarea = sinteticos.tarea_de_muestra(usuario)
+            fecha = utils.obtener_proxima_ocurrencia(tarea, hoy) if tarea else None
+            if fecha is None:
+                return None
+            # Completa y deshace la misma ocurrencia en llamadas alternas
+            estados = cycle(('completada', 'pendiente'))
+            return (
+                {},
+                lambda: {'tarea_id': tarea.pk, 'fecha': fecha.isoformat(), 'estado': next(estados)},
+                {},
+            )
+
+        return [
+            ('accion:list', self._vista({'get': 'list'})),
+            ('accion:retrieve', self._vista({'get': 'retrieve'}, detalle)),
+            ('accion:estadisticas', self._vista({'get': 'estadisticas'})),
+            ('accion:proximas', self._vista({'get': 'proximas'})),
+            ('accion:cambios', self._vista({'get': 'cambios'})),
+            ('accion:ical', self._vista(
+                {'get': 'ical'}, lambda usuario: ({'token': firmar_token(usuario)}, None, {})
+            )),
+            ('accion:calendario (mes)', self._vista({'get': 'calendario'}, lambda _: (mes, None, {}))),
+            ('accion:ocurrencias_por_fecha', self._vista({'get': 'ocurrencias_por_fecha'})),
+            ('accion:ocurrencias_rango (mes)', self._vista(
+                {'get': 'ocurrencias_rango'}, lambda _: (mes, None, {})
+            )),
+            ('accion:ocurrencias_hoy', self._vista({'get': 'ocurrencias_hoy'})),
+            ('accion:actualizar_ocurrencia', self._vista(
+                {'post': 'actualizar_ocurrencia'}, alternar_ocurrencia
+            )),
+        ]
+
+    def _funciones(self):
+        hoy = timezone.localdate()
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = inicio_mes + timedelta(days=30)
+
+        def sobre_tareas(funcion):
+            def preparar(usuario):
+                tareas = list(
+                    Tarea.objects.filter(creado_por=usuario, activa=True).exclude(repeticion='ninguna')
+                )
+                if not tareas:
+                    return None
+
+                def llamada():
+                    for tarea in tareas:
+                        funcion(tarea)
+                    return True
+                return llamada
+
+            return preparar
+
+        def ordenadas(usuario):
+            tareas = list(Tarea.objects.filter(creado_por=usuario, activa=True))
+
+            def llamada():
+                for _ in utils.iterar_ocurrencias_ordenadas(tareas, inicio_mes, fin_mes):
+                    pass
+                return True
+            return llamada
+
+        # Cada llamada recorre todas las tareas recurrentes activas del usuario
+        return [
+            ('utils:generar_ocurrencias_en_rango', sobre_tareas(
+                lambda tarea: utils.generar_ocurrencias_en_rango(tarea, inicio_mes, fin_mes)
+            )),
+            ('utils:generar_ocurrencias_por_pasos', sobre_tareas(
+                lambda tarea: utils.generar_ocurrencias_por_pasos(tarea, inicio_mes, fin_mes)
+            )),
+            ('utils:iterar_ocurrencias_ordenadas', ordenadas),
+            ('utils:obtener_proxima_ocurrencia', sobre_tareas(
+                lambda tarea: utils.obtener_proxima_ocurrencia(tarea, hoy)
+            )),
+            ('utils:fecha_corresponde_a_tarea', sobre_tareas(
+                lambda tarea: utils.fecha_corresponde_a_tarea(tarea, hoy)
+            )),
+            ('utils:obtener_siguiente_fecha', sobre_tareas(
+                lambda tarea: utils.obtener_siguiente_fecha(tarea, hoy)
+            )),
+        ]
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from timeit import repeat
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tareas.models import Tarea
+from tareas.ocurrencias_lote import lote_disponible, ocurrencias_con_estados
+from tareas.utils import (
+    fecha_corresponde_a_tarea,
+    generar_ocurrencias_en_rango,
+    generar_ocurrencias_por_pasos,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark del motor de recurrencias: compara el motor aritmético '
+        'con el recorrido fecha a fecha según la antigüedad de la tarea.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--llamadas', type=int, default=200)
+        parser.add_argument(
+            '--lote',
+            action='store_true',
+            help='Compara la expansión tarea a tarea con la vectorizada para varios tamaños de lista.',
+        )
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        llamadas = options['llamadas']
+        if options['lote']:
+            self._benchmark_lote(repeticiones)
+            return
+
+        hoy = timezone.localdate()
+        inicio_ventana = hoy.replace(day=1)
+        fin_ventana = inicio_ventana + timedelta(days=30)
+
+        self.stdout.write(
+            f"{'regla':<10} {'antigüedad':>10} {'pasos (µs)':>12} {'aritmético (µs)':>16} {'pertenencia (µs)':>17}"
+        )
+        for repeticion in ('diaria', 'semanal', 'mensual'):
+            for antiguedad in (30, 365, 900, 3650):
+                tarea = Tarea(
+                    titulo='benchmark',
+                    categoria='personal',
+                    repeticion=repeticion,
+                    intervalo_repeticion=1,
+                    fecha_entrega=inicio_ventana - timedelta(days=antiguedad),
+                )
+
+                por_pasos = self._medir(
+                    lambda: generar_ocurrencias_por_pasos(tarea, inicio_ventana, fin_ventana),
+                    repeticiones,
+                    llamadas,
+                )
+                aritmetico = self._medir(
+                    lambda: generar_ocurrencias_en_rango(tarea, inicio_ventana, fin_ventana),
+                    repeticiones,
+                    llamadas,
+                )
+                pertenencia = self._medir(
+                    lambda: fecha_corresponde_a_tarea(tarea, fin_ventana),
+                    repeticiones,
+                    llamadas,
+                )
+                self.stdout.write(
+                    f'{repeticion:<10} {antiguedad:>9}d {por_pasos:>12.1f} {aritmetico:>16.1f} {pertenencia:>17.1f}'
+                )
+
+    def _benchmark_lote(self, repeticiones):
+        if not lote_disponible():
+            self.stderr.write('NumPy no está instalado; no hay expansión por lotes que medir.')
+            return
+
+        # Import diferido: la vista arrastra DRF y no hace falta para el modo básico
+        from tareas.views import TareaViewSet
+
+        vista = TareaViewSet()
+        mapas = {'completadas': {}, 'en_proceso': {}}
+        inicio = timezone.localdate().replace(day=1)
+        fin = inicio + timedelta(days=90)
+        reglas = ('ninguna', 'diaria', 'semanal', 'mensual', 'personalizada')
+
+        self.stdout.write(f"{'tareas':>7} {'por tarea (ms)':>15} {'lote (ms)':>10} {'lote / por tarea':>17}")
+        for cantidad in (1, 4, 8, 16, 32, 64, 128, 256, 512, 1024):
+            tareas = [
+                Tarea(
+                    id_tarea=i + 1,
+                    titulo=f'benchmark {i}',
+                    categoria='personal',
+                    repeticion=reglas[i % len(reglas)],
+                    intervalo_repeticion=1 + i % 3,
+                    fecha_entrega=inicio - timedelta(days=(i * 37) % 1500),
+                )
+                for i in range(cantidad)
+            ]
+            llamadas = max(1, 2048 // cantidad)
+
+            por_tarea = self._medir(
+                lambda: vista._generar_payload_por_tarea(tareas, inicio, fin, mapas),
+                repeticiones,
+                llamadas,
+            )
+            lote = self._medir(
+                lambda: [
+                    vista._payload_ocurrencia(tarea, fecha, completada, en_proceso, fecha_iso)
+                    for tarea, fecha, fecha_iso, completada, en_proceso in ocurrencias_con_estados(
+                        tareas, inicio, fin, mapas
+                    )
+                ],
+                repeticiones,
+                llamadas,
+            )
+            self.stdout.write(
+                f'{cantidad:>7} {por_tarea / 1000:>15.3f} {lote / 1000:>10.3f} {lote / por_tarea:>17.2f}'
+            )
+
+    def _medir(self, funcion, repeticiones, llamadas):
+        mejor = min(repeat(funcion, number=llamadas, repeat=repeticiones))
+        return mejor / llamadas * 1_000_000
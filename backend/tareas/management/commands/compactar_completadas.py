@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas import compactas
+from tareas.models import Tarea
+
+
+class Command(BaseCommand):
+    help = (
+        'Convierte las completadas sin notas de las tareas recurrentes en mapas de bits por mes '
+        '(TAREAS_COMPLETADAS_COMPACTAS), o con --expandir las devuelve a filas.  Una transacción '
+        'por lote de tareas: se puede interrumpir y volver a lanzar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Tareas por transacción.')
+        parser.add_argument(
+            '--expandir',
+            action='store_true',
+            help='Deshace la conversión; necesario antes de desactivar TAREAS_COMPLETADAS_COMPACTAS.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['expandir'] and not compactas.habilitadas():
+            raise CommandError(
+                'Active TAREAS_COMPLETADAS_COMPACTAS antes de compactar: sin él los mapas no se leen.'
+            )
+
+        convertir = compactas.expandir_lote if options['expandir'] else compactas.compactar_lote
+        ids = list(
+            Tarea.objects.exclude(repeticion='ninguna').order_by('pk').values_list('pk', flat=True)
+        )
+        total = 0
+        for inicio in range(0, len(ids), options['lote']):
+            total += convertir(ids[inicio:inicio + options['lote']])
+
+        if options['expandir']:
+            self.stdout.write(self.style.SUCCESS(f'{total} completadas devueltas a filas.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} completadas convertidas en bits.'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tarea_api.salud import base_de_datos_lista
+
+
+class Command(BaseCommand):
+    help = (
+        'Espera a que la base de datos acepte conexiones. Se usa en el arranque '
+        'del contenedor en lugar de un sleep fijo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=60, help='Segundos máximos de espera.')
+        parser.add_argument('--intervalo', type=float, default=1, help='Segundos entre intentos.')
+
+    def handle(self, *args, **options):
+        limite = time.monotonic() + options['timeout']
+        intentos = 1
+        while not base_de_datos_lista():
+            if time.monotonic() >= limite:
+                raise CommandError(
+                    f"La base de datos no respondió tras {options['timeout']:g} s ({intentos} intentos)."
+                )
+            time.sleep(options['intervalo'])
+            intentos += 1
+        self.stdout.write(self.style.SUCCESS(f'Base de datos lista ({intentos} intentos).'))
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas.materializacion import extender_horizonte, horizonte
+
+
+class Command(BaseCommand):
+    help = (
+        'Extiende la tabla tareas_ocurrencias hasta el horizonte rodante '
+        '(TAREAS_HORIZONTE_OCURRENCIAS_MESES). Pensado para ejecutarse a diario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasta',
+            help='Fecha límite (YYYY-MM-DD); por defecto hoy más el horizonte configurado.',
+        )
+
+    def handle(self, *args, **options):
+        hasta = horizonte()
+        if options['hasta']:
+            try:
+                hasta = date.fromisoformat(options['hasta'])
+            except ValueError as exc:
+                raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD') from exc
+
+        total = extender_horizonte(hasta)
+        self.stdout.write(self.style.SUCCESS(f'{total} ocurrencias añadidas hasta {hasta}.'))
@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas import sinteticos
+from tareas.materializacion import extender_horizonte
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera usuarios sintéticos con tareas únicas y recurrentes y el historial de '
+        'estados de sus ocurrencias, para medir la API a escala.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=100)
+        parser.add_argument('--tareas-por-usuario', type=int, default=20)
+        parser.add_argument(
+            '--proporcion-unicas', type=float, default=0.3,
+            help='Fracción de tareas sin repetición.',
+        )
+        parser.add_argument(
+            '--mezcla',
+            default=','.join(f'{regla}:{peso}' for regla, peso in sinteticos.MEZCLA_RECURRENTES.items()),
+            help='Pesos de las reglas recurrentes, p. ej. diaria:4,semanal:3,mensual:2,personalizada:1',
+        )
+        parser.add_argument(
+            '--dias-historia', type=int, default=730,
+            help='Antigüedad máxima de las tareas y del historial de estados.',
+        )
+        parser.add_argument('--tasa-completadas', type=float, default=0.7)
+        parser.add_argument('--tasa-en-proceso', type=float, default=0.05)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--dominio', default=sinteticos.DOMINIO)
+        parser.add_argument(
+            '--materializar', action='store_true',
+            help='Materializa las ocurrencias al terminar (equivale a extender_ocurrencias).',
+        )
+        parser.add_argument(
+            '--borrar', action='store_true',
+            help='Borra los usuarios sintéticos del dominio en lugar de generar.',
+        )
+
+    def handle(self, *args, **options):
+        if options['borrar']:
+            borrados = sinteticos.borrar(options['dominio'])
+            self.stdout.write(self.style.SUCCESS(f'{borrados} usuarios sintéticos borrados.'))
+            return
+
+        config = sinteticos.Configuracion(
+            usuarios=options['usuarios'],
+            tareas_por_usuario=options['tareas_por_usuario'],
+            proporcion_unicas=options['proporcion_unicas'],
+            mezcla=self._mezcla(options['mezcla']),
+            dias_historia=options['dias_historia'],
+            tasa_completadas=options['tasa_completadas'],
+            tasa_en_proceso=options['tasa_en_proceso'],
+            semilla=options['semilla'],
+            dominio=options['dominio'],
+        )
+
+        inicio = time.perf_counter()
+        totales = sinteticos.generar(
+            config,
+            progreso=lambda t: self.stdout.write(
+                f"{t['usuarios']} usuarios, {t['tareas']} tareas, {t['estados']} estados..."
+            ),
+        )
+        if options['materializar']:
+            self.stdout.write('Materializando ocurrencias...')
+            extender_horizonte()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totales['usuarios']} usuarios, {totales['tareas']} tareas y "
+                f"{totales['estados']} estados en {time.perf_counter() - inicio:.1f} s. "
+                f"Contraseña: {sinteticos.CONTRASENA}"
+            )
+        )
+
+    def _mezcla(self, texto):
+        mezcla = {}
+        for parte in texto.split(','):
+            regla, _, peso = parte.partition(':')
+            regla = regla.strip()
+            if regla not in sinteticos.INTERVALOS:
+                raise CommandError(f'Regla desconocida en --mezcla: {regla}')
+            try:
+                mezcla[regla] = int(peso or 1)
+            except ValueError:
+                raise CommandError(f'Peso inválido en --mezcla: {parte}')
+        if not any(mezcla.values()):
+            raise CommandError('--mezcla necesita al menos una regla con peso positivo')
+        return mezcla
@@ -0,0 +1,409 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import timedelta
+from statistics import quantiles
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tareas import sinteticos
+
+
+# Peso de cada operación en la mezcla de un panel: lo que se pide al abrirlo
+# y al volver a él, más algún cambio de estado de vez en cuando
+MEZCLA = {
+    'estadisticas': 3,
+    'list': 2,
+    'ocurrencias_hoy': 3,
+    'calendario': 2,
+    'actualizar_ocurrencia': 1,
+}
+SERVIDORES = ('runserver', 'gunicorn', 'gunicorn-asgi', 'uvicorn')
+
+
+class ConexionHTTP:
+    """Cliente HTTP/1.1 mínimo sobre ``asyncio`` que reutiliza la conexión.
+
+    Entiende ``Content-Length``, ``Transfer-Encoding: chunked`` y respuestas
+    que terminan al cerrar la conexión (``runserver`` habla HTTP/1.0).
+    """
+
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = self.escritor = None
+
+    async def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            try:
+                await self.escritor.wait_closed()
+            except OSError:
+                pass
+        self.lector = self.escritor = None
+
+    async def peticion(self, metodo, ruta, cuerpo=None, cabeceras=None):
+        """Devuelve ``(codigo, cabeceras, cuerpo)``; reconecta una vez si el servidor cerró."""
+        for intento in range(2):
+            if self.escritor is None:
+                self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+            try:
+                return await self._enviar(metodo, ruta, cuerpo, cabeceras or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.cerrar()
+                if intento:
+                    raise
+
+    async def _enviar(self, metodo, ruta, cuerpo, cabeceras):
+        datos = b'' if cuerpo is None else json.dumps(cuerpo).encode()
+        lineas = [f'{metodo} {ruta} HTTP/1.1', f'Host: {self.host}:{self.puerto}', 'Accept: application/json']
+        if cuerpo is not None:
+            lineas += ['Content-Type: application/json', f'Content-Length: {len(datos)}']
+        lineas += [f'{nombre}: {valor}' for nombre, valor in cabeceras.items()]
+        self.escritor.write(('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1') + datos)
+        await self.escritor.drain()
+
+        estado = await self.lector.readuntil(b'\r\n')
+        version, codigo = estado.decode('latin-1').split(' ', 2)[:2]
+        recibidas = {}
+        while True:
+            linea = await self.lector.readuntil(b'\r\n')
+            if linea == b'\r\n':
+                break
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            recibidas[nombre.strip().lower()] = valor.strip()
+
+        codigo = int(codigo)
+        if codigo == 304 or codigo == 204 or metodo == 'HEAD':
+            contenido = b''
+        elif recibidas.get('transfer-encoding', '').lower() == 'chunked':
+            contenido = await self._trozos()
+        elif 'content-length' in recibidas:
+            contenido = await self.lector.readexactly(int(recibidas['content-length']))
+        else:
+            contenido = await self.lector.read()
+            await self.cerrar()
+            return codigo, recibidas, contenido
+
+        if recibidas.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+            await self.cerrar()
+        return codigo, recibidas, contenido
+
+    async def _trozos(self):
+        partes = []
+        while True:
+            tamano = int((await self.lector.readuntil(b'\r\n')).split(b';')[0], 16)
+            if tamano == 0:
+                await self.lector.readuntil(b'\r\n')
+                return b''.join(partes)
+            partes.append(await self.lector.readexactly(tamano))
+            await self.lector.readexactly(2)
+
+
+class UsuarioVirtual:
+    def __init__(self, email, conexion, rng, etag):
+        self.email = email
+        self.conexion = conexion
+        self.rng = rng
+        self.usar_etag = etag
+        self.token = None
+        self.etags = {}
+        self.ocurrencias = []
+        self.estados = {}
+
+    async def iniciar_sesion(self, contrasena):
+        codigo, _, cuerpo = await self.conexion.peticion(
+            'POST', '/api/usuarios/login/', {'email': self.email, 'password': contrasena}
+        )
+        if codigo != 200:
+            raise CommandError(f'No se pudo iniciar sesión como {self.email} ({codigo})')
+        self.token = json.loads(cuerpo)['access']
+
+    async def operacion(self, nombre):
+        """Ejecuta una operación de la mezcla; devuelve ``(endpoint, código HTTP)``.
+
+        Sin ocurrencias conocidas, el cambio de estado se sustituye por la
+        consulta que las descubre.
+        """
+        hoy = timezone.localdate()
+        if nombre == 'actualizar_ocurrencia' and not self.ocurrencias:
+            nombre = 'ocurrencias_hoy'
+        if nombre == 'actualizar_ocurrencia':
+            tarea_id, fecha = self.rng.choice(self.ocurrencias)
+            estado = 'pendiente' if self.estados.get((tarea_id, fecha)) == 'completada' else 'completada'
+            codigo, _, _ = await self._llamar(
+                'POST',
+                '/api/tareas/actualizar_ocurrencia/',
+                {'tarea_id': tarea_id, 'fecha': fecha, 'estado': estado},
+            )
+            if codigo == 200:
+                self.estados[(tarea_id, fecha)] = estado
+            return nombre, codigo
+
+        if nombre == 'calendario':
+            inicio = hoy.replace(day=1)
+            fin = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            ruta = '/api/tareas/calendario/?' + urlencode(
+                {'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat()}
+            )
+        elif nombre == 'list':
+            ruta = '/api/tareas/'
+        else:
+            ruta = f'/api/tareas/{nombre}/'
+
+        cabeceras = {}
+        if self.usar_etag and ruta in self.etags:
+            cabeceras['If-None-Match'] = self.etags[ruta]
+        codigo, recibidas, cuerpo = await self._llamar('GET', ruta, cabeceras=cabeceras)
+        if codigo == 200:
+            if 'etag' in recibidas:
+                self.etags[ruta] = recibidas['etag']
+            self._recordar_ocurrencias(nombre, cuerpo, hoy)
+        return nombre, codigo
+
+    async def _llamar(self, metodo, ruta, cuerpo=None, cabeceras=None):
+        cabeceras = dict(cabeceras or {}, Authorization=f'Bearer {self.token}')
+        return await self.conexion.peticion(metodo, ruta, cuerpo, cabeceras)
+
+    def _recordar_ocurrencias(self, nombre, cuerpo, hoy):
+        if nombre == 'ocurrencias_hoy':
+            instancias = json.loads(cuerpo)
+        elif nombre == 'calendario':
+            instancias = json.loads(cuerpo)['instancias_recurrentes']
+        else:
+            return
+        hoy = hoy.isoformat()
+        conocidas = {
+            (instancia['tarea_id'], instancia['fecha_instancia'])
+            for instancia in instancias
+            if instancia['tarea_repeticion'] != 'ninguna' and instancia['fecha_instancia'] <= hoy
+        }
+        if conocidas:
+            self.ocurrencias = sorted(conocidas | set(self.ocurrencias))[-50:]
+
+
+def iniciar_servidor(modo, host, puerto):
+    """Arranca uno de ``SERVIDORES`` escuchando en ``host:puerto`` y devuelve el proceso."""
+    direccion = f'{host}:{puerto}'
+    if modo == 'runserver':
+        comando = [sys.executable, 'manage.py', 'runserver', '--noreload', direccion]
+    elif modo == 'uvicorn':
+        comando = [
+            sys.executable, '-m', 'uvicorn', 'tarea_api.asgi:application',
+            '--host', host, '--port', str(puerto), '--no-access-log',
+        ]
+    else:
+        aplicacion = 'tarea_api.asgi:application' if modo == 'gunicorn-asgi' else 'tarea_api.wsgi:application'
+        comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', direccion, aplicacion]
+    entorno = dict(os.environ, GUNICORN_ACCESSLOG='')
+    if modo == 'gunicorn-asgi':
+        entorno.setdefault('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+    elif modo == 'uvicorn':
+        # Igual que gunicorn.conf.py con workers de uvicorn
+        entorno.setdefault('DB_CONN_MAX_AGE', '0')
+    return subprocess.Popen(
+        comando,
+        cwd=settings.BASE_DIR,
+        env=entorno,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def esperar_servidor(servidor, host, puerto, limite=30):
+    """Espera a que ``/api/salud/listo/`` responda 200."""
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if servidor.poll() is not None:
+            raise CommandError(f'El servidor terminó al arrancar (código {servidor.returncode})')
+        conexion = ConexionHTTP(host, puerto)
+        try:
+            codigo, _, _ = await conexion.peticion('GET', '/api/salud/listo/')
+            if codigo == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await conexion.cerrar()
+        await asyncio.sleep(0.5)
+    raise CommandError(f'El servidor no estuvo listo en {limite} s')
+
+
+def parar_servidor(servidor):
+    servidor.terminate()
+    servidor.wait(timeout=30)
+
+
+def resumir(latencias_por_endpoint, errores_por_endpoint, duracion):
+    """``{endpoint: {peticiones, pet_s, p50_ms, p95_ms, p99_ms, errores, tasa_errores}}``."""
+    resumen = {}
+    for nombre, latencias in sorted(latencias_por_endpoint.items()):
+        errores = errores_por_endpoint.get(nombre, 0)
+        if len(latencias) > 1:
+            cortes = quantiles(latencias, n=100, method='inclusive')
+            p50, p95, p99 = cortes[49], cortes[94], cortes[98]
+        else:
+            p50 = p95 = p99 = latencias[0]
+        resumen[nombre] = {
+            'peticiones': len(latencias),
+            'pet_s': round(len(latencias) / duracion, 2),
+            'p50_ms': round(p50 * 1000, 2),
+            'p95_ms': round(p95 * 1000, 2),
+            'p99_ms': round(p99 * 1000, 2),
+            'errores': errores,
+            'tasa_errores': round(errores / len(latencias), 4),
+        }
+    return resumen
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga por HTTP: inicia sesión como usuarios sintéticos, reproduce la '
+        'mezcla de peticiones del panel con concurrencia creciente e informa por endpoint '
+        'de peticiones/s, percentiles y errores.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor a medir.')
+        parser.add_argument(
+            '--iniciar',
+            choices=SERVIDORES,
+            help='Arranca el servidor en --url durante la prueba (si no, debe estar en marcha).',
+        )
+        parser.add_argument(
+            '--escalones',
+            default='1,4,16,32',
+            help='Usuarios concurrentes de cada escalón, separados por comas.',
+        )
+        parser.add_argument('--duracion', type=float, default=20, help='Segundos por escalón.')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre operaciones.')
+        parser.add_argument('--sin-etag', action='store_true', help='No envía If-None-Match.')
+        parser.add_argument('--dominio', default=sinteticos.DOMINIO)
+        parser.add_argument('--contrasena', default=sinteticos.CONTRASENA)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--salida', help='Guarda el resultado de cada escalón en este fichero JSON.')
+
+    def handle(self, *args, **options):
+        try:
+            escalones = [int(valor) for valor in options['escalones'].split(',')]
+        except ValueError:
+            raise CommandError('--escalones debe ser una lista de enteros separados por comas')
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('--url debe ser http://host:puerto')
+        self.host, self.puerto = url.hostname, url.port or 80
+
+        emails = list(
+            sinteticos.emails_existentes(options['dominio'])
+            .order_by('pk')
+            .values_list('email', flat=True)[:max(escalones)]
+        )
+        if not emails:
+            raise CommandError(
+                f"No hay usuarios @{options['dominio']}; ejecute antes generar_datos_sinteticos."
+            )
+
+        servidor = None
+        if options['iniciar']:
+            servidor = iniciar_servidor(options['iniciar'], self.host, self.puerto)
+            self.stdout.write(f"Iniciando {' '.join(servidor.args)}")
+        try:
+            if servidor is not None:
+                asyncio.run(esperar_servidor(servidor, self.host, self.puerto))
+            resultados = asyncio.run(self._prueba(emails, escalones, options))
+        finally:
+            if servidor is not None:
+                parar_servidor(servidor)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
+
+    async def _prueba(self, emails, escalones, options):
+        rng = random.Random(options['semilla'])
+        usuarios = [
+            UsuarioVirtual(
+                email,
+                ConexionHTTP(self.host, self.puerto),
+                random.Random(rng.random()),
+                not options['sin_etag'],
+            )
+            for email in emails
+        ]
+
+        self.stdout.write(f'Iniciando sesión con {len(usuarios)} usuarios...')
+        inicio = time.perf_counter()
+        await asyncio.gather(*(usuario.iniciar_sesion(options['contrasena']) for usuario in usuarios))
+        self.stdout.write(f'  {len(usuarios) / (time.perf_counter() - inicio):.1f} inicios de sesión/s')
+
+        # Un cliente por puesto de concurrencia, cada uno con su conexión; si
+        # hay menos usuarios que puestos, varios comparten token
+        for i in range(len(usuarios), max(escalones)):
+            origen = usuarios[i % len(emails)]
+            copia = UsuarioVirtual(
+                origen.email,
+                ConexionHTTP(self.host, self.puerto),
+                random.Random(rng.random()),
+                origen.usar_etag,
+            )
+            copia.token = origen.token
+            usuarios.append(copia)
+
+        operaciones, pesos = list(MEZCLA), list(MEZCLA.values())
+        resultados = []
+        try:
+            for concurrencia in escalones:
+                latencias, errores = defaultdict(list), defaultdict(int)
+                fin = time.monotonic() + options['duracion']
+
+                async def bucle(usuario):
+                    while time.monotonic() < fin:
+                        nombre = usuario.rng.choices(operaciones, weights=pesos)[0]
+                        inicio_peticion = time.perf_counter()
+                        try:
+                            nombre, codigo = await usuario.operacion(nombre)
+                        except (OSError, asyncio.IncompleteReadError, ValueError, KeyError):
+                            codigo = 0
+                            await usuario.conexion.cerrar()
+                        latencias[nombre].append(time.perf_counter() - inicio_peticion)
+                        errores[nombre] += codigo not in (200, 304)
+                        if options['pausa']:
+                            await asyncio.sleep(options['pausa'])
+
+                inicio = time.perf_counter()
+                await asyncio.gather(*(bucle(usuario) for usuario in usuarios[:concurrencia]))
+                duracion = time.perf_counter() - inicio
+                resumen = resumir(latencias, errores, duracion)
+                resultados.append(
+                    {'concurrencia': concurrencia, 'duracion_s': round(duracion, 2), 'endpoints': resumen}
+                )
+                self._informar(concurrencia, duracion, resumen)
+        finally:
+            for usuario in usuarios:
+                await usuario.conexion.cerrar()
+        return resultados
+
+    def _informar(self, concurrencia, duracion, resumen):
+        total = sum(medida['peticiones'] for medida in resumen.values())
+        errores = sum(medida['errores'] for medida in resumen.values())
+        self.stdout.write(
+            f'\n{concurrencia} usuarios concurrentes · {total / duracion:.1f} pet/s · '
+            f'{errores} errores ({errores / max(total, 1):.1%})'
+        )
+        self.stdout.write(
+            f"{'endpoint':<24} {'pet/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errores':>8}"
+        )
+        for nombre, medida in resumen.items():
+            self.stdout.write(
+                f"{nombre:<24} {medida['pet_s']:>8.1f} {medida['p50_ms']:>9.2f} "
+                f"{medida['p95_ms']:>9.2f} {medida['p99_ms']:>9.2f} {medida['errores']:>8}"
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tareas.sincronizacion import purgar_eliminaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las lápidas de sincronización más antiguas que TAREAS_SYNC_RETENCION_DIAS. '
+        'Programarlo a diario; los cursores anteriores a ese plazo reciben 410.'
+    )
+
+    def handle(self, *args, **options):
+        borradas = purgar_eliminaciones()
+        self.stdout.write(self.style.SUCCESS(f'{borradas} lápidas borradas.'))
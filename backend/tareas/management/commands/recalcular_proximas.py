@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tareas.proxima import barrer_proximas_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula proxima_ocurrencia de las tareas cuya próxima ocurrencia ya pasó. '
+        'Programarlo a diario poco después de medianoche (America/Bogota).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas',
+            action='store_true',
+            help='Recalcula todas las tareas, no solo las vencidas.',
+        )
+
+    def handle(self, *args, **options):
+        actualizadas = barrer_proximas_vencidas(todas=options['todas'])
+        self.stdout.write(self.style.SUCCESS(f'{actualizadas} tareas actualizadas.'))
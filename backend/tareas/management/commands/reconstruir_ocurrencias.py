@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas.materializacion import diferencias, horizonte, inicio_ventana, materializar_tarea
+from tareas.models import Tarea
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye la tabla tareas_ocurrencias en la ventana rodante (desde el corte del '
+        'archivo hasta el horizonte) y, opcionalmente, la contrasta con la expansión en vivo '
+        'de cada tarea.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Tras reconstruir, compara cada tarea con la expansión en vivo.',
+        )
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='No reconstruye; solo informa de las diferencias actuales.',
+        )
+
+    def handle(self, *args, **options):
+        tareas = Tarea.objects.order_by('pk')
+
+        if not options['solo_verificar']:
+            hasta = horizonte()
+            total = 0
+            for tarea in tareas.iterator(chunk_size=500):
+                total += materializar_tarea(tarea, hasta)
+            self.stdout.write(f'{total} ocurrencias añadidas entre {inicio_ventana()} y {hasta}.')
+
+        if not (options['verificar'] or options['solo_verificar']):
+            return
+
+        inconsistentes = 0
+        for tarea in tareas.iterator(chunk_size=500):
+            resultado = diferencias(tarea)
+            if resultado['faltantes'] or resultado['sobrantes']:
+                inconsistentes += 1
+                self.stdout.write(
+                    f"Tarea {tarea.pk}: {len(resultado['faltantes'])} faltantes, "
+                    f"{len(resultado['sobrantes'])} sobrantes"
+                )
+
+        if inconsistentes:
+            raise CommandError(f'{inconsistentes} tareas no coinciden con la expansión en vivo.')
+        self.stdout.write(self.style.SUCCESS('La tabla coincide con la expansión en vivo.'))
@@ -0,0 +1,157 @@
+"""Índice materializado de ocurrencias (tabla ``tareas_ocurrencias``).
+
+Solo se materializa una ventana rodante: desde el corte del archivo de estados
+(``archivo.corte()``) hasta el horizonte.  Cada tarea guarda en
+``materializada_desde`` y ``materializada_hasta`` los límites de sus filas
+escritas; ``materializada_desde`` es ``date.min`` si la tarea empieza dentro de
+la ventana.  Las señales de ``Tarea`` escriben las filas al crearla y, al
+modificar su recurrencia, solo borran las que sobran y añaden las que faltan.
+El borrado se propaga en cascada y el comando ``extender_ocurrencias`` empuja
+el horizonte hacia delante.  Las vistas expanden en vivo, como antes, las
+ventanas que la tabla no cubre, p. ej. las anteriores al corte.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import archivo
+from .models import Tarea, TareaOcurrencia
+from .utils import iterar_ocurrencias
+
+
+TAMANO_LOTE = 1000
+
+# Campos de ``Tarea`` que cambian el conjunto de ocurrencias
+CAMPOS_RECURRENCIA = frozenset(
+    {
+        'fecha_entrega',
+        'repeticion',
+        'intervalo_repeticion',
+        'fecha_fin_repeticion',
+        'activa',
+        'creado_por',
+    }
+)
+
+
+def horizonte(referencia: Optional[date] = None) -> date:
+    referencia = referencia or timezone.localdate()
+    meses = getattr(settings, 'TAREAS_HORIZONTE_OCURRENCIAS_MESES', 18)
+    return referencia + relativedelta(months=meses)
+
+
+def inicio_ventana(hoy: Optional[date] = None) -> date:
+    """Primera fecha que se materializa: las anteriores se expanden en vivo."""
+    return archivo.corte(hoy)
+
+
+def _esta_completa(tarea: Tarea, hasta: date) -> bool:
+    """Indica si ya no quedan ocurrencias posteriores a ``hasta``."""
+    if not tarea.activa or not tarea.fecha_entrega or tarea.repeticion == 'ninguna':
+        return True
+    return bool(tarea.fecha_fin_repeticion and tarea.fecha_fin_repeticion <= hasta)
+
+
+def _filas(tarea: Tarea, desde: date, hasta: date) -> Iterable[TareaOcurrencia]:
+    if not tarea.activa or not tarea.fecha_entrega:
+        return
+    # Una tarea sin repetición tiene una sola fila, aunque caiga tras el horizonte
+    limite = None if tarea.repeticion == 'ninguna' else hasta
+    for fecha in iterar_ocurrencias(tarea, desde, limite):
+        yield TareaOcurrencia(tarea_id=tarea.id_tarea, fecha=fecha, creado_por_id=tarea.creado_por_id)
+
+
+def _insertar(filas: Iterable[TareaOcurrencia]) -> int:
+    total = 0
+    lote: List[TareaOcurrencia] = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= TAMANO_LOTE:
+            TareaOcurrencia.objects.bulk_create(lote, ignore_conflicts=True)
+            total += len(lote)
+            lote = []
+    if lote:
+        TareaOcurrencia.objects.bulk_create(lote, ignore_conflicts=True)
+        total += len(lote)
+    return total
+
+
+def materializar_tarea(tarea: Tarea, hasta: Optional[date] = None, nueva: bool = False) -> int:
+    """Deja las ocurrencias materializadas de una tarea en ``[inicio_ventana(), hasta]``.
+
+    Una tarea existente solo pierde las filas que ya no le corresponden y
+    gana las que le faltan.  Devuelve cuántas filas se insertaron.
+    """
+    hasta = hasta or horizonte()
+    inicio = inicio_ventana()
+
+    with transaction.atomic():
+        esperadas = {fila.fecha: fila for fila in _filas(tarea, inicio, hasta)}
+        if not nueva:
+            filas = TareaOcurrencia.objects.filter(tarea_id=tarea.id_tarea)
+            guardadas = set(filas.filter(fecha__gte=inicio).values_list('fecha', flat=True))
+            filas.filter(fecha__lt=inicio).delete()
+            filas.exclude(creado_por_id=tarea.creado_por_id).update(creado_por_id=tarea.creado_por_id)
+            sobrantes = sorted(guardadas.difference(esperadas))
+            for posicion in range(0, len(sobrantes), TAMANO_LOTE):
+                filas.filter(fecha__in=sobrantes[posicion:posicion + TAMANO_LOTE]).delete()
+            for fecha in guardadas:
+                esperadas.pop(fecha, None)
+        total = _insertar(esperadas.values())
+
+        materializada_desde = inicio
+        if not tarea.fecha_entrega or tarea.fecha_entrega >= inicio:
+            materializada_desde = date.min
+        materializada_hasta = date.max if _esta_completa(tarea, hasta) else hasta
+        Tarea.objects.filter(pk=tarea.pk).update(
+            materializada_desde=materializada_desde, materializada_hasta=materializada_hasta
+        )
+
+    tarea.materializada_desde = materializada_desde
+    tarea.materializada_hasta = materializada_hasta
+    return total
+
+
+def extender_horizonte(hasta: Optional[date] = None) -> int:
+    """Añade las ocurrencias que faltan hasta ``hasta`` a todas las tareas."""
+    hasta = hasta or horizonte()
+    pendientes = Tarea.objects.filter(
+        Q(materializada_hasta__isnull=True) | Q(materializada_hasta__lt=hasta)
+    ).order_by('pk')
+
+    total = 0
+    for tarea in pendientes.iterator(chunk_size=TAMANO_LOTE):
+        if tarea.materializada_hasta is None:
+            total += materializar_tarea(tarea, hasta)
+            continue
+
+        with transaction.atomic():
+            total += _insertar(_filas(tarea, tarea.materializada_hasta + timedelta(days=1), hasta))
+            materializada_hasta = date.max if _esta_completa(tarea, hasta) else hasta
+            Tarea.objects.filter(pk=tarea.pk).update(materializada_hasta=materializada_hasta)
+
+    return total
+
+
+def diferencias(tarea: Tarea) -> dict:
+    """Compara las filas materializadas de una tarea con la expansión en vivo."""
+    guardadas = set(
+        TareaOcurrencia.objects.filter(tarea_id=tarea.id_tarea).values_list('fecha', flat=True)
+    )
+    esperadas = set()
+    if tarea.materializada_hasta and tarea.activa and tarea.fecha_entrega:
+        desde = max(tarea.fecha_entrega, tarea.materializada_desde or date.min)
+        limite = None if tarea.materializada_hasta == date.max else tarea.materializada_hasta
+        esperadas = set(iterar_ocurrencias(tarea, desde, limite))
+
+    return {
+        'faltantes': sorted(esperadas - guardadas),
+        'sobrantes': sorted(guardadas - esperadas),
+    }
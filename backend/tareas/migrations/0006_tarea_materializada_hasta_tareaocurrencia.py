@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0005_remove_tarea_es_recurrente_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='materializada_hasta',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TareaOcurrencia',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('creado_por', models.ForeignKey(db_column='creado_por', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tarea', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias_materializadas', to='tareas.tarea')),
+            ],
+            options={
+                'db_table': 'tareas_ocurrencias',
+                'indexes': [models.Index(fields=['creado_por', 'fecha'], name='tareas_ocur_usuario_fecha_idx')],
+                'unique_together': {('tarea', 'fecha')},
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:07
+
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def ocurrencias_desde(tarea, desde):
+    """Ocurrencias recurrentes en o después de ``desde``, con la aritmética de recurrencias de esta versión.
+
+    Copiada aquí para que la migración no dependa de ``tareas.utils``.
+    """
+    intervalo = tarea.intervalo_repeticion or 1
+    anclaje = tarea.fecha_entrega
+    if tarea.repeticion in ('diaria', 'personalizada', 'semanal'):
+        paso = 7 * intervalo if tarea.repeticion == 'semanal' else intervalo
+
+        def fecha_en_indice(indice):
+            return anclaje + timedelta(days=indice * paso)
+
+        indice = 0 if desde <= anclaje else -(-(desde - anclaje).days // paso)
+    elif tarea.repeticion == 'mensual':
+
+        def fecha_en_indice(indice):
+            return anclaje + relativedelta(months=indice * intervalo)
+
+        meses = (desde.year - anclaje.year) * 12 + (desde.month - anclaje.month)
+        indice = max(0, -(-meses // intervalo))
+        if fecha_en_indice(indice) < desde:
+            indice += 1
+    else:
+        return
+
+    while True:
+        fecha = fecha_en_indice(indice)
+        if tarea.fecha_fin_repeticion and fecha > tarea.fecha_fin_repeticion:
+            return
+        yield fecha
+        indice += 1
+
+
+def poblar_proxima_ocurrencia(apps, schema_editor):
+    Tarea = apps.get_model('tareas', 'Tarea')
+    TareaCompletada = apps.get_model('tareas', 'TareaCompletada')
+    hoy = timezone.localdate()
+
+    completadas = {}
+    for tarea_id, fecha in TareaCompletada.objects.filter(fecha__gte=hoy).values_list('tarea_id', 'fecha'):
+        completadas.setdefault(tarea_id, set()).add(fecha)
+
+    cambiadas = []
+    for tarea in Tarea.objects.filter(activa=True).exclude(fecha_entrega=None).iterator():
+        proxima = None
+        if tarea.repeticion == 'ninguna':
+            if tarea.estado != 'completada' and tarea.fecha_entrega >= hoy:
+                proxima = tarea.fecha_entrega
+        else:
+            hechas = completadas.get(tarea.pk, set())
+            proxima = next(
+                (fecha for fecha in ocurrencias_desde(tarea, hoy) if fecha not in hechas),
+                None,
+            )
+        if proxima:
+            tarea.proxima_ocurrencia = proxima
+            cambiadas.append(tarea)
+
+    Tarea.objects.bulk_update(cambiadas, ['proxima_ocurrencia'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0006_tarea_materializada_hasta_tareaocurrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='proxima_ocurrencia',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['creado_por', 'activa', 'proxima_ocurrencia'], name='tareas_usuario_proxima_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['proxima_ocurrencia'], name='tareas_proxima_idx'),
+        ),
+        migrations.RunPython(poblar_proxima_ocurrencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0007_tarea_proxima_ocurrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['creado_por', 'activa', 'fecha_creacion', 'id_tarea'], name='tareas_usuario_creacion_idx'),
+        ),
+    ]
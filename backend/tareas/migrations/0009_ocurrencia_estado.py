@@ -0,0 +1,119 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copiar_estados(apps, schema_editor):
+    """Vuelca tareas_completadas y tareas_en_proceso en la tabla unificada.
+
+    Si una ocurrencia aparece en ambas tablas gana la completada, igual que al
+    serializar las ocurrencias.
+    """
+    OcurrenciaEstado = apps.get_model('tareas', 'OcurrenciaEstado')
+    TareaCompletada = apps.get_model('tareas', 'TareaCompletada')
+    TareaEnProceso = apps.get_model('tareas', 'TareaEnProceso')
+
+    filas = [
+        OcurrenciaEstado(
+            tarea_id=item.tarea_id,
+            fecha=item.fecha,
+            estado='completada',
+            marcada_en=item.completada_en,
+            notas=item.notas,
+        )
+        for item in TareaCompletada.objects.iterator()
+    ]
+    OcurrenciaEstado.objects.bulk_create(filas, batch_size=1000)
+
+    filas = [
+        OcurrenciaEstado(
+            tarea_id=item.tarea_id,
+            fecha=item.fecha,
+            estado='en_proceso',
+            marcada_en=item.iniciada_en,
+            notas=item.notas,
+        )
+        for item in TareaEnProceso.objects.iterator()
+    ]
+    OcurrenciaEstado.objects.bulk_create(filas, batch_size=1000, ignore_conflicts=True)
+
+
+def separar_estados(apps, schema_editor):
+    OcurrenciaEstado = apps.get_model('tareas', 'OcurrenciaEstado')
+    TareaCompletada = apps.get_model('tareas', 'TareaCompletada')
+    TareaEnProceso = apps.get_model('tareas', 'TareaEnProceso')
+
+    TareaCompletada.objects.bulk_create(
+        [
+            TareaCompletada(tarea_id=item.tarea_id, fecha=item.fecha, completada_en=item.marcada_en, notas=item.notas)
+            for item in OcurrenciaEstado.objects.filter(estado='completada').iterator()
+        ],
+        batch_size=1000,
+    )
+    TareaEnProceso.objects.bulk_create(
+        [
+            TareaEnProceso(tarea_id=item.tarea_id, fecha=item.fecha, iniciada_en=item.marcada_en, notas=item.notas)
+            for item in OcurrenciaEstado.objects.filter(estado='en_proceso').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0008_tarea_indice_creacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcurrenciaEstado',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('en_proceso', 'En Proceso'), ('completada', 'Completada')], max_length=20)),
+                ('marcada_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notas', models.TextField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('tarea', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estados_ocurrencia', to='tareas.tarea')),
+            ],
+            options={
+                'db_table': 'tareas_ocurrencia_estado',
+                'constraints': [models.UniqueConstraint(fields=('tarea', 'fecha'), name='tareas_ocurrencia_estado_unico')],
+            },
+        ),
+        migrations.RunPython(copiar_estados, separar_estados),
+        migrations.DeleteModel(
+            name='TareaCompletada',
+        ),
+        migrations.DeleteModel(
+            name='TareaEnProceso',
+        ),
+        migrations.CreateModel(
+            name='TareaCompletada',
+            fields=[
+            ],
+            options={
+                'ordering': ['-marcada_en'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('tareas.ocurrenciaestado',),
+        ),
+        migrations.CreateModel(
+            name='TareaEnProceso',
+            fields=[
+            ],
+            options={
+                'ordering': ['-marcada_en'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('tareas.ocurrenciaestado',),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0009_ocurrencia_estado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['creado_por', 'activa', 'repeticion', 'fecha_entrega'], name='tareas_usuario_rep_entrega_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(condition=models.Q(('repeticion', 'ninguna'), _negated=True), fields=['creado_por', 'activa', 'fecha_entrega'], name='tareas_recurrentes_idx'),
+        ),
+    ]
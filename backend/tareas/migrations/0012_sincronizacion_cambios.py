@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0011_version_usuario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('tarea', 'Tarea'), ('ocurrencia', 'Estado de ocurrencia')], max_length=20)),
+                ('tarea_id', models.IntegerField()),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'tareas_eliminaciones',
+            },
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='ocurrenciaestado',
+            index=models.Index(fields=['actualizado_en'], name='tareas_estado_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['creado_por', 'actualizado_en'], name='tareas_usuario_actualizado_idx'),
+        ),
+        migrations.AddField(
+            model_name='eliminacion',
+            name='usuario',
+            field=models.ForeignKey(db_column='usuario_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['usuario', 'eliminado_en'], name='tareas_elim_usuario_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def particionar_en_postgres(apps, schema_editor):
+    """En PostgreSQL rehace la tabla (vacía) particionada por mes de ``fecha``.
+
+    La clave primaria de una tabla particionada tiene que incluir la columna
+    de partición, así que es ``(id, fecha)``; para Django ``id`` sigue siendo
+    la clave.  Las particiones las crea ``archivar_estados`` según las necesita.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TABLE tareas_ocurrencia_estado_archivo')
+    schema_editor.execute(
+        """
+        CREATE TABLE tareas_ocurrencia_estado_archivo (
+            id bigserial NOT NULL,
+            tarea_id integer NOT NULL
+                REFERENCES tareas (id_tarea) DEFERRABLE INITIALLY DEFERRED,
+            fecha date NOT NULL,
+            estado varchar(20) NOT NULL,
+            marcada_en timestamp with time zone NOT NULL,
+            notas text NULL,
+            creado_en timestamp with time zone NOT NULL,
+            actualizado_en timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, fecha),
+            CONSTRAINT tareas_estado_archivo_unico UNIQUE (tarea_id, fecha)
+        ) PARTITION BY RANGE (fecha)
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0012_sincronizacion_cambios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcurrenciaEstadoArchivada',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('en_proceso', 'En Proceso'), ('completada', 'Completada')], max_length=20)),
+                ('marcada_en', models.DateTimeField()),
+                ('notas', models.TextField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField()),
+                ('actualizado_en', models.DateTimeField()),
+                ('tarea', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='estados_archivados', to='tareas.tarea')),
+            ],
+            options={
+                'db_table': 'tareas_ocurrencia_estado_archivo',
+                'constraints': [models.UniqueConstraint(fields=('tarea', 'fecha'), name='tareas_estado_archivo_unico')],
+            },
+        ),
+        migrations.RunPython(particionar_en_postgres, migrations.RunPython.noop),
+    ]
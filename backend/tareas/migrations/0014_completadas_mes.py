@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0013_ocurrencia_estado_archivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletadasMes',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('mes', models.DateField()),
+                ('dias', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('tarea', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='completadas_mes', to='tareas.tarea')),
+            ],
+            options={
+                'db_table': 'tareas_completadas_mes',
+                'constraints': [models.UniqueConstraint(fields=('tarea', 'mes'), name='tareas_completadas_mes_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:02
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def marcar_completas(apps, schema_editor):
+    # Hasta ahora se materializaba desde fecha_entrega: esas tareas tienen todas sus filas
+    Tarea = apps.get_model('tareas', 'Tarea')
+    Tarea.objects.filter(materializada_hasta__isnull=False).update(materializada_desde=date.min)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0014_completadas_mes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='materializada_desde',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(marcar_completas, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,27 @@ from django.utils import timezone
 from usuarios.models import Usuario
 
 
+class TareaQuerySet(models.QuerySet):
+    def en_ventana(self, fecha_inicio, fecha_fin):
+        """Tareas que pueden tener ocurrencias entre ``fecha_inicio`` y ``fecha_fin``.
+
+        Las tareas sin repetición solo si su entrega cae en la ventana; las
+        recurrentes si empezaron antes de ``fecha_fin`` y no terminaron antes
+        de ``fecha_inicio``.  Lo resuelven los índices
+        ``tareas_usuario_rep_entrega_idx`` y ``tareas_recurrentes_idx``.
+        """
+        unicas = models.Q(repeticion='ninguna', fecha_entrega__range=(fecha_inicio, fecha_fin))
+        recurrentes = (
+            ~models.Q(repeticion='ninguna')
+            & models.Q(fecha_entrega__lte=fecha_fin)
+            & (
+                models.Q(fecha_fin_repeticion__isnull=True)
+                | models.Q(fecha_fin_repeticion__gte=fecha_inicio)
+            )
+        )
+        return self.filter(unicas | recurrentes)
+
+
 class Tarea(models.Model):
     CATEGORIA_CHOICES = [
         ('trabajo', 'Trabajo'),
@@ -35,6 +56,18 @@ class Tarea(models.Model):
     intervalo_repeticion = models.PositiveIntegerField(default=1)
     fecha_fin_repeticion = models.DateField(blank=True, null=True)
     activa = models.BooleanField(default=True)
+    # Primera fecha desde la que sus ocurrencias están en ``tareas_ocurrencias``;
+    # ``date.min`` si están todas.  Las ventanas anteriores se expanden en vivo.
+    materializada_desde = models.DateField(blank=True, null=True)
+    # Fecha hasta la que sus ocurrencias están en ``tareas_ocurrencias``;
+    # ``date.max`` cuando la tarea ya no tiene ocurrencias futuras que añadir.
+    materializada_hasta = models.DateField(blank=True, null=True)
+    # Próxima ocurrencia no completada desde hoy; la recalculan las señales,
+    # actualizar_ocurrencia y el barrido diario ``recalcular_proximas``.
+    proxima_ocurrencia = models.DateField(blank=True, null=True)
+    # Última escritura visible para el cliente; base de la sincronización por
+    # cambios.  Las escrituras con ``update()``/``bulk_update`` lo fijan a mano.
+    actualizado_en = models.DateTimeField(auto_now=True)
     creado_por = models.ForeignKey(
         Usuario,
         on_delete=models.SET_NULL,
@@ -43,40 +76,259 @@ class Tarea(models.Model):
         db_column='creado_por',
     )
 
+    objects = TareaQuerySet.as_manager()
+
     class Meta:
         db_table = 'tareas'
+        indexes = [
+            models.Index(
+                fields=['creado_por', 'activa', 'proxima_ocurrencia'],
+                name='tareas_usuario_proxima_idx',
+            ),
+            models.Index(fields=['proxima_ocurrencia'], name='tareas_proxima_idx'),
+            models.Index(
+                fields=['creado_por', 'activa', 'fecha_creacion', 'id_tarea'],
+                name='tareas_usuario_creacion_idx',
+            ),
+            models.Index(
+                fields=['creado_por', 'activa', 'repeticion', 'fecha_entrega'],
+                name='tareas_usuario_rep_entrega_idx',
+            ),
+            models.Index(
+                fields=['creado_por', 'activa', 'fecha_entrega'],
+                name='tareas_recurrentes_idx',
+                condition=~models.Q(repeticion='ninguna'),
+            ),
+            models.Index(
+                fields=['creado_por', 'actualizado_en'],
+                name='tareas_usuario_actualizado_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.titulo
 
 
-class TareaCompletada(models.Model):
-    id = models.AutoField(primary_key=True)
-    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, related_name='ocurrencias_completadas')
+class OcurrenciaEstado(models.Model):
+    """Estado de una ocurrencia concreta; la ausencia de fila significa pendiente."""
+
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En Proceso'),
+        ('completada', 'Completada'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, related_name='estados_ocurrencia')
     fecha = models.DateField()
-    completada_en = models.DateTimeField(default=timezone.now)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES)
+    # Momento en que la ocurrencia entró en su estado actual
+    marcada_en = models.DateTimeField(default=timezone.now)
     notas = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'tareas_completadas'
-        unique_together = ('tarea', 'fecha')
-        ordering = ['-completada_en']
+        db_table = 'tareas_ocurrencia_estado'
+        constraints = [
+            models.UniqueConstraint(fields=['tarea', 'fecha'], name='tareas_ocurrencia_estado_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['actualizado_en'], name='tareas_estado_actualizado_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.tarea.titulo} completada el {self.fecha}"
+        return f"{self.tarea.titulo} {self.estado} el {self.fecha}"
+
+
+class OcurrenciaEstadoArchivada(models.Model):
+    """Estado de una ocurrencia anterior al corte de ``tareas.archivo``.
 
+    Misma forma que ``OcurrenciaEstado``; las marcas de tiempo se copian tal
+    cual al archivar.  En PostgreSQL la tabla está particionada por mes de
+    ``fecha`` (migración 0013).
+    """
 
-class TareaEnProceso(models.Model):
-    id = models.AutoField(primary_key=True)
-    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, related_name='ocurrencias_en_proceso')
+    id = models.BigAutoField(primary_key=True)
+    tarea = models.ForeignKey(
+        Tarea, on_delete=models.CASCADE, related_name='estados_archivados', db_index=False
+    )
     fecha = models.DateField()
-    iniciada_en = models.DateTimeField(default=timezone.now)
+    estado = models.CharField(max_length=20, choices=OcurrenciaEstado.ESTADO_CHOICES)
+    marcada_en = models.DateTimeField()
     notas = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField()
+    actualizado_en = models.DateTimeField()
 
     class Meta:
-        db_table = 'tareas_en_proceso'
-        unique_together = ('tarea', 'fecha')
-        ordering = ['-iniciada_en']
+        db_table = 'tareas_ocurrencia_estado_archivo'
+        constraints = [
+            models.UniqueConstraint(fields=['tarea', 'fecha'], name='tareas_estado_archivo_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea.titulo} {self.estado} el {self.fecha} (archivado)"
+
+
+class CompletadasMes(models.Model):
+    """Completadas sin notas de una tarea recurrente en un mes, como mapa de bits.
+
+    El bit ``d - 1`` de ``dias`` indica que la ocurrencia del día ``d`` está
+    completada.  Ver ``tareas.compactas``.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    tarea = models.ForeignKey(
+        Tarea, on_delete=models.CASCADE, related_name='completadas_mes', db_index=False
+    )
+    # Primer día del mes
+    mes = models.DateField()
+    dias = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'tareas_completadas_mes'
+        constraints = [
+            models.UniqueConstraint(fields=['tarea', 'mes'], name='tareas_completadas_mes_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea.titulo} {self.mes:%Y-%m}: {self.dias:031b}"
+
+
+class EstadoOcurrenciaManager(models.Manager):
+    def __init__(self, estado):
+        super().__init__()
+        self.estado = estado
+
+    def get_queryset(self):
+        return super().get_queryset().filter(estado=self.estado)
+
+
+class TareaCompletada(OcurrenciaEstado):
+    """Vista de compatibilidad sobre ``OcurrenciaEstado`` para ocurrencias completadas."""
+
+    objects = EstadoOcurrenciaManager('completada')
+
+    class Meta:
+        proxy = True
+        ordering = ['-marcada_en']
+
+    @property
+    def completada_en(self):
+        return self.marcada_en
+
+    @completada_en.setter
+    def completada_en(self, valor):
+        self.marcada_en = valor
+
+    def save(self, *args, **kwargs):
+        self.estado = 'completada'
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.tarea.titulo} completada el {self.fecha}"
+
+
+class TareaEnProceso(OcurrenciaEstado):
+    """Vista de compatibilidad sobre ``OcurrenciaEstado`` para ocurrencias en proceso."""
+
+    objects = EstadoOcurrenciaManager('en_proceso')
+
+    class Meta:
+        proxy = True
+        ordering = ['-marcada_en']
+
+    @property
+    def iniciada_en(self):
+        return self.marcada_en
+
+    @iniciada_en.setter
+    def iniciada_en(self, valor):
+        self.marcada_en = valor
+
+    def save(self, *args, **kwargs):
+        self.estado = 'en_proceso'
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.tarea.titulo} en proceso el {self.fecha}"
+
+
+class TareaOcurrencia(models.Model):
+    """Ocurrencia materializada de una tarea dentro del horizonte rodante."""
+
+    id = models.BigAutoField(primary_key=True)
+    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, related_name='ocurrencias_materializadas')
+    fecha = models.DateField()
+    creado_por = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        db_column='creado_por',
+    )
+
+    class Meta:
+        db_table = 'tareas_ocurrencias'
+        unique_together = ('tarea', 'fecha')
+        indexes = [
+            models.Index(fields=['creado_por', 'fecha'], name='tareas_ocur_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea_id} el {self.fecha}"
+
+
+class VersionUsuario(models.Model):
+    """Contador de cambios de los datos de un usuario; de él salen los ETag."""
+
+    usuario = models.OneToOneField(
+        Usuario,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        db_column='usuario_id',
+    )
+    version = models.BigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'tareas_version_usuario'
+
+    def __str__(self):
+        return f"{self.usuario_id} v{self.version}"
+
+
+class Eliminacion(models.Model):
+    """Lápida de un borrado físico, para que ``cambios`` lo pueda informar.
+
+    Las tareas borradas dejan una lápida con ``fecha`` nula; los estados de
+    ocurrencia (volver a pendiente), una con su fecha.  Los estados que caen en
+    cascada con su tarea no dejan lápida propia.
+    """
+
+    TIPO_CHOICES = [
+        ('tarea', 'Tarea'),
+        ('ocurrencia', 'Estado de ocurrencia'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_column='usuario_id',
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    tarea_id = models.IntegerField()
+    fecha = models.DateField(blank=True, null=True)
+    eliminado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'tareas_eliminaciones'
+        indexes = [
+            models.Index(fields=['usuario', 'eliminado_en'], name='tareas_elim_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.tarea_id} eliminada el {self.eliminado_en}"
@@ -0,0 +1,215 @@
+"""Expansión por lotes de ocurrencias con NumPy.
+
+Las tareas se convierten en arreglos columnares (anclaje, regla, paso, fin) y
+todas las parejas ``(tarea, fecha)`` de la ventana se calculan en una sola
+pasada vectorizada con ``datetime64``.  NumPy es opcional: si no está
+instalado, ``lote_disponible()`` devuelve ``False`` y las vistas siguen usando
+la expansión tarea a tarea de ``tareas.utils``.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+from tarea_api.instrumentacion import contar
+
+from .models import Tarea
+from .utils import MAX_OCCURRENCIAS_SEGURIDAD
+
+
+# Por debajo de este número de tareas el coste fijo de armar los arreglos
+# supera al del bucle en Python (ver ``manage.py benchmark_recurrencia --lote``).
+UMBRAL_TAREAS_LOTE = 16
+
+REGLA_DIAS = 0
+REGLA_MESES = 1
+
+# Paso artificial para tareas sin repetición: solo el índice 0 cae en la ventana.
+_PASO_SIN_REPETICION = 10 ** 7
+
+
+def lote_disponible() -> bool:
+    return np is not None
+
+
+def _columnas(tareas: Sequence[Tarea], fecha_fin: date):
+    n = len(tareas)
+    anclaje = np.empty(n, dtype='datetime64[D]')
+    limite = np.empty(n, dtype='datetime64[D]')
+    regla = np.empty(n, dtype=np.int8)
+    paso = np.empty(n, dtype=np.int64)
+    valida = np.ones(n, dtype=bool)
+    fin = np.datetime64(fecha_fin, 'D')
+
+    for i, tarea in enumerate(tareas):
+        intervalo = tarea.intervalo_repeticion or 1
+        anclaje[i] = tarea.fecha_entrega or fin
+        valida[i] = tarea.fecha_entrega is not None
+        limite[i] = fin
+        if tarea.repeticion != 'ninguna' and tarea.fecha_fin_repeticion:
+            limite[i] = min(fin, np.datetime64(tarea.fecha_fin_repeticion, 'D'))
+
+        if tarea.repeticion == 'mensual':
+            regla[i] = REGLA_MESES
+            paso[i] = intervalo
+        else:
+            regla[i] = REGLA_DIAS
+            if tarea.repeticion in ('diaria', 'personalizada'):
+                paso[i] = intervalo
+            elif tarea.repeticion == 'semanal':
+                paso[i] = 7 * intervalo
+            else:
+                paso[i] = _PASO_SIN_REPETICION
+                valida[i] &= tarea.repeticion == 'ninguna'
+
+    return anclaje, limite, regla, paso, valida
+
+
+def _fecha_mensual(anclaje_mes, dia_anclaje, paso, indice):
+    """Fecha de la ocurrencia ``indice`` recortando el día al final de mes."""
+    mes = anclaje_mes + indice * paso
+    inicio_mes = mes.astype('datetime64[D]')
+    dias_mes = ((mes + 1).astype('datetime64[D]') - inicio_mes).astype(np.int64)
+    return inicio_mes + np.minimum(dia_anclaje, dias_mes - 1)
+
+
+def _division_techo(a, b):
+    return -(-a // b)
+
+
+def expandir_lote(
+    tareas: Sequence[Tarea],
+    fecha_inicio: date,
+    fecha_fin: date,
+):
+    """Devuelve ``(posiciones, fechas)`` con todas las ocurrencias de la ventana.
+
+    ``posiciones`` indexa ``tareas`` y ``fechas`` es ``datetime64[D]``.  El
+    orden es el mismo que el de la expansión tarea a tarea: por posición de la
+    tarea y, dentro de cada una, por fecha ascendente.
+    """
+    vacio = (np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[D]'))
+    if not tareas or fecha_fin < fecha_inicio:
+        return vacio
+
+    anclaje, limite, regla, paso, valida = _columnas(tareas, fecha_fin)
+    inicio = np.datetime64(fecha_inicio, 'D')
+
+    # Reglas basadas en días: índice k tal que anclaje + k*paso cae en la ventana
+    desde_anclaje = (inicio - anclaje).astype(np.int64)
+    hasta_limite = (limite - anclaje).astype(np.int64)
+    primero = np.maximum(0, _division_techo(desde_anclaje, paso))
+    ultimo = np.where(hasta_limite >= 0, hasta_limite // paso, -1)
+
+    mensual = regla == REGLA_MESES
+    if mensual.any():
+        anclaje_mes = anclaje.astype('datetime64[M]')
+        dia_anclaje = (anclaje - anclaje_mes.astype('datetime64[D]')).astype(np.int64)
+        paso_m = paso[mensual]
+        mes_a = anclaje_mes[mensual]
+        dia_a = dia_anclaje[mensual]
+
+        meses_inicio = (inicio.astype('datetime64[M]') - mes_a).astype(np.int64)
+        primero_m = np.maximum(0, _division_techo(meses_inicio, paso_m))
+        primero_m += _fecha_mensual(mes_a, dia_a, paso_m, primero_m) < inicio
+
+        meses_limite = (limite[mensual].astype('datetime64[M]') - mes_a).astype(np.int64)
+        ultimo_m = np.where(meses_limite >= 0, meses_limite // paso_m, -1)
+        ultimo_m -= (ultimo_m >= 0) & (
+            _fecha_mensual(mes_a, dia_a, paso_m, ultimo_m) > limite[mensual]
+        )
+
+        primero[mensual] = primero_m
+        ultimo[mensual] = ultimo_m
+
+    cantidad = np.clip(ultimo - primero + 1, 0, MAX_OCCURRENCIAS_SEGURIDAD)
+    cantidad[~valida] = 0
+    cortes = int(((ultimo - primero + 1 > MAX_OCCURRENCIAS_SEGURIDAD) & valida).sum())
+    if cortes:
+        contar('cortes', cortes)
+    total = int(cantidad.sum())
+    if total == 0:
+        return vacio
+
+    posiciones = np.repeat(np.arange(len(tareas), dtype=np.int64), cantidad)
+    desplazamiento = np.arange(total, dtype=np.int64) - np.repeat(
+        np.cumsum(cantidad) - cantidad, cantidad
+    )
+    indices = primero[posiciones] + desplazamiento
+
+    fechas = anclaje[posiciones] + indices * paso[posiciones]
+    es_mensual = mensual[posiciones]
+    if es_mensual.any():
+        pos_m = posiciones[es_mensual]
+        fechas[es_mensual] = _fecha_mensual(
+            anclaje_mes[pos_m], dia_anclaje[pos_m], paso[pos_m], indices[es_mensual]
+        )
+
+    return posiciones, fechas
+
+
+def _claves(ids, fechas):
+    """Empaqueta ``(tarea_id, fecha)`` en un entero de 64 bits ordenable."""
+    return (ids.astype(np.int64) << 32) + (fechas.astype(np.int64) + (1 << 31))
+
+
+def buscar_estados(ids, fechas, estados: Dict[Tuple[int, date], object]) -> List[Optional[object]]:
+    """Cruza las ocurrencias con un mapa de estados mediante ``searchsorted``."""
+    if not estados or len(ids) == 0:
+        return [None] * len(ids)
+
+    llaves = list(estados.keys())
+    objetos = np.empty(len(llaves) + 1, dtype=object)
+    objetos[:-1] = [estados[llave] for llave in llaves]
+    objetos[-1] = None
+
+    claves_estado = _claves(
+        np.fromiter((llave[0] for llave in llaves), dtype=np.int64, count=len(llaves)),
+        np.array([llave[1] for llave in llaves], dtype='datetime64[D]'),
+    )
+    orden = np.argsort(claves_estado)
+    claves_estado = claves_estado[orden]
+
+    claves = _claves(ids, fechas)
+    posicion = np.searchsorted(claves_estado, claves)
+    posicion_segura = np.minimum(posicion, len(claves_estado) - 1)
+    encontrada = claves_estado[posicion_segura] == claves
+
+    resultado = np.where(encontrada, orden[posicion_segura], len(llaves))
+    return objetos[resultado].tolist()
+
+
+def ocurrencias_con_estados(
+    tareas: Sequence[Tarea],
+    fecha_inicio: date,
+    fecha_fin: date,
+    mapas_estados: Dict[str, Dict],
+):
+    """Expande la ventana y une los estados.
+
+    Devuelve tuplas ``(tarea, fecha, fecha_iso, completada, en_proceso)``; la
+    fecha en ISO se formatea de forma vectorizada porque domina el coste de
+    construir el payload.
+    """
+    posiciones, fechas = expandir_lote(tareas, fecha_inicio, fecha_fin)
+    if len(posiciones) == 0:
+        return []
+
+    ids = np.fromiter((t.id_tarea for t in tareas), dtype=np.int64, count=len(tareas))[posiciones]
+    completadas = buscar_estados(ids, fechas, mapas_estados['completadas'])
+    en_proceso = buscar_estados(ids, fechas, mapas_estados['en_proceso'])
+
+    return list(
+        zip(
+            [tareas[posicion] for posicion in posiciones.tolist()],
+            fechas.astype(object).tolist(),
+            np.datetime_as_string(fechas, unit='D').tolist(),
+            completadas,
+            en_proceso,
+        )
+    )
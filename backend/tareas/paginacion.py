@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TareaCursorPagination(BasePagination):
+    """Paginación por clave (keyset) sobre ``(fecha_creacion, id_tarea)``.
+
+    Es opcional: solo se activa si la petición trae ``cursor`` o ``page_size``,
+    así los clientes actuales siguen recibiendo la lista completa.  Cada página
+    filtra por la clave de la última fila servida, de modo que la página N
+    cuesta lo mismo que la primera.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-fecha_creacion', '-id_tarea')
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'TAREAS_TAMANO_PAGINA', 50)
+        self.max_page_size = getattr(settings, 'TAREAS_TAMANO_PAGINA_MAXIMO', 200)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        parametros = request.query_params
+        if self.cursor_query_param not in parametros and self.page_size_query_param not in parametros:
+            return None
+
+        if parametros.get('ordering'):
+            raise ValidationError(
+                {'ordering': 'La paginación por cursor solo admite el orden por fecha de creación.'}
+            )
+
+        self.request = request
+        tamano = self._tamano_pagina(parametros.get(self.page_size_query_param))
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = parametros.get(self.cursor_query_param)
+        if cursor:
+            fecha_creacion, id_tarea = self._decodificar(cursor)
+            queryset = queryset.filter(
+                Q(fecha_creacion__lt=fecha_creacion)
+                | Q(fecha_creacion=fecha_creacion, id_tarea__lt=id_tarea)
+            )
+
+        filas = list(queryset[:tamano + 1])
+        self.hay_siguiente = len(filas) > tamano
+        self.pagina = filas[:tamano]
+        self.tamano = tamano
+        return self.pagina
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.hay_siguiente:
+            return None
+        ultima = self.pagina[-1]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.tamano)
+        return replace_query_param(
+            url, self.cursor_query_param, self._codificar(ultima.fecha_creacion, ultima.id_tarea)
+        )
+
+    def _tamano_pagina(self, valor):
+        if not valor:
+            return self.page_size
+        try:
+            tamano = int(valor)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Debe ser un número entero.'})
+        if tamano < 1:
+            raise ValidationError({self.page_size_query_param: 'Debe ser al menos 1.'})
+        return min(tamano, self.max_page_size)
+
+    def _codificar(self, fecha_creacion, id_tarea):
+        crudo = json.dumps({'f': fecha_creacion.isoformat(), 'id': id_tarea})
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+    def _decodificar(self, cursor):
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            return datetime.fromisoformat(datos['f']), int(datos['id'])
+        except (ValueError, KeyError, TypeError):
+            raise NotFound('Cursor inválido.')
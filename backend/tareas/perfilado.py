@@ -0,0 +1,178 @@
+"""Perfilado bajo demanda de una petición concreta (solo personal).
+
+Con la cabecera ``X-Perfilar: 1`` o ``?perfilar=1``, un usuario ``is_staff``
+ejecuta la vista y el renderizado de DRF bajo el perfilador y recibe en
+``X-Perfil`` el nombre del fichero guardado en ``TAREAS_PERFILES_DIR``.  Con
+``X-Perfilar-Usuario: <id>`` un superusuario perfila una petición GET con los
+datos reales de ese usuario: la respuesta se descarta (``204`` con solo
+``X-Perfil``), queda una línea de auditoría con los dos ids y no se admite en
+las acciones que entregan credenciales o el historial completo
+(``SIN_SUPLANTACION``).  Las demás peticiones solo pagan la comprobación de
+la cabecera.
+
+El perfilador por defecto es ``cProfile`` (determinista, ``.prof`` para
+``pstats``/snakeviz).  Con ``TAREAS_PERFILADOR=pyinstrument`` se usa el
+muestreo estadístico de pyinstrument, que es opcional y guarda un ``.html``.
+Junto al perfil se guarda ``.sql.json`` con las consultas y su duración.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import tempfile
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+
+from usuarios.models import Usuario
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - depende del entorno
+    Profiler = None
+
+
+CABECERA = 'X-Perfilar'
+CABECERA_USUARIO = 'X-Perfilar-Usuario'
+PARAMETRO = 'perfilar'
+# Acciones que no se perfilan como otro usuario: el enlace y el feed iCalendar
+# llevan su token y ``cambios`` devuelve todos sus datos
+SIN_SUPLANTACION = frozenset({'ical_enlace', 'ical', 'cambios'})
+
+logger = logging.getLogger(__name__)
+
+
+def solicitado(request) -> bool:
+    return request.headers.get(CABECERA) == '1' or request.GET.get(PARAMETRO) == '1'
+
+
+def directorio() -> str:
+    return getattr(settings, 'TAREAS_PERFILES_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'tarea-api-perfiles'
+    )
+
+
+class _PerfiladorCProfile:
+    extension = 'prof'
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+
+    def iniciar(self):
+        self.perfil.enable()
+
+    def detener(self):
+        self.perfil.disable()
+
+    def guardar(self, ruta: str):
+        self.perfil.dump_stats(ruta)
+
+
+class _PerfiladorPyinstrument:
+    extension = 'html'
+
+    def __init__(self):
+        self.perfil = Profiler()
+
+    def iniciar(self):
+        self.perfil.start()
+
+    def detener(self):
+        self.perfil.stop()
+
+    def guardar(self, ruta: str):
+        with open(ruta, 'w', encoding='utf-8') as fichero:
+            fichero.write(self.perfil.output_html())
+
+
+def nuevo_perfilador():
+    if getattr(settings, 'TAREAS_PERFILADOR', 'cprofile') == 'pyinstrument' and Profiler is not None:
+        return _PerfiladorPyinstrument()
+    return _PerfiladorCProfile()
+
+
+class PerfiladoMixin:
+    """Para ``APIView``: perfila la petición si la pide alguien del personal."""
+
+    def initial(self, request, *args, **kwargs):
+        self.perfilado = None
+        self.perfil_suplantado = False
+        super().initial(request, *args, **kwargs)
+        if not solicitado(request):
+            return
+        if not request.user.is_staff:
+            raise PermissionDenied('Solo el personal puede perfilar peticiones.')
+
+        usuario_id = request.headers.get(CABECERA_USUARIO)
+        if usuario_id:
+            self._suplantar(request, usuario_id)
+
+        pila = ExitStack()
+        self.consultas_perfiladas = pila.enter_context(CaptureQueriesContext(connection))
+        perfilador = nuevo_perfilador()
+        perfilador.iniciar()
+        pila.callback(perfilador.detener)
+        self.perfilado = (pila, perfilador)
+
+    def _suplantar(self, request, usuario_id):
+        if not request.user.is_superuser:
+            raise PermissionDenied('Solo un superusuario puede perfilar como otro usuario.')
+        accion = getattr(self, 'action', None)
+        if accion in SIN_SUPLANTACION:
+            raise PermissionDenied(f'La acción {accion} no se puede perfilar como otro usuario.')
+        if request.method != 'GET':
+            raise ValidationError({CABECERA_USUARIO: 'Solo se admite en peticiones GET.'})
+        try:
+            usuario = Usuario.objects.select_related('rol').get(pk=int(usuario_id))
+        except (ValueError, Usuario.DoesNotExist):
+            raise NotFound('No existe el usuario a perfilar.')
+
+        logger.warning(
+            'Perfilado como otro usuario: superusuario %s como usuario %s en %s',
+            request.user.pk,
+            usuario.pk,
+            request.get_full_path(),
+        )
+        request.user = usuario
+        self.perfil_suplantado = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'perfilado', None) is None:
+            return response
+
+        pila, perfilador = self.perfilado
+        self.perfilado = None
+        with pila:
+            # El renderizado de DRF también entra en el perfil
+            if hasattr(response, 'render'):
+                response.render()
+
+        os.makedirs(directorio(), exist_ok=True)
+        accion = getattr(self, 'action', None) or request.method.lower()
+        nombre = f"{accion}-{timezone.now().strftime('%Y%m%dT%H%M%S%f')}"
+        base = os.path.join(directorio(), nombre)
+        perfilador.guardar(f'{base}.{perfilador.extension}')
+        with open(f'{base}.sql.json', 'w', encoding='utf-8') as fichero:
+            json.dump(
+                {
+                    'ruta': request.get_full_path(),
+                    'usuario': request.user.pk,
+                    'consultas': self.consultas_perfiladas.captured_queries,
+                },
+                fichero,
+                indent=2,
+                ensure_ascii=False,
+            )
+        if self.perfil_suplantado:
+            # Los datos del usuario no salen del servidor: solo el nombre del perfil
+            response = HttpResponse(status=204)
+        response['X-Perfil'] = f'{nombre}.{perfilador.extension}'
+        return response
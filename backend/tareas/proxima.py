@@ -0,0 +1,121 @@
+"""Mantenimiento de la columna ``Tarea.proxima_ocurrencia``."""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+from django.utils import timezone
+
+from . import compactas, teselas
+from .models import Tarea, TareaCompletada
+from .utils import iterar_ocurrencias
+from .versiones import incrementar_version, incrementar_versiones
+
+
+def calcular_proxima_ocurrencia(
+    tarea: Tarea,
+    referencia: Optional[date] = None,
+    completadas: Optional[Iterable[date]] = None,
+) -> Optional[date]:
+    """Primera ocurrencia en o después de ``referencia`` que no esté completada.
+
+    ``completadas`` son las fechas ya completadas desde ``referencia``; si no se
+    pasan se consultan, salvo para tareas aún sin guardar.
+    """
+    if not tarea.activa or not tarea.fecha_entrega:
+        return None
+
+    referencia = referencia or timezone.localdate()
+
+    if tarea.repeticion == 'ninguna':
+        if tarea.estado == 'completada' or tarea.fecha_entrega < referencia:
+            return None
+        return tarea.fecha_entrega
+
+    if completadas is None:
+        completadas = ()
+        if tarea.pk:
+            completadas = TareaCompletada.objects.filter(
+                tarea_id=tarea.pk, fecha__gte=referencia
+            ).values_list('fecha', flat=True)
+            if compactas.habilitadas():
+                completadas = [*completadas, *compactas.completadas_desde([tarea.pk], referencia)[tarea.pk]]
+    completadas = set(completadas)
+
+    for fecha in iterar_ocurrencias(tarea, referencia):
+        if fecha not in completadas:
+            return fecha
+
+    return None
+
+
+def actualizar_proxima_ocurrencia(tarea: Tarea, referencia: Optional[date] = None) -> Optional[date]:
+    proxima = calcular_proxima_ocurrencia(tarea, referencia)
+    if proxima != tarea.proxima_ocurrencia:
+        tarea.actualizado_en = timezone.now()
+        Tarea.objects.filter(pk=tarea.pk).update(
+            proxima_ocurrencia=proxima, actualizado_en=tarea.actualizado_en
+        )
+        tarea.proxima_ocurrencia = proxima
+        incrementar_version(tarea.creado_por_id)
+        if tarea.repeticion == 'ninguna':
+            teselas.invalidar(tarea.creado_por_id, [tarea.fecha_entrega])
+    return proxima
+
+
+def actualizar_proximas_ocurrencias(tareas: Sequence[Tarea], referencia: Optional[date] = None) -> int:
+    """Recalcula un lote de tareas con una consulta de completadas y un ``bulk_update``."""
+    referencia = referencia or timezone.localdate()
+    completadas = defaultdict(set)
+    for tarea_id, fecha in TareaCompletada.objects.filter(
+        tarea_id__in=[tarea.pk for tarea in tareas], fecha__gte=referencia
+    ).values_list('tarea_id', 'fecha'):
+        completadas[tarea_id].add(fecha)
+    if compactas.habilitadas():
+        for tarea_id, fechas in compactas.completadas_desde([tarea.pk for tarea in tareas], referencia).items():
+            completadas[tarea_id].update(fechas)
+
+    ahora = timezone.now()
+    cambiadas = []
+    for tarea in tareas:
+        proxima = calcular_proxima_ocurrencia(tarea, referencia, completadas[tarea.pk])
+        if proxima != tarea.proxima_ocurrencia:
+            tarea.proxima_ocurrencia = proxima
+            tarea.actualizado_en = ahora
+            cambiadas.append(tarea)
+
+    Tarea.objects.bulk_update(cambiadas, ['proxima_ocurrencia', 'actualizado_en'])
+    incrementar_versiones(tarea.creado_por_id for tarea in cambiadas)
+    # Las teselas guardan las tareas sin repetición serializadas, con su próxima ocurrencia
+    teselas.invalidar_fechas(
+        (tarea.creado_por_id, tarea.fecha_entrega)
+        for tarea in cambiadas
+        if tarea.repeticion == 'ninguna'
+    )
+    return len(cambiadas)
+
+
+def barrer_proximas_vencidas(
+    referencia: Optional[date] = None,
+    todas: bool = False,
+    tamano_lote: int = 500,
+) -> int:
+    """Recalcula las tareas cuya próxima ocurrencia ya pasó.
+
+    Usa el índice sobre ``proxima_ocurrencia``: solo se leen las filas con fecha
+    anterior a ``referencia`` (o todas si ``todas`` es ``True``).  Las
+    completadas se consultan y las filas se escriben por lotes.
+    """
+    referencia = referencia or timezone.localdate()
+    tareas = Tarea.objects.all()
+    if not todas:
+        tareas = tareas.filter(proxima_ocurrencia__lt=referencia)
+    ids = list(tareas.order_by('pk').values_list('pk', flat=True))
+
+    actualizadas = 0
+    for inicio in range(0, len(ids), tamano_lote):
+        lote = list(Tarea.objects.filter(pk__in=ids[inicio:inicio + tamano_lote]))
+        actualizadas += actualizar_proximas_ocurrencias(lote, referencia)
+
+    return actualizadas
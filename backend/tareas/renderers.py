@@ -0,0 +1,45 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+	"""JSON delimitado por saltos de línea: un objeto por línea.
+
+	Las vistas que exportan mucho devuelven directamente un
+	``StreamingHttpResponse``; este renderer permite negociar
+	``Accept: application/x-ndjson`` y da formato a las respuestas normales
+	(errores de validación, por ejemplo).
+	"""
+
+	media_type = 'application/x-ndjson'
+	format = 'ndjson'
+	charset = 'utf-8'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		elementos = data if isinstance(data, list) else [data]
+		return ''.join(
+			json.dumps(elemento, cls=JSONEncoder, ensure_ascii=False) + '\n'
+			for elemento in elementos
+		).encode(self.charset)
+
+
+class ICalRenderer(BaseRenderer):
+	"""Permite negociar ``text/calendar``; el feed se arma en ``tareas.ical``.
+
+	Solo renderiza aquí las respuestas de error, como texto plano.
+	"""
+
+	media_type = 'text/calendar'
+	format = 'ics'
+	charset = 'utf-8'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		if isinstance(data, dict) and 'detail' in data:
+			data = data['detail']
+		return str(data).encode(self.charset)
@@ -1,12 +1,9 @@
 from rest_framework import serializers
 
 from .models import Tarea
-from .utils import obtener_proxima_ocurrencia
 
 
 class TareaSerializer(serializers.ModelSerializer):
-	proxima_ocurrencia = serializers.SerializerMethodField()
-
 	class Meta:
 		model = Tarea
 		fields = [
@@ -24,11 +21,7 @@ class TareaSerializer(serializers.ModelSerializer):
 			'creado_por',
 			'proxima_ocurrencia',
 		]
-		read_only_fields = ['id_tarea', 'fecha_creacion', 'creado_por']
-
-	def get_proxima_ocurrencia(self, obj):
-		fecha = obtener_proxima_ocurrencia(obj)
-		return fecha.isoformat() if fecha else None
+		read_only_fields = ['id_tarea', 'fecha_creacion', 'creado_por', 'proxima_ocurrencia']
 
 	def validate(self, attrs):
 		datos = super().validate(attrs)
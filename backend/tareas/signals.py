@@ -0,0 +1,104 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .materializacion import CAMPOS_RECURRENCIA, materializar_tarea
+from .models import OcurrenciaEstado, OcurrenciaEstadoArchivada, Tarea, TareaCompletada, TareaEnProceso
+from . import teselas
+from .proxima import calcular_proxima_ocurrencia
+from .sincronizacion import registrar_eliminacion
+from .versiones import incrementar_version
+
+
+def usuario_de_estado(estado):
+    """Dueño de la tarea de un estado de ocurrencia; solo consulta si la tarea no está cargada."""
+    if estado.__class__.tarea.is_cached(estado):
+        return estado.tarea.creado_por_id
+    return (
+        Tarea.objects.filter(pk=estado.tarea_id)
+        .values_list('creado_por_id', flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Tarea)
+def recalcular_proxima_ocurrencia(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and 'proxima_ocurrencia' not in update_fields:
+        return
+    instance.proxima_ocurrencia = calcular_proxima_ocurrencia(instance)
+
+
+@receiver(post_save, sender=Tarea)
+def materializar_ocurrencias(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_RECURRENCIA.intersection(update_fields):
+        return
+    materializar_tarea(instance, nueva=created)
+
+
+@receiver(pre_save, sender=Tarea)
+def recordar_meses_previos(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Guarda el dueño y los meses que ocupaba la tarea antes de cambiar su recurrencia."""
+    instance._teselas_previas = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not CAMPOS_RECURRENCIA.intersection(update_fields):
+        return
+    previa = (
+        Tarea.objects.filter(pk=instance.pk)
+        .values_list('creado_por_id', 'repeticion', 'fecha_entrega', 'fecha_fin_repeticion')
+        .first()
+    )
+    if previa:
+        instance._teselas_previas = (previa[0], teselas.meses_de_tarea(*previa[1:]))
+
+
+@receiver(post_save, sender=Tarea)
+@receiver(post_delete, sender=Tarea)
+def incrementar_version_tarea(sender, instance, **kwargs):
+    incrementar_version(instance.creado_por_id)
+
+    meses = set(
+        teselas.meses_de_tarea(
+            instance.repeticion, instance.fecha_entrega, instance.fecha_fin_repeticion
+        )
+    )
+    previas = getattr(instance, '_teselas_previas', None)
+    if previas and previas[0] != instance.creado_por_id:
+        teselas.invalidar(previas[0], previas[1])
+    elif previas:
+        meses.update(previas[1])
+    teselas.invalidar(instance.creado_por_id, meses)
+
+
+@receiver(post_save, sender=OcurrenciaEstado)
+@receiver(post_delete, sender=OcurrenciaEstado)
+@receiver(post_save, sender=TareaCompletada)
+@receiver(post_delete, sender=TareaCompletada)
+@receiver(post_save, sender=TareaEnProceso)
+@receiver(post_delete, sender=TareaEnProceso)
+@receiver(post_delete, sender=OcurrenciaEstadoArchivada)
+def incrementar_version_estado(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Tarea):
+        # Borrado en cascada: ya cuenta el post_delete de la propia tarea
+        return
+    usuario_id = usuario_de_estado(instance)
+    incrementar_version(usuario_id)
+    teselas.invalidar(usuario_id, [instance.fecha])
+
+
+@receiver(post_delete, sender=Tarea)
+def registrar_eliminacion_tarea(sender, instance, **kwargs):
+    registrar_eliminacion(instance.creado_por_id, 'tarea', instance.id_tarea)
+
+
+@receiver(post_delete, sender=OcurrenciaEstado)
+@receiver(post_delete, sender=TareaCompletada)
+@receiver(post_delete, sender=TareaEnProceso)
+@receiver(post_delete, sender=OcurrenciaEstadoArchivada)
+def registrar_eliminacion_estado(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Tarea):
+        return
+    registrar_eliminacion(usuario_de_estado(instance), 'ocurrencia', instance.tarea_id, instance.fecha)
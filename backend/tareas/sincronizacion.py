@@ -0,0 +1,149 @@
+"""Sincronización incremental: lo que cambió para un usuario desde un cursor.
+
+El cursor es el instante en que se atendió la petición anterior.  Las tareas y
+los estados se filtran por ``actualizado_en`` y los borrados físicos salen de
+las lápidas de ``tareas_eliminaciones``, así que el coste depende de los
+cambios y no del total de tareas.  Se relee un pequeño margen antes del cursor
+para no perder escrituras cuya transacción confirmó tarde; el cliente aplica
+los cambios por identificador, así que repetirlos no tiene efecto.
+"""
+from __future__ import annotations
+
+import base64
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import archivo, compactas
+from .models import Eliminacion, OcurrenciaEstado, Tarea
+
+
+class CursorCaducado(Exception):
+    """El cursor es anterior a la retención de lápidas: hay que recargar todo."""
+
+
+def codificar_cursor(instante: datetime) -> str:
+    return base64.urlsafe_b64encode(instante.isoformat().encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> datetime:
+    """Lanza ``ValueError`` si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        instante = datetime.fromisoformat(base64.urlsafe_b64decode(cursor + relleno).decode())
+    except UnicodeDecodeError as error:
+        raise ValueError('Cursor inválido') from error
+    if timezone.is_naive(instante):
+        raise ValueError('Cursor inválido')
+    return instante
+
+
+def retencion() -> timedelta:
+    return timedelta(days=getattr(settings, 'TAREAS_SYNC_RETENCION_DIAS', 30))
+
+
+def registrar_eliminacion(usuario_id: Optional[int], tipo: str, tarea_id: int, fecha=None) -> None:
+    if usuario_id is None:
+        return
+    Eliminacion.objects.create(usuario_id=usuario_id, tipo=tipo, tarea_id=tarea_id, fecha=fecha)
+
+
+def registrar_eliminaciones(eliminaciones: Iterable[Tuple[Optional[int], str, int, Optional[date]]]) -> None:
+    """Lápidas ``(usuario_id, tipo, tarea_id, fecha)`` con un solo ``bulk_create``."""
+    Eliminacion.objects.bulk_create(
+        [
+            Eliminacion(usuario_id=usuario_id, tipo=tipo, tarea_id=tarea_id, fecha=fecha)
+            for usuario_id, tipo, tarea_id, fecha in eliminaciones
+            if usuario_id is not None
+        ],
+        batch_size=500,
+    )
+
+
+def purgar_eliminaciones(referencia: Optional[datetime] = None) -> int:
+    limite = (referencia or timezone.now()) - retencion()
+    eliminadas, _ = Eliminacion.objects.filter(eliminado_en__lt=limite).delete()
+    return eliminadas
+
+
+def _por_fecha(estado) -> tuple:
+    return estado.fecha, estado.tarea_id
+
+
+def cambios_desde(usuario_id: int, desde: Optional[datetime]) -> Dict:
+    """Tareas, estados y borrados del usuario posteriores a ``desde``.
+
+    Sin ``desde`` devuelve el estado completo (sincronización inicial).
+    Las tareas desactivadas se informan como eliminadas; los estados de una
+    tarea eliminada se dan por eliminados con ella.
+    """
+    ahora = timezone.now()
+    if desde is not None and desde < ahora - retencion():
+        raise CursorCaducado()
+
+    tareas = Tarea.objects.filter(creado_por_id=usuario_id).order_by('id_tarea')
+    estados = (
+        OcurrenciaEstado.objects.filter(tarea__creado_por_id=usuario_id, tarea__activa=True)
+        .select_related('tarea')
+        .order_by('fecha', 'tarea_id')
+    )
+    eliminaciones = Eliminacion.objects.none()
+
+    if desde is None:
+        tareas = tareas.filter(activa=True)
+    else:
+        umbral = desde - timedelta(seconds=getattr(settings, 'TAREAS_SYNC_MARGEN_SEGUNDOS', 5))
+        tareas = tareas.filter(actualizado_en__gte=umbral)
+        estados = estados.filter(actualizado_en__gte=umbral)
+        eliminaciones = Eliminacion.objects.filter(
+            usuario_id=usuario_id, eliminado_en__gte=umbral
+        ).order_by('eliminado_en')
+
+    activas = []
+    tareas_eliminadas = set()
+    for tarea in tareas:
+        if tarea.activa:
+            activas.append(tarea)
+        else:
+            tareas_eliminadas.add(tarea.id_tarea)
+    del_usuario = Q(tarea__creado_por_id=usuario_id, tarea__activa=True)
+    if desde is None:
+        # Las filas archivadas no cambian, solo cuentan en la carga inicial
+        estados = heapq.merge(
+            estados,
+            archivo.archivados(del_usuario).select_related('tarea').order_by('fecha', 'tarea_id'),
+            key=_por_fecha,
+        )
+    if compactas.habilitadas():
+        # Un mapa modificado se envía entero: el cliente aplica por ocurrencia
+        mapas = compactas.mapas_en(del_usuario).select_related('tarea')
+        if desde is not None:
+            mapas = mapas.filter(actualizado_en__gte=umbral)
+        estados = heapq.merge(estados, compactas.como_estados(mapas), key=_por_fecha)
+    estados = list(estados)
+
+    vigentes_tareas = {tarea.id_tarea for tarea in activas}
+    vigentes_estados = {(estado.tarea_id, estado.fecha) for estado in estados}
+    ocurrencias_eliminadas = {}
+    for eliminacion in eliminaciones:
+        if eliminacion.tipo == 'tarea':
+            if eliminacion.tarea_id not in vigentes_tareas:
+                tareas_eliminadas.add(eliminacion.tarea_id)
+        elif (eliminacion.tarea_id, eliminacion.fecha) not in vigentes_estados:
+            ocurrencias_eliminadas[(eliminacion.tarea_id, eliminacion.fecha)] = None
+
+    return {
+        'cursor': codificar_cursor(ahora),
+        'tareas': activas,
+        'tareas_eliminadas': sorted(tareas_eliminadas),
+        'ocurrencias': estados,
+        'ocurrencias_eliminadas': [
+            {'tarea_id': tarea_id, 'fecha': fecha}
+            for tarea_id, fecha in ocurrencias_eliminadas
+            if tarea_id not in tareas_eliminadas
+        ],
+    }
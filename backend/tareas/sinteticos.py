@@ -0,0 +1,226 @@
+"""Datos sintéticos a escala para medir la API (``generar_datos_sinteticos``).
+
+Los usuarios se reconocen por el dominio de su email.  Todo se escribe con
+``bulk_create``, así que no se disparan las señales: la próxima ocurrencia se
+calcula antes de insertar y la materialización queda para
+``extender_ocurrencias`` (mientras tanto las vistas expanden en vivo).  Por la
+misma razón el borrado va por SQL directo en lugar de la cascada del ORM.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notificaciones.models import Notificacion
+from usuarios.models import Rol, Usuario
+
+from .models import (
+    CompletadasMes,
+    Eliminacion,
+    OcurrenciaEstado,
+    OcurrenciaEstadoArchivada,
+    Tarea,
+    TareaOcurrencia,
+    VersionUsuario,
+)
+from .proxima import calcular_proxima_ocurrencia
+from .utils import generar_ocurrencias_en_rango
+
+
+DOMINIO = 'sintetico.invalid'
+CONTRASENA = 'sintetico123'
+TAMANO_LOTE = 5000
+# Tareas por transacción: acota la memoria de los estados planificados
+TAREAS_POR_TRANSACCION = 500
+
+# Peso de cada regla entre las tareas recurrentes
+MEZCLA_RECURRENTES = {'diaria': 4, 'semanal': 3, 'mensual': 2, 'personalizada': 1}
+INTERVALOS = {
+    'diaria': (1, 3),
+    'semanal': (1, 2),
+    'mensual': (1, 3),
+    'personalizada': (2, 10),
+}
+
+
+@dataclass
+class Configuracion:
+    usuarios: int = 10
+    tareas_por_usuario: int = 20
+    proporcion_unicas: float = 0.3
+    mezcla: Dict[str, int] = field(default_factory=lambda: dict(MEZCLA_RECURRENTES))
+    dias_historia: int = 730
+    tasa_completadas: float = 0.7
+    tasa_en_proceso: float = 0.05
+    semilla: int = 0
+    dominio: str = DOMINIO
+
+
+def emails_existentes(dominio: str = DOMINIO):
+    return Usuario.objects.filter(email__endswith=f'@{dominio}')
+
+
+def _tarea(rng: random.Random, config: Configuracion, usuario_id: int, hoy: date, numero: int) -> Tarea:
+    if rng.random() < config.proporcion_unicas:
+        return Tarea(
+            titulo=f'Tarea {numero}',
+            categoria=rng.choice(Tarea.CATEGORIA_CHOICES)[0],
+            estado=rng.choice(Tarea.ESTADO_CHOICES)[0],
+            fecha_entrega=hoy + timedelta(days=rng.randint(-config.dias_historia, 90)),
+            creado_por_id=usuario_id,
+        )
+
+    reglas = list(config.mezcla)
+    repeticion = rng.choices(reglas, weights=[config.mezcla[regla] for regla in reglas])[0]
+    inicio = hoy - timedelta(days=rng.randint(0, config.dias_historia))
+    fin = None
+    if rng.random() < 0.2:
+        fin = inicio + timedelta(days=rng.randint(30, config.dias_historia + 365))
+    return Tarea(
+        titulo=f'Hábito {numero}',
+        categoria=rng.choice(Tarea.CATEGORIA_CHOICES)[0],
+        repeticion=repeticion,
+        intervalo_repeticion=rng.randint(*INTERVALOS[repeticion]),
+        fecha_entrega=inicio,
+        fecha_fin_repeticion=fin,
+        creado_por_id=usuario_id,
+    )
+
+
+def _estados(
+    rng: random.Random, config: Configuracion, tarea: Tarea, hoy: date
+) -> List[Tuple[date, str]]:
+    """Estados de las ocurrencias pasadas (y de hoy) de una tarea recurrente."""
+    if tarea.repeticion == 'ninguna':
+        return []
+    desde = max(tarea.fecha_entrega, hoy - timedelta(days=config.dias_historia))
+    estados = []
+    for fecha in generar_ocurrencias_en_rango(tarea, desde, hoy):
+        sorteo = rng.random()
+        if sorteo < config.tasa_completadas:
+            estados.append((fecha, 'completada'))
+        elif sorteo < config.tasa_completadas + config.tasa_en_proceso:
+            estados.append((fecha, 'en_proceso'))
+    return estados
+
+
+def _insertar_estados(filas: Iterator[OcurrenciaEstado]) -> int:
+    total = 0
+    lote: List[OcurrenciaEstado] = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= TAMANO_LOTE:
+            OcurrenciaEstado.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        OcurrenciaEstado.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def generar(config: Configuracion, progreso=None) -> Dict[str, int]:
+    """Crea ``config.usuarios`` usuarios con sus tareas y estados.  Devuelve los totales."""
+    rng = random.Random(config.semilla)
+    hoy = timezone.localdate()
+    ahora = timezone.now()
+    rol = Rol.objects.por_nombre('usuario')
+    # Un solo hash para todos: calcularlo por usuario dominaría el tiempo
+    contrasena = make_password(CONTRASENA)
+    primero = emails_existentes(config.dominio).count()
+
+    totales = {'usuarios': 0, 'tareas': 0, 'estados': 0}
+    por_lote = max(1, TAREAS_POR_TRANSACCION // max(1, config.tareas_por_usuario))
+    for inicio in range(0, config.usuarios, por_lote):
+        with transaction.atomic():
+            usuarios = Usuario.objects.bulk_create(
+                Usuario(
+                    email=f'usuario{primero + i}@{config.dominio}',
+                    nombre=f'Sintético {primero + i}',
+                    password=contrasena,
+                    contrasena=contrasena,
+                    rol=rol,
+                )
+                for i in range(inicio, min(config.usuarios, inicio + por_lote))
+            )
+
+            tareas, planes = [], []
+            for usuario in usuarios:
+                for _ in range(config.tareas_por_usuario):
+                    tarea = _tarea(rng, config, usuario.pk, hoy, len(tareas) + 1)
+                    plan = _estados(rng, config, tarea, hoy)
+                    tarea.proxima_ocurrencia = calcular_proxima_ocurrencia(
+                        tarea, hoy, [fecha for fecha, estado in plan if estado == 'completada']
+                    )
+                    tareas.append(tarea)
+                    planes.append(plan)
+            Tarea.objects.bulk_create(tareas, batch_size=TAMANO_LOTE)
+
+            totales['estados'] += _insertar_estados(
+                OcurrenciaEstado(
+                    tarea_id=tarea.pk,
+                    fecha=fecha,
+                    estado=estado,
+                    marcada_en=ahora,
+                )
+                for tarea, plan in zip(tareas, planes)
+                for fecha, estado in plan
+            )
+        totales['usuarios'] += len(usuarios)
+        totales['tareas'] += len(tareas)
+        if progreso:
+            progreso(totales)
+
+    return totales
+
+
+def borrar(dominio: str = DOMINIO) -> int:
+    """Borra los usuarios sintéticos y todo lo suyo.  Devuelve cuántos usuarios."""
+    ids = list(emails_existentes(dominio).values_list('pk', flat=True))
+    tabla_tareas = Tarea._meta.db_table
+    columna_usuario = Tarea._meta.get_field('creado_por').column
+    por_usuario = [
+        (Notificacion._meta.db_table, Notificacion._meta.get_field('usuario').column),
+        (TareaOcurrencia._meta.db_table, TareaOcurrencia._meta.get_field('creado_por').column),
+        (Eliminacion._meta.db_table, Eliminacion._meta.get_field('usuario').column),
+        (VersionUsuario._meta.db_table, VersionUsuario._meta.get_field('usuario').column),
+        (tabla_tareas, columna_usuario),
+    ]
+
+    for inicio in range(0, len(ids), 500):
+        lote = ids[inicio:inicio + 500]
+        marcas = ', '.join(['%s'] * len(lote))
+        with transaction.atomic(), connection.cursor() as cursor:
+            for tabla_estados in (
+                OcurrenciaEstado._meta.db_table,
+                OcurrenciaEstadoArchivada._meta.db_table,
+                CompletadasMes._meta.db_table,
+            ):
+                cursor.execute(
+                    f'DELETE FROM {tabla_estados} WHERE tarea_id IN '
+                    f'(SELECT {Tarea._meta.pk.column} FROM {tabla_tareas} WHERE {columna_usuario} IN ({marcas}))',
+                    lote,
+                )
+            for tabla, columna in por_usuario:
+                cursor.execute(f'DELETE FROM {tabla} WHERE {columna} IN ({marcas})', lote)
+            Usuario.objects.filter(pk__in=lote).delete()
+    return len(ids)
+
+
+def muestra_de_usuarios(cantidad: int, dominio: str = DOMINIO, semilla: int = 0) -> List[Usuario]:
+    ids = list(emails_existentes(dominio).order_by('pk').values_list('pk', flat=True))
+    elegidos = random.Random(semilla).sample(ids, min(cantidad, len(ids)))
+    return list(Usuario.objects.select_related('rol').filter(pk__in=elegidos).order_by('pk'))
+
+
+def tarea_de_muestra(usuario: Usuario, recurrente: bool = True) -> Optional[Tarea]:
+    tareas = Tarea.objects.filter(creado_por=usuario, activa=True)
+    if recurrente:
+        tareas = tareas.exclude(repeticion='ninguna').filter(proxima_ocurrencia__isnull=False)
+    return tareas.order_by('pk').first()
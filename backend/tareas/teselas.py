@@ -0,0 +1,172 @@
+"""Caché de ocurrencias por mes ("teselas") en el alias ``teselas``.
+
+Cada tesela guarda, para un usuario y un mes, los payloads de sus ocurrencias
+y las tareas sin repetición que vencen ese mes.  ``calendario`` y
+``ocurrencias_rango`` arman cualquier rango juntando teselas y recortando los
+bordes.  Un cambio en un estado invalida solo el mes de su fecha; un cambio en
+una tarea, los meses que abarcan sus ocurrencias antes y después del cambio.
+
+Solo se cachean los meses dentro de una ventana alrededor de hoy, así las
+tareas recurrentes sin fin invalidan un número acotado de claves.  Por defecto
+el alias usa ``FileBasedCache`` para que las invalidaciones lleguen a todos los
+workers de la máquina.  Los aciertos y fallos no se guardan en el alias (serían
+escrituras de fichero sin cerrojo en cada lectura): se anotan en la petición
+con ``contar_cache`` y ``contadores`` los lee del registro de métricas.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from tarea_api import metricas
+from tarea_api.instrumentacion import contar_cache
+
+
+ALIAS = 'teselas'
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _clave(usuario_id: int, mes: date) -> str:
+    return f'tareas:tesela:{usuario_id}:{mes:%Y-%m}'
+
+
+def primer_dia(fecha: date) -> date:
+    return fecha.replace(day=1)
+
+
+def ultimo_dia(mes: date) -> date:
+    return mes + relativedelta(months=1) - timedelta(days=1)
+
+
+def meses_entre(fecha_inicio: date, fecha_fin: date) -> List[date]:
+    meses = []
+    mes = primer_dia(fecha_inicio)
+    while mes <= fecha_fin:
+        meses.append(mes)
+        mes += relativedelta(months=1)
+    return meses
+
+
+def ventana_cacheable(hoy: Optional[date] = None) -> Tuple[date, date]:
+    """Primer y último mes que se guardan en caché."""
+    mes = primer_dia(hoy or timezone.localdate())
+    return (
+        mes - relativedelta(months=getattr(settings, 'TAREAS_TESELAS_MESES_ATRAS', 12)),
+        mes + relativedelta(months=getattr(settings, 'TAREAS_TESELAS_MESES_ADELANTE', 18)),
+    )
+
+
+def meses_cacheables(fecha_inicio: date, fecha_fin: date) -> Optional[List[date]]:
+    """Meses del rango, o ``None`` si alguno queda fuera de la ventana."""
+    primero, ultimo = ventana_cacheable()
+    if primer_dia(fecha_inicio) < primero or primer_dia(fecha_fin) > ultimo:
+        return None
+    return meses_entre(fecha_inicio, fecha_fin)
+
+
+def tramos(meses: Iterable[date]) -> List[Tuple[date, date]]:
+    """Agrupa meses consecutivos en ventanas ``(primer día, último día)``."""
+    resultado: List[Tuple[date, date]] = []
+    for mes in sorted(meses):
+        if resultado and mes == resultado[-1][1] + timedelta(days=1):
+            resultado[-1] = (resultado[-1][0], ultimo_dia(mes))
+        else:
+            resultado.append((mes, ultimo_dia(mes)))
+    return resultado
+
+
+def repartir(
+    fecha_inicio: date, fecha_fin: date, instancias: List[Dict], tareas_normales: List[Dict]
+) -> Dict[date, Dict]:
+    """Corta el resultado de una ventana de meses completos en teselas."""
+    teselas = {
+        mes: {'instancias': [], 'tareas_normales': []}
+        for mes in meses_entre(fecha_inicio, fecha_fin)
+    }
+    for instancia in instancias:
+        teselas[primer_dia(date.fromisoformat(instancia['fecha_instancia']))]['instancias'].append(instancia)
+    for tarea in tareas_normales:
+        teselas[primer_dia(date.fromisoformat(tarea['fecha_entrega']))]['tareas_normales'].append(tarea)
+    return teselas
+
+
+def leer(usuario_id: int, meses: List[date]) -> Dict[date, Dict]:
+    claves = {_clave(usuario_id, mes): mes for mes in meses}
+    encontradas = _cache().get_many(list(claves))
+    teselas = {claves[clave]: tesela for clave, tesela in encontradas.items()}
+
+    contar_cache('teselas', len(teselas), len(meses) - len(teselas))
+    return teselas
+
+
+def guardar(usuario_id: int, teselas: Dict[date, Dict]) -> None:
+    _cache().set_many(
+        {_clave(usuario_id, mes): tesela for mes, tesela in teselas.items()},
+        getattr(settings, 'TAREAS_TESELAS_SEGUNDOS', 3600),
+    )
+
+
+def invalidar(usuario_id: Optional[int], meses: Iterable[date]) -> None:
+    if usuario_id is None:
+        return
+    primero, ultimo = ventana_cacheable()
+    claves = [
+        _clave(usuario_id, mes)
+        for mes in {primer_dia(fecha) for fecha in meses}
+        if primero <= mes <= ultimo
+    ]
+    if not claves:
+        return
+    cache = _cache()
+    cache.delete_many(claves)
+    # Una lectura concurrente pudo guardar la tesela vieja antes del COMMIT
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def invalidar_fechas(cambios: Iterable[Tuple[Optional[int], date]]) -> None:
+    """Invalida las teselas de parejas ``(usuario_id, fecha)``."""
+    por_usuario: Dict[Optional[int], set] = {}
+    for usuario_id, fecha in cambios:
+        por_usuario.setdefault(usuario_id, set()).add(primer_dia(fecha))
+    for usuario_id, meses in por_usuario.items():
+        invalidar(usuario_id, meses)
+
+
+def meses_de_tarea(repeticion, fecha_entrega, fecha_fin_repeticion) -> List[date]:
+    """Meses de la ventana cacheable en los que la tarea puede tener ocurrencias."""
+    if not fecha_entrega:
+        return []
+    if repeticion == 'ninguna':
+        return [primer_dia(fecha_entrega)]
+
+    primero, ultimo = ventana_cacheable()
+    hasta = ultimo
+    if fecha_fin_repeticion:
+        hasta = min(hasta, primer_dia(fecha_fin_repeticion))
+    desde = max(primero, primer_dia(fecha_entrega))
+    if hasta < desde:
+        return []
+    return meses_entre(desde, hasta)
+
+
+def contadores() -> Dict[str, float]:
+    """Aciertos y fallos acumulados en ``tarea_api_cache_total`` (requiere ``TAREAS_METRICAS``)."""
+    valores = metricas.agregados()
+    aciertos, fallos = (
+        valores.get(('tarea_api_cache_total', (('cache', ALIAS), ('resultado', resultado))), 0)
+        for resultado in ('acierto', 'fallo')
+    )
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 4) if total else None,
+    }
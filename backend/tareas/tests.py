@@ -1,9 +1,55 @@
-from django.test import TestCase
+import json
+import os
+import pstats
+import random
+import shutil
+import tempfile
+import tracemalloc
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from usuarios.models import Usuario, Rol
-from .models import Tarea
-from datetime import date, timedelta
+from .estados import aplicar_estado
+from .ical import firmar_token, regla_rrule
+from .materializacion import diferencias
+from .models import (
+    CompletadasMes,
+    Eliminacion,
+    OcurrenciaEstado,
+    OcurrenciaEstadoArchivada,
+    Tarea,
+    TareaCompletada,
+    TareaEnProceso,
+    TareaOcurrencia,
+)
+from .ocurrencias_lote import lote_disponible, ocurrencias_con_estados
+from .proxima import calcular_proxima_ocurrencia
+from .sincronizacion import codificar_cursor
+from .versiones import obtener_version
+from .views import TareaViewSet
+from . import compactas, sinteticos, vistas_async
+from .utils import (
+    MAX_OCCURRENCIAS_SEGURIDAD,
+    fecha_corresponde_a_tarea,
+    generar_ocurrencias_en_rango,
+    generar_ocurrencias_por_pasos,
+    obtener_proxima_ocurrencia,
+)
+from datetime import date, datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrulestr
 
 
 class TareaModelTestCase(TestCase):
@@ -65,6 +111,8 @@ class TareaModelTestCase(TestCase):
 
 class TareaAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
         # Crear el rol de usuario
         self.rol_usuario, _ = Rol.objects.get_or_create(nombre='usuario')
         
@@ -180,3 +228,2049 @@ class TareaAPITestCase(APITestCase):
         }
         response = self.client.post('/api/tareas/', data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RecurrenciaAritmeticaTestCase(SimpleTestCase):
+    def _tarea(self, repeticion, fecha_entrega, intervalo=1, fecha_fin=None):
+        return Tarea(
+            titulo='Recurrente',
+            categoria='personal',
+            repeticion=repeticion,
+            intervalo_repeticion=intervalo,
+            fecha_entrega=fecha_entrega,
+            fecha_fin_repeticion=fecha_fin,
+        )
+
+    def test_diferencial_contra_recorrido_por_pasos(self):
+        """Test para verificar que el motor aritmético coincide con el recorrido fecha a fecha"""
+        aleatorio = random.Random(20240101)
+        for _ in range(400):
+            repeticion = aleatorio.choice(['diaria', 'semanal', 'mensual', 'personalizada'])
+            intervalo = aleatorio.randint(1, 6)
+            anclaje = date(2023, 1, 1) + timedelta(days=aleatorio.randint(0, 600))
+            if repeticion == 'mensual':
+                # Con días 29-31 el recorrido por pasos deriva; se prueba aparte
+                anclaje = anclaje.replace(day=min(anclaje.day, 28))
+            fecha_fin = None
+            if aleatorio.random() < 0.3:
+                fecha_fin = anclaje + timedelta(days=aleatorio.randint(0, 400))
+            tarea = self._tarea(repeticion, anclaje, intervalo, fecha_fin)
+
+            inicio = anclaje + timedelta(days=aleatorio.randint(-60, 500))
+            fin = inicio + timedelta(days=aleatorio.randint(0, 120))
+
+            self.assertEqual(
+                list(generar_ocurrencias_en_rango(tarea, inicio, fin)),
+                list(generar_ocurrencias_por_pasos(tarea, inicio, fin)),
+            )
+            for fecha in (inicio, fin, anclaje, anclaje + timedelta(days=intervalo * 7)):
+                esperada = fecha in generar_ocurrencias_por_pasos(tarea, fecha, fecha)
+                self.assertEqual(fecha_corresponde_a_tarea(tarea, fecha), esperada)
+
+    def test_tarea_diaria_antigua_no_desaparece(self):
+        """Test para verificar que una tarea diaria de hace años sigue generando ocurrencias"""
+        tarea = self._tarea('diaria', date(2015, 3, 1))
+        inicio = date(2025, 6, 1)
+
+        fechas = generar_ocurrencias_en_rango(tarea, inicio, inicio + timedelta(days=6))
+
+        self.assertEqual(len(fechas), 7)
+        self.assertEqual(obtener_proxima_ocurrencia(tarea, inicio), inicio)
+        self.assertTrue(fecha_corresponde_a_tarea(tarea, inicio))
+
+    def test_mensual_no_arrastra_recorte_de_dia(self):
+        """Test para verificar que la regla mensual vuelve al día de anclaje tras un mes corto"""
+        tarea = self._tarea('mensual', date(2025, 1, 31))
+
+        fechas = generar_ocurrencias_en_rango(tarea, date(2025, 1, 1), date(2025, 5, 31))
+
+        self.assertEqual(
+            fechas,
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30), date(2025, 5, 31)],
+        )
+        self.assertTrue(fecha_corresponde_a_tarea(tarea, date(2025, 3, 31)))
+        self.assertFalse(fecha_corresponde_a_tarea(tarea, date(2025, 3, 28)))
+        self.assertEqual(obtener_proxima_ocurrencia(tarea, date(2025, 3, 1)), date(2025, 3, 31))
+
+    def test_respeta_fecha_fin_repeticion(self):
+        """Test para verificar que no se generan ocurrencias tras el fin de la repetición"""
+        tarea = self._tarea('semanal', date(2025, 1, 6), intervalo=2, fecha_fin=date(2025, 2, 10))
+
+        self.assertEqual(
+            generar_ocurrencias_en_rango(tarea, date(2025, 1, 1), date(2025, 12, 31)),
+            [date(2025, 1, 6), date(2025, 1, 20), date(2025, 2, 3)],
+        )
+        self.assertIsNone(obtener_proxima_ocurrencia(tarea, date(2025, 2, 4)))
+
+
+@skipUnless(lote_disponible(), 'NumPy no está instalado')
+class ExpansionLoteTestCase(SimpleTestCase):
+    def _tareas(self, cantidad):
+        aleatorio = random.Random(7)
+        tareas = []
+        for i in range(cantidad):
+            repeticion = aleatorio.choice(['ninguna', 'diaria', 'semanal', 'mensual', 'personalizada'])
+            anclaje = date(2022, 1, 1) + timedelta(days=aleatorio.randint(0, 1200))
+            fecha_fin = None
+            if aleatorio.random() < 0.3:
+                fecha_fin = anclaje + timedelta(days=aleatorio.randint(0, 500))
+            tareas.append(
+                Tarea(
+                    id_tarea=i + 1,
+                    titulo=f'Tarea {i}',
+                    categoria='trabajo',
+                    repeticion=repeticion,
+                    intervalo_repeticion=aleatorio.randint(1, 4),
+                    fecha_entrega=anclaje if aleatorio.random() > 0.05 else None,
+                    fecha_fin_repeticion=fecha_fin,
+                )
+            )
+        return tareas
+
+    def test_lote_coincide_con_expansion_por_tarea(self):
+        """Test para verificar que la expansión vectorizada produce las mismas ocurrencias y estados"""
+        tareas = self._tareas(300)
+        inicio, fin = date(2024, 12, 15), date(2025, 3, 31)
+        marca = SimpleNamespace(marcada_en=date(2025, 1, 1), notas='ok')
+        vista = TareaViewSet()
+        vacias = vista._generar_payload_por_tarea(tareas, inicio, fin, {'completadas': {}, 'en_proceso': {}})
+        claves = [(item['tarea_id'], date.fromisoformat(item['fecha_instancia'])) for item in vacias]
+        mapas = {
+            'completadas': {clave: marca for clave in claves[::7]},
+            'en_proceso': {clave: marca for clave in claves[3::11]},
+        }
+
+        esperado = vista._generar_payload_por_tarea(tareas, inicio, fin, mapas)
+        obtenido = [
+            vista._payload_ocurrencia(tarea, fecha, completada, en_proceso, fecha_iso)
+            for tarea, fecha, fecha_iso, completada, en_proceso in ocurrencias_con_estados(tareas, inicio, fin, mapas)
+        ]
+
+        self.assertEqual(obtenido, esperado)
+        self.assertIn('completada', {item['estado'] for item in obtenido})
+        self.assertEqual(vista._generar_payload_ocurrencias(tareas, inicio, fin, mapas), esperado)
+
+
+class MaterializacionOcurrenciasTestCase(APITestCase):
+    def setUp(self):
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='materializa@example.com',
+            nombre='Materializa',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+
+    def _crear(self, **datos):
+        datos.setdefault('titulo', 'Hábito')
+        datos.setdefault('categoria', 'personal')
+        respuesta = self.client.post('/api/tareas/', datos, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        return Tarea.objects.get(pk=respuesta.data['id_tarea'])
+
+    def test_crear_y_editar_mantienen_la_tabla(self):
+        """Test para verificar que crear y editar una tarea reescribe sus ocurrencias materializadas"""
+        tarea = self._crear(
+            repeticion='semanal',
+            fecha_entrega=(self.hoy - timedelta(days=70)).isoformat(),
+        )
+        self.assertEqual(TareaOcurrencia.objects.filter(tarea=tarea).count(), len(
+            generar_ocurrencias_por_pasos(tarea, tarea.fecha_entrega, tarea.materializada_hasta)
+        ))
+
+        fin = self.hoy + timedelta(days=14)
+        self.client.patch(
+            f'/api/tareas/{tarea.id_tarea}/',
+            {'fecha_fin_repeticion': fin.isoformat()},
+            format='json',
+        )
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.materializada_hasta, date.max)
+        self.assertEqual(
+            TareaOcurrencia.objects.filter(tarea=tarea).latest('fecha').fecha,
+            generar_ocurrencias_en_rango(tarea, fin - timedelta(days=6), fin)[-1],
+        )
+
+        self.client.delete(f'/api/tareas/{tarea.id_tarea}/')
+        self.assertFalse(TareaOcurrencia.objects.exists())
+
+    def test_ventana_materializada_coincide_con_expansion_en_vivo(self):
+        """Test para verificar que calendario devuelve lo mismo desde la tabla y expandiendo en vivo"""
+        self._crear(repeticion='diaria', intervalo_repeticion=3, fecha_entrega=(self.hoy - timedelta(days=40)).isoformat())
+        self._crear(repeticion='mensual', fecha_entrega=(self.hoy - timedelta(days=400)).isoformat())
+        self._crear(fecha_entrega=(self.hoy + timedelta(days=5)).isoformat())
+        parametros = {
+            'fecha_inicio': (self.hoy - timedelta(days=30)).isoformat(),
+            'fecha_fin': (self.hoy + timedelta(days=30)).isoformat(),
+        }
+
+        desde_tabla = self.client.get('/api/tareas/calendario/', parametros).data
+        Tarea.objects.update(materializada_hasta=None)
+        caches['teselas'].clear()
+        en_vivo = self.client.get('/api/tareas/calendario/', parametros).data
+
+        self.assertEqual(desde_tabla, en_vivo)
+        self.assertEqual(len(desde_tabla['tareas_normales']), 1)
+
+    @override_settings(TAREAS_ARCHIVO_DIAS=30)
+    def test_ventana_rodante(self):
+        """Test para verificar que solo se materializa desde el corte y lo anterior se expande en vivo"""
+        corte = self.hoy - timedelta(days=30)
+        tarea = self._crear(repeticion='diaria', fecha_entrega=(self.hoy - timedelta(days=200)).isoformat())
+
+        self.assertEqual(tarea.materializada_desde, corte)
+        self.assertEqual(TareaOcurrencia.objects.filter(tarea=tarea).earliest('fecha').fecha, corte)
+        reciente = self._crear(repeticion='semanal', fecha_entrega=(self.hoy - timedelta(days=10)).isoformat())
+        self.assertEqual(reciente.materializada_desde, date.min)
+
+        antigua = {
+            'fecha_inicio': (self.hoy - timedelta(days=100)).isoformat(),
+            'fecha_fin': (self.hoy - timedelta(days=70)).isoformat(),
+        }
+        # La tabla no tiene esas filas: solo pueden salir de la expansión en vivo
+        datos = self.client.get('/api/tareas/calendario/', antigua).data
+        self.assertEqual(
+            [instancia['fecha_instancia'] for instancia in datos['instancias_recurrentes']],
+            [(self.hoy - timedelta(days=dias)).isoformat() for dias in range(100, 69, -1)],
+        )
+
+    def test_editar_solo_reescribe_lo_afectado(self):
+        """Test para verificar que editar la recurrencia conserva las filas que siguen siendo válidas"""
+        tarea = self._crear(repeticion='diaria', fecha_entrega=(self.hoy - timedelta(days=10)).isoformat())
+        conservada = TareaOcurrencia.objects.get(tarea=tarea, fecha=self.hoy).pk
+
+        fin = self.hoy + timedelta(days=14)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.patch(
+                f'/api/tareas/{tarea.id_tarea}/', {'fecha_fin_repeticion': fin.isoformat()}, format='json'
+            )
+        self.assertFalse(
+            any(consulta['sql'].startswith('INSERT INTO "tareas_ocurrencias"') for consulta in consultas)
+        )
+        self.assertTrue(TareaOcurrencia.objects.filter(pk=conservada).exists())
+        self.assertEqual(TareaOcurrencia.objects.filter(tarea=tarea).latest('fecha').fecha, fin)
+
+        tarea.refresh_from_db()
+        self.assertEqual(diferencias(tarea), {'faltantes': [], 'sobrantes': []})
+
+    def test_comando_reconstruye_y_verifica(self):
+        """Test para verificar que el comando reconstruye la tabla y la contrasta con la expansión en vivo"""
+        tarea = self._crear(repeticion='diaria', fecha_entrega=(self.hoy - timedelta(days=10)).isoformat())
+        TareaOcurrencia.objects.all().delete()
+        Tarea.objects.update(materializada_hasta=None)
+
+        salida = StringIO()
+        call_command('reconstruir_ocurrencias', '--verificar', stdout=salida)
+
+        self.assertIn('coincide', salida.getvalue())
+        self.assertTrue(TareaOcurrencia.objects.filter(tarea=tarea, fecha=self.hoy).exists())
+
+
+class ProximaOcurrenciaTestCase(APITestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='proxima@example.com',
+            nombre='Proxima',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+
+    def test_se_guarda_y_avanza_al_completar(self):
+        """Test para verificar que la próxima ocurrencia se guarda y avanza al completar la de hoy"""
+        tarea = Tarea.objects.create(
+            titulo='Diaria',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=3),
+            creado_por=self.usuario,
+        )
+        self.assertEqual(tarea.proxima_ocurrencia, self.hoy)
+
+        self.client.post(
+            '/api/tareas/actualizar_ocurrencia/',
+            {'tarea_id': tarea.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'completada'},
+            format='json',
+        )
+
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.proxima_ocurrencia, self.hoy + timedelta(days=1))
+        respuesta = self.client.get(f'/api/tareas/{tarea.id_tarea}/')
+        self.assertEqual(respuesta.data['proxima_ocurrencia'], (self.hoy + timedelta(days=1)).isoformat())
+
+    def test_proximas_ordena_y_limita(self):
+        """Test para verificar el listado de próximas tareas y el filtro por fecha"""
+        for dias in (9, 2, 5):
+            Tarea.objects.create(
+                titulo=f'En {dias} días',
+                categoria='trabajo',
+                fecha_entrega=self.hoy + timedelta(days=dias),
+                creado_por=self.usuario,
+            )
+        Tarea.objects.create(titulo='Sin fecha', categoria='trabajo', creado_por=self.usuario)
+
+        respuesta = self.client.get('/api/tareas/proximas/', {'limite': 2})
+        self.assertEqual([t['titulo'] for t in respuesta.data], ['En 2 días', 'En 5 días'])
+
+        respuesta = self.client.get('/api/tareas/', {
+            'ordering': '-proxima_ocurrencia',
+            'proxima_desde': (self.hoy + timedelta(days=3)).isoformat(),
+        })
+        self.assertEqual([t['titulo'] for t in respuesta.data], ['En 9 días', 'En 5 días'])
+
+    def test_barrido_recalcula_las_vencidas(self):
+        """Test para verificar que el barrido diario recalcula solo las próximas ocurrencias pasadas"""
+        tarea = Tarea.objects.create(
+            titulo='Semanal',
+            categoria='personal',
+            repeticion='semanal',
+            fecha_entrega=self.hoy - timedelta(days=14),
+            creado_por=self.usuario,
+        )
+        Tarea.objects.filter(pk=tarea.pk).update(proxima_ocurrencia=self.hoy - timedelta(days=7))
+
+        call_command('recalcular_proximas', stdout=StringIO())
+
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.proxima_ocurrencia, self.hoy)
+
+
+class PaginacionCursorTestCase(APITestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='paginas@example.com',
+            nombre='Paginas',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        for i in range(5):
+            Tarea.objects.create(titulo=f'Tarea {i}', categoria='trabajo', creado_por=self.usuario)
+        # Dos tareas con la misma fecha de creación para forzar el desempate por id
+        Tarea.objects.filter(titulo__in=['Tarea 2', 'Tarea 3']).update(
+            fecha_creacion=Tarea.objects.get(titulo='Tarea 2').fecha_creacion
+        )
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        """Test para verificar que el cursor recorre todas las tareas en orden estable"""
+        titulos = []
+        respuesta = self.client.get('/api/tareas/', {'page_size': 2})
+        while True:
+            self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(respuesta.data['results']), 2)
+            titulos.extend(t['titulo'] for t in respuesta.data['results'])
+            if not respuesta.data['next']:
+                break
+            respuesta = self.client.get(respuesta.data['next'])
+
+        esperados = list(
+            Tarea.objects.order_by('-fecha_creacion', '-id_tarea').values_list('titulo', flat=True)
+        )
+        self.assertEqual(titulos, esperados)
+
+    def test_sin_parametros_devuelve_la_lista_completa(self):
+        """Test para verificar que la paginación es opcional"""
+        respuesta = self.client.get('/api/tareas/')
+        self.assertEqual(len(respuesta.data), 5)
+
+    def test_cursor_invalido(self):
+        """Test para verificar que un cursor corrupto devuelve 404"""
+        respuesta = self.client.get('/api/tareas/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EstadisticasTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            email='estadisticas@example.com',
+            nombre='Estadisticas',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        Tarea.objects.create(titulo='Única', categoria='trabajo', estado='en_proceso', creado_por=self.usuario)
+        self.recurrentes = [
+            Tarea.objects.create(
+                titulo=f'Recurrente {i}',
+                categoria='personal',
+                repeticion='diaria',
+                fecha_entrega=self.hoy - timedelta(days=5),
+                creado_por=self.usuario,
+            )
+            for i in range(3)
+        ]
+        TareaCompletada.objects.create(tarea=self.recurrentes[0], fecha=self.hoy)
+        TareaCompletada.objects.create(tarea=self.recurrentes[1], fecha=self.hoy - timedelta(days=1))
+        TareaEnProceso.objects.create(tarea=self.recurrentes[1], fecha=self.hoy)
+
+    def test_hoy_es_la_fecha_local(self):
+        """Test para verificar que hoy es la fecha de TIME_ZONE aunque en UTC ya sea el día siguiente"""
+        # 22:00 en Bogotá son las 03:00 UTC del día 15
+        ahora = timezone.make_aware(datetime(2031, 3, 14, 22, 0))
+        tarea = Tarea.objects.create(
+            titulo='Solo el 14', categoria='trabajo', fecha_entrega=date(2031, 3, 14), creado_por=self.usuario,
+        )
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            instancias = self.client.get('/api/tareas/ocurrencias_hoy/').data
+
+        self.assertIn(tarea.id_tarea, [instancia['tarea_id'] for instancia in instancias])
+        self.assertEqual({instancia['fecha_instancia'] for instancia in instancias}, {'2031-03-14'})
+
+    @override_settings(TAREAS_CACHE_VERSIONES=True)
+    def test_cuenta_ocurrencias_de_hoy_en_una_consulta(self):
+        """Test para verificar los conteos de recurrentes por su estado de hoy y el número de consultas"""
+        obtener_version(self.usuario.pk)
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/tareas/estadisticas/')
+
+        self.assertEqual(
+            respuesta.data,
+            {'pendientes': 1, 'en_proceso': 2, 'completadas': 1, 'total': 4},
+        )
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/tareas/estadisticas/')
+
+    def test_cambios_invalidan_la_cache(self):
+        """Test para verificar que crear estados o tareas invalida las estadísticas en caché"""
+        self.client.get('/api/tareas/estadisticas/')
+
+        TareaCompletada.objects.create(tarea=self.recurrentes[2], fecha=self.hoy)
+        self.assertEqual(self.client.get('/api/tareas/estadisticas/').data['completadas'], 2)
+
+        TareaEnProceso.objects.filter(tarea=self.recurrentes[1]).delete()
+        self.assertEqual(self.client.get('/api/tareas/estadisticas/').data['en_proceso'], 1)
+
+        Tarea.objects.create(titulo='Nueva', categoria='trabajo', creado_por=self.usuario)
+        self.assertEqual(self.client.get('/api/tareas/estadisticas/').data['total'], 5)
+
+
+class EstadoOcurrenciaTestCase(APITestCase):
+    def setUp(self):
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='estados@example.com',
+            nombre='Estados',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.tarea = Tarea.objects.create(
+            titulo='Hábito',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=10),
+            creado_por=self.usuario,
+        )
+
+    def test_cambio_de_estado_es_un_upsert(self):
+        """Test para verificar que cada cambio de estado escribe una sola sentencia sobre la tabla unificada"""
+        # La segunda sentencia es el incremento de tareas_version_usuario
+        with self.assertNumQueries(2):
+            aplicar_estado(self.tarea, self.hoy, 'en_proceso', 'empezando')
+        with self.assertNumQueries(2):
+            aplicar_estado(self.tarea, self.hoy, 'completada')
+
+        fila = OcurrenciaEstado.objects.get(tarea=self.tarea, fecha=self.hoy)
+        self.assertEqual(fila.estado, 'completada')
+        self.assertIsNone(fila.notas)
+        self.assertTrue(TareaCompletada.objects.filter(pk=fila.pk).exists())
+        self.assertFalse(TareaEnProceso.objects.exists())
+
+    def test_endpoint_y_ventana_usan_la_tabla_unificada(self):
+        """Test para verificar el ciclo completo de estados por la API y la lectura de la ventana"""
+        url = '/api/tareas/actualizar_ocurrencia/'
+        datos = {'tarea_id': self.tarea.id_tarea, 'fecha': self.hoy.isoformat()}
+
+        respuesta = self.client.post(url, {**datos, 'estado': 'en_proceso', 'notas': 'nota'}, format='json')
+        self.assertEqual(respuesta.data['ocurrencia']['estado'], 'en_proceso')
+        self.assertEqual(respuesta.data['ocurrencia']['notas'], 'nota')
+        self.assertIsNotNone(respuesta.data['ocurrencia']['completada_en'])
+
+        self.client.post(url, {**datos, 'estado': 'completada'}, format='json')
+        ayer = (self.hoy - timedelta(days=1)).isoformat()
+        self.client.post(url, {**datos, 'fecha': ayer, 'estado': 'en_proceso'}, format='json')
+
+        vista = TareaViewSet()
+        with self.assertNumQueries(1):
+            mapas = vista._mapas_estados([self.tarea], self.hoy - timedelta(days=7), self.hoy)
+        self.assertEqual(list(mapas['completadas']), [(self.tarea.id_tarea, self.hoy)])
+        self.assertEqual(list(mapas['en_proceso']), [(self.tarea.id_tarea, self.hoy - timedelta(days=1))])
+
+        respuesta = self.client.post(url, {**datos, 'estado': 'pendiente'}, format='json')
+        self.assertEqual(respuesta.data['ocurrencia']['estado'], 'pendiente')
+        self.assertEqual(OcurrenciaEstado.objects.count(), 1)
+
+
+class ActualizacionLoteTestCase(APITestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='lote@example.com',
+            nombre='Lote',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.habito = Tarea.objects.create(
+            titulo='Hábito',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=10),
+            creado_por=self.usuario,
+        )
+        self.unica = Tarea.objects.create(
+            titulo='Entrega',
+            categoria='trabajo',
+            fecha_entrega=self.hoy,
+            creado_por=self.usuario,
+        )
+
+    def test_semana_de_habitos_con_errores_por_elemento(self):
+        """Test para verificar que el lote aplica los cambios válidos y reporta los inválidos"""
+        semana = [self.hoy - timedelta(days=i) for i in range(7)]
+        OcurrenciaEstado.objects.create(tarea=self.habito, fecha=semana[6], estado='en_proceso')
+        cambios = [
+            {'tarea_id': self.habito.id_tarea, 'fecha': fecha.isoformat(), 'estado': 'completada'}
+            for fecha in semana[:6]
+        ]
+        cambios += [
+            {'tarea_id': self.habito.id_tarea, 'fecha': semana[6].isoformat(), 'estado': 'pendiente'},
+            {'tarea_id': self.unica.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'en_proceso'},
+            {'tarea_id': self.unica.id_tarea, 'fecha': (self.hoy + timedelta(days=1)).isoformat(), 'estado': 'completada'},
+            {'tarea_id': 999999, 'fecha': self.hoy.isoformat(), 'estado': 'completada'},
+            {'tarea_id': self.habito.id_tarea, 'fecha': 'ayer', 'estado': 'completada'},
+            {'tarea_id': self.habito.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'archivada'},
+        ]
+
+        respuesta = self.client.post(
+            '/api/tareas/actualizar_ocurrencias_lote/', {'cambios': cambios}, format='json'
+        )
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual([error['indice'] for error in respuesta.data['errores']], [8, 9, 10, 11])
+        self.assertEqual(len(respuesta.data['ocurrencias']), 8)
+        self.assertEqual(
+            OcurrenciaEstado.objects.filter(tarea=self.habito, estado='completada').count(), 6
+        )
+        self.assertFalse(OcurrenciaEstado.objects.filter(tarea=self.habito, fecha=semana[6]).exists())
+
+        self.unica.refresh_from_db()
+        self.habito.refresh_from_db()
+        self.assertEqual(self.unica.estado, 'en_proceso')
+        self.assertEqual(self.habito.proxima_ocurrencia, self.hoy + timedelta(days=1))
+
+    def test_consultas_constantes_al_volver_a_pendiente(self):
+        """Test para verificar que devolver n ocurrencias a pendiente no hace consultas por elemento"""
+        self.habito.fecha_entrega = self.hoy - timedelta(days=300)
+        self.habito.save()
+        consultas = []
+        for desde, cantidad in ((1, 10), (50, 100)):
+            fechas = [self.hoy - timedelta(days=desde + i) for i in range(cantidad)]
+            OcurrenciaEstado.objects.bulk_create(
+                OcurrenciaEstado(tarea=self.habito, fecha=fecha, estado='completada') for fecha in fechas
+            )
+            cambios = [
+                {'tarea_id': self.habito.id_tarea, 'fecha': fecha.isoformat(), 'estado': 'pendiente'}
+                for fecha in fechas
+            ]
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.post(
+                    '/api/tareas/actualizar_ocurrencias_lote/', {'cambios': cambios}, format='json'
+                )
+            self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+            consultas.append(len(capturadas))
+            self.assertEqual(
+                set(Eliminacion.objects.filter(tipo='ocurrencia', fecha__in=fechas).values_list('fecha', flat=True)),
+                set(fechas),
+            )
+
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertFalse(OcurrenciaEstado.objects.exists())
+        self.assertEqual(Eliminacion.objects.count(), 110)
+
+    def test_lote_vacio_o_invalido(self):
+        """Test para verificar que un cuerpo sin lista de cambios se rechaza"""
+        respuesta = self.client.post('/api/tareas/actualizar_ocurrencias_lote/', {'cambios': []}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PodaVentanaTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='poda@example.com',
+            nombre='Poda',
+            password='testpass123'
+        )
+        self.inicio = date(2026, 3, 1)
+        self.fin = date(2026, 3, 31)
+
+    def _tarea(self, titulo, **campos):
+        campos.setdefault('categoria', 'personal')
+        return Tarea.objects.create(titulo=titulo, creado_por=self.usuario, **campos)
+
+    def _plan_candidatas(self):
+        return (
+            Tarea.objects.filter(creado_por=self.usuario, activa=True)
+            .en_ventana(self.inicio, self.fin)
+            .exclude(materializada_desde__lte=self.inicio, materializada_hasta__gte=self.fin)
+            .explain()
+        )
+
+    def _poblar_para_planificador(self):
+        otros = [
+            Usuario.objects.create_user(email=f'otro{i}@example.com', nombre='Otro', password='x')
+            for i in range(3)
+        ]
+        rnd = random.Random(9)
+        Tarea.objects.bulk_create(
+            Tarea(
+                titulo='Carga',
+                categoria='trabajo',
+                creado_por=rnd.choice(otros + [self.usuario]),
+                repeticion=rnd.choice(['ninguna', 'ninguna', 'ninguna', 'diaria', 'semanal', 'mensual']),
+                fecha_entrega=date(2025, 1, 1) + timedelta(days=rnd.randint(0, 700)),
+                activa=rnd.random() < 0.9,
+            )
+            for _ in range(4000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_en_ventana_descarta_tareas_fuera_de_rango(self):
+        """Test para verificar que la poda en SQL solo trae tareas que pueden caer en la ventana"""
+        dentro = self._tarea('Única en marzo', fecha_entrega=date(2026, 3, 15))
+        self._tarea('Única en abril', fecha_entrega=date(2026, 4, 2))
+        sin_fin = self._tarea('Hábito', repeticion='diaria', fecha_entrega=date(2025, 1, 1))
+        termina_dentro = self._tarea(
+            'Semanal que termina en marzo',
+            repeticion='semanal',
+            fecha_entrega=date(2025, 6, 1),
+            fecha_fin_repeticion=date(2026, 3, 1),
+        )
+        self._tarea(
+            'Mensual terminada',
+            repeticion='mensual',
+            fecha_entrega=date(2025, 1, 10),
+            fecha_fin_repeticion=date(2026, 2, 28),
+        )
+        self._tarea('Diaria futura', repeticion='diaria', fecha_entrega=date(2026, 4, 1))
+
+        candidatas = set(Tarea.objects.en_ventana(self.inicio, self.fin))
+
+        self.assertEqual(candidatas, {dentro, sin_fin, termina_dentro})
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plan específico de SQLite')
+    def test_plan_sqlite_usa_indices_de_ventana(self):
+        """Test para verificar con EXPLAIN que SQLite resuelve la ventana con los índices compuestos"""
+        self._poblar_para_planificador()
+
+        plan = self._plan_candidatas()
+
+        self.assertIn('tareas_usuario_rep_entrega_idx', plan)
+        self.assertIn('tareas_recurrentes_idx', plan)
+
+        plan_estados = OcurrenciaEstado.objects.filter(
+            tarea_id__in=[1, 2, 3], fecha__gte=self.inicio, fecha__lte=self.fin
+        ).explain()
+        self.assertRegex(plan_estados, r'USING INDEX \S+ \(tarea_id=\? AND fecha>\? AND fecha<\?\)')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Plan específico de PostgreSQL')
+    def test_plan_postgresql_usa_indices_de_ventana(self):
+        """Test para verificar con EXPLAIN que PostgreSQL resuelve la ventana con los índices compuestos"""
+        self._poblar_para_planificador()
+
+        with connection.cursor() as cursor:
+            # Con pocas filas el planificador prefiere el recorrido secuencial
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = self._plan_candidatas()
+            plan_estados = OcurrenciaEstado.objects.filter(
+                tarea_id__in=[1, 2, 3], fecha__gte=self.inicio, fecha__lte=self.fin
+            ).explain()
+
+        self.assertNotIn('Seq Scan on tareas', plan)
+        self.assertIn('tareas_usuario_rep_entrega_idx', plan)
+        self.assertIn('tareas_recurrentes_idx', plan)
+        self.assertIn('tareas_ocurrencia_estado_unico', plan_estados)
+
+
+class RespuestaCondicionalTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='etag@example.com',
+            nombre='Etag',
+            password='testpass123'
+        )
+        self.otro = Usuario.objects.create_user(
+            email='otro-etag@example.com',
+            nombre='Otro',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.tarea = Tarea.objects.create(
+            titulo='Hábito',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=3),
+            creado_por=self.usuario,
+        )
+        self.url = '/api/tareas/calendario/'
+        self.parametros = {
+            'fecha_inicio': self.hoy.isoformat(),
+            'fecha_fin': (self.hoy + timedelta(days=6)).isoformat(),
+        }
+
+    def test_304_sin_expandir_con_una_consulta(self):
+        """Test para verificar que un ETag vigente responde 304 consultando solo la versión"""
+        respuesta = self.client.get(self.url, self.parametros)
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        valor = respuesta['ETag']
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            condicional = self.client.get(self.url, self.parametros, HTTP_IF_NONE_MATCH=valor)
+        self.assertEqual(condicional.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(condicional['ETag'], valor)
+        self.assertEqual(condicional.content, b'')
+
+        with override_settings(TAREAS_CACHE_VERSIONES=True):
+            obtener_version(self.usuario.pk)
+            with self.assertNumQueries(0):
+                condicional = self.client.get(self.url, self.parametros, HTTP_IF_NONE_MATCH=valor)
+        self.assertEqual(condicional.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_depende_de_parametros_y_accion(self):
+        """Test para verificar que cada consulta distinta tiene su propio ETag"""
+        semana = self.client.get(self.url, self.parametros)['ETag']
+        dia = self.client.get(self.url, {**self.parametros, 'fecha_fin': self.hoy.isoformat()})['ETag']
+        hoy = self.client.get('/api/tareas/ocurrencias_hoy/')['ETag']
+
+        self.assertEqual(len({semana, dia, hoy}), 3)
+        respuesta = self.client.get(
+            self.url, {**self.parametros, 'fecha_fin': self.hoy.isoformat()}, HTTP_IF_NONE_MATCH=semana
+        )
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+
+    def test_escrituras_cambian_el_etag(self):
+        """Test para verificar que las escrituras del usuario invalidan su ETag y las de otros no"""
+        valor = self.client.get('/api/tareas/', HTTP_IF_NONE_MATCH='"viejo"')['ETag']
+
+        Tarea.objects.create(titulo='Ajena', categoria='trabajo', creado_por=self.otro)
+        self.assertEqual(
+            self.client.get('/api/tareas/', HTTP_IF_NONE_MATCH=valor).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        self.client.post(
+            '/api/tareas/actualizar_ocurrencia/',
+            {'tarea_id': self.tarea.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'completada'},
+            format='json',
+        )
+        respuesta = self.client.get('/api/tareas/', HTTP_IF_NONE_MATCH=valor)
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(respuesta['ETag'], valor)
+        valor = respuesta['ETag']
+
+        self.client.post(
+            '/api/tareas/actualizar_ocurrencias_lote/',
+            {'cambios': [{'tarea_id': self.tarea.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'pendiente'}]},
+            format='json',
+        )
+        self.assertEqual(
+            self.client.get('/api/tareas/', HTTP_IF_NONE_MATCH=valor).status_code,
+            status.HTTP_200_OK,
+        )
+
+
+class TeselasMensualesTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='teselas@example.com',
+            nombre='Teselas',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.mes = timezone.localdate().replace(day=1)
+        self.mes_siguiente = (self.mes + timedelta(days=32)).replace(day=1)
+        self.habito = Tarea.objects.create(
+            titulo='Hábito',
+            categoria='personal',
+            repeticion='diaria',
+            intervalo_repeticion=2,
+            fecha_entrega=self.mes - timedelta(days=20),
+            creado_por=self.usuario,
+        )
+        self.unica = Tarea.objects.create(
+            titulo='Entrega',
+            categoria='trabajo',
+            fecha_entrega=self.mes + timedelta(days=9),
+            creado_por=self.usuario,
+        )
+
+    def _tesela(self, mes):
+        return caches['teselas'].get(f'tareas:tesela:{self.usuario.pk}:{mes:%Y-%m}')
+
+    def _calendario(self, inicio, fin):
+        return self.client.get(
+            '/api/tareas/calendario/',
+            {'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat()},
+        )
+
+    def test_rangos_solapados_se_arman_con_teselas(self):
+        """Test para verificar que un rango solapado se sirve desde teselas con el mismo resultado"""
+        self._calendario(self.mes + timedelta(days=5), self.mes_siguiente + timedelta(days=3))
+        self.assertIsNotNone(self._tesela(self.mes))
+        self.assertIsNotNone(self._tesela(self.mes_siguiente))
+
+        inicio, fin = self.mes + timedelta(days=8), self.mes_siguiente + timedelta(days=10)
+        with self.assertNumQueries(1):
+            desde_teselas = self._calendario(inicio, fin).data
+        caches['teselas'].clear()
+        calculado = self._calendario(inicio, fin).data
+
+        self.assertEqual(desde_teselas, calculado)
+        self.assertEqual(len(desde_teselas['tareas_normales']), 1)
+        self.assertTrue(
+            all(
+                inicio.isoformat() <= item['fecha_instancia'] <= fin.isoformat()
+                for item in desde_teselas['instancias_recurrentes']
+            )
+        )
+
+    def test_cambios_invalidan_solo_sus_meses(self):
+        """Test para verificar que estados y ediciones solo invalidan las teselas que tocan"""
+        self._calendario(self.mes, self.mes_siguiente + timedelta(days=27))
+
+        OcurrenciaEstado.objects.create(
+            tarea=self.habito, fecha=self.mes_siguiente + timedelta(days=1), estado='completada'
+        )
+        self.assertIsNotNone(self._tesela(self.mes))
+        self.assertIsNone(self._tesela(self.mes_siguiente))
+
+        self._calendario(self.mes, self.mes_siguiente + timedelta(days=27))
+        self.client.patch(
+            f'/api/tareas/{self.unica.id_tarea}/',
+            {'titulo': 'Entrega movida'},
+            format='json',
+        )
+        self.assertIsNone(self._tesela(self.mes))
+        self.assertIsNotNone(self._tesela(self.mes_siguiente))
+
+        self._calendario(self.mes, self.mes_siguiente + timedelta(days=27))
+        self.client.patch(
+            f'/api/tareas/{self.unica.id_tarea}/',
+            {'fecha_entrega': (self.mes_siguiente + timedelta(days=2)).isoformat()},
+            format='json',
+        )
+        self.assertIsNone(self._tesela(self.mes))
+        self.assertIsNone(self._tesela(self.mes_siguiente))
+        normales = self._calendario(self.mes, self.mes_siguiente + timedelta(days=27)).data['tareas_normales']
+        self.assertEqual([tarea['titulo'] for tarea in normales], ['Entrega movida'])
+
+    @override_settings(TAREAS_METRICAS=True, TAREAS_METRICAS_DIR=None)
+    def test_contadores_solo_para_staff(self):
+        """Test para verificar los contadores de aciertos y fallos y que solo los ve el staff"""
+        from tarea_api import metricas
+
+        metricas.registro.reiniciar()
+        self.assertEqual(
+            self.client.get('/api/tareas/cache_teselas/').status_code, status.HTTP_403_FORBIDDEN
+        )
+
+        self._calendario(self.mes, self.mes + timedelta(days=3))
+        self._calendario(self.mes, self.mes_siguiente)
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        contadores = self.client.get('/api/tareas/cache_teselas/').data
+        self.assertEqual(contadores, {'aciertos': 1, 'fallos': 2, 'tasa_aciertos': round(1 / 3, 4)})
+        # Los aciertos ya no se escriben en la caché de teselas
+        self.assertIsNone(caches['teselas'].get('tareas:teselas:aciertos'))
+
+
+class ExportacionNDJSONTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='ndjson@example.com',
+            nombre='Ndjson',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.url = '/api/tareas/ocurrencias_rango/'
+
+    def _lineas(self, respuesta):
+        return [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+
+    def test_ndjson_coincide_con_json(self):
+        """Test para verificar que el NDJSON trae las mismas ocurrencias y en el mismo orden que el JSON"""
+        habito = Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=20), creado_por=self.usuario,
+        )
+        mensual = Tarea.objects.create(
+            titulo='Mensual', categoria='trabajo', repeticion='mensual',
+            fecha_entrega=self.hoy - timedelta(days=70), creado_por=self.usuario,
+        )
+        Tarea.objects.create(
+            titulo='Única', categoria='estudio', fecha_entrega=self.hoy + timedelta(days=4),
+            creado_por=self.usuario,
+        )
+        aplicar_estado(habito, self.hoy, 'completada')
+        aplicar_estado(habito, self.hoy - timedelta(days=2), 'en_proceso', 'a medias')
+        aplicar_estado(mensual, mensual.fecha_entrega + relativedelta(months=2), 'completada')
+        parametros = {
+            'fecha_inicio': (self.hoy - timedelta(days=30)).isoformat(),
+            'fecha_fin': (self.hoy + timedelta(days=30)).isoformat(),
+        }
+
+        esperado = self.client.get(self.url, parametros).data
+        por_parametro = self.client.get(self.url, {**parametros, 'formato': 'ndjson'})
+        por_cabecera = self.client.get(self.url, parametros, HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(por_parametro['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(por_parametro.streaming)
+        self.assertEqual(self._lineas(por_parametro), esperado)
+        self.assertEqual(self._lineas(por_cabecera), esperado)
+
+    def test_ndjson_respeta_el_limite_por_tarea(self):
+        """Test para verificar que el NDJSON corta cada tarea en MAX_OCCURRENCIAS_SEGURIDAD como el JSON"""
+        Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=date(2030, 1, 1), creado_por=self.usuario,
+        )
+        Tarea.objects.create(
+            titulo='Semanal', categoria='trabajo', repeticion='semanal',
+            fecha_entrega=date(2030, 1, 3), creado_por=self.usuario,
+        )
+        parametros = {'fecha_inicio': '2030-01-01', 'fecha_fin': '2033-12-31'}
+
+        esperado = self.client.get(self.url, parametros).data
+        lineas = self._lineas(self.client.get(self.url, {**parametros, 'formato': 'ndjson'}))
+
+        self.assertEqual(len(esperado), MAX_OCCURRENCIAS_SEGURIDAD + 209)
+        self.assertEqual(lineas, esperado)
+
+    def test_memoria_acotada_en_diez_anios(self):
+        """Test para verificar que exportar 10 años de 500 tareas no acumula las ocurrencias en memoria"""
+        inicio = date(2020, 1, 1)
+        Tarea.objects.bulk_create(
+            Tarea(
+                titulo=f'Tarea {i}',
+                categoria='trabajo',
+                repeticion='mensual',
+                fecha_entrega=inicio + timedelta(days=i % 28),
+                creado_por=self.usuario,
+            )
+            for i in range(500)
+        )
+        respuesta = self.client.get(
+            self.url,
+            {'fecha_inicio': inicio.isoformat(), 'fecha_fin': date(2029, 12, 31).isoformat(), 'formato': 'ndjson'},
+        )
+
+        tracemalloc.start()
+        try:
+            total_bytes = 0
+            lineas = 0
+            for trozo in respuesta.streaming_content:
+                total_bytes += len(trozo)
+                lineas += trozo.count(b'\n')
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(lineas, 500 * 120)
+        self.assertLess(pico, 8 * 1024 * 1024)
+        self.assertLess(pico, total_bytes / 10)
+
+
+class FeedICalTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            email='ical@example.com',
+            nombre='Ical',
+            password='testpass123'
+        )
+        self.hoy = timezone.localdate()
+        self.token = firmar_token(self.usuario)
+
+    def _crear(self, **campos):
+        campos.setdefault('titulo', 'Tarea')
+        campos.setdefault('categoria', 'personal')
+        return Tarea.objects.create(creado_por=self.usuario, **campos)
+
+    def _feed(self, **extra):
+        return self.client.get('/api/tareas/ical/', {'token': self.token}, **extra)
+
+    def test_rrule_coincide_con_la_expansion(self):
+        """Test para verificar que los clientes que expanden la RRULE obtienen las mismas fechas"""
+        tareas = [
+            self._crear(repeticion='diaria', intervalo_repeticion=3, fecha_entrega=date(2025, 1, 30)),
+            self._crear(repeticion='semanal', intervalo_repeticion=2, fecha_entrega=date(2025, 2, 4),
+                        fecha_fin_repeticion=date(2025, 9, 1)),
+            self._crear(repeticion='mensual', fecha_entrega=date(2025, 1, 31)),
+            self._crear(repeticion='mensual', intervalo_repeticion=5, fecha_entrega=date(2024, 8, 29)),
+            self._crear(repeticion='mensual', fecha_entrega=date(2025, 3, 15), fecha_fin_repeticion=date(2026, 1, 14)),
+        ]
+        inicio, fin = date(2024, 8, 1), date(2027, 12, 31)
+
+        for tarea in tareas:
+            regla = rrulestr(
+                regla_rrule(tarea),
+                dtstart=datetime.combine(tarea.fecha_entrega, datetime.min.time()),
+            )
+            esperadas = [
+                fecha.date()
+                for fecha in regla.between(
+                    datetime.combine(inicio, datetime.min.time()),
+                    datetime.combine(fin, datetime.min.time()),
+                    inc=True,
+                )
+            ]
+            self.assertEqual(esperadas, generar_ocurrencias_en_rango(tarea, inicio, fin), regla_rrule(tarea))
+
+    def test_feed_con_token_y_estados(self):
+        """Test para verificar el feed firmado: un VTODO por tarea y overrides por ocurrencia"""
+        habito = self._crear(titulo='Leer; 20 páginas', repeticion='diaria', fecha_entrega=self.hoy - timedelta(days=5))
+        self._crear(titulo='Entrega', fecha_entrega=self.hoy + timedelta(days=2), estado='en_proceso')
+        aplicar_estado(habito, self.hoy - timedelta(days=1), 'completada')
+        aplicar_estado(habito, self.hoy, 'en_proceso', 'va por la mitad')
+
+        self.assertEqual(
+            self.client.get('/api/tareas/ical/', {'token': 'falso'}).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        respuesta = self._feed()
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/calendar'))
+
+        cuerpo = respuesta.content.decode()
+        self.assertTrue(cuerpo.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(cuerpo.count('BEGIN:VTODO'), 4)
+        self.assertIn('SUMMARY:Leer\; 20 páginas', cuerpo)
+        self.assertIn('RRULE:FREQ=DAILY;INTERVAL=1', cuerpo)
+        self.assertIn(f'RECURRENCE-ID;VALUE=DATE:{(self.hoy - timedelta(days=1)):%Y%m%d}', cuerpo)
+        self.assertIn('STATUS:COMPLETED', cuerpo)
+        self.assertIn('STATUS:IN-PROCESS', cuerpo)
+        self.assertTrue(all(len(linea.encode()) <= 75 for linea in cuerpo.split('\r\n')))
+
+        self.client.force_authenticate(user=self.usuario)
+        enlace = self.client.get('/api/tareas/ical_enlace/').data['url']
+        self.assertIn(f'/api/tareas/ical/?token={self.token}', enlace)
+
+    def test_rotar_token_y_usuario_inactivo(self):
+        """Test para verificar que rotar el secreto revoca el enlace y que un usuario inactivo no tiene feed"""
+        self.assertEqual(self._feed().status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=self.usuario)
+        nuevo = self.client.post('/api/tareas/ical_enlace/').data['url']
+        self.client.force_authenticate(user=None)
+        self.assertNotIn(self.token, nuevo)
+        self.assertEqual(self._feed().status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(nuevo).status_code, status.HTTP_200_OK)
+
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertEqual(self.client.get(nuevo).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_enlace_estable_con_usuario_en_cache(self):
+        """Test para verificar que pedir el enlace con el usuario en la caché de autenticación no revoca los emitidos"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuario)}')
+        enlaces = []
+        for _ in range(2):
+            # Ejecuta el on_commit que guarda el usuario en la caché de autenticación
+            with self.captureOnCommitCallbacks(execute=True):
+                enlaces.append(self.client.get('/api/tareas/ical_enlace/').data['url'])
+        self.assertEqual(enlaces[0], enlaces[1])
+
+        rotado = self.client.post('/api/tareas/ical_enlace/').data['url']
+        self.assertEqual(self.client.get('/api/tareas/ical_enlace/').data['url'], rotado)
+
+        self.client.credentials()
+        self.assertEqual(self.client.get(enlaces[0]).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(rotado).status_code, status.HTTP_200_OK)
+
+    def test_get_condicional(self):
+        """Test para verificar que el feed responde 304 mientras no cambien los datos"""
+        tarea = self._crear(repeticion='semanal', fecha_entrega=self.hoy)
+        valor = self._feed()['ETag']
+
+        # El token (secreto vigente y usuario activo) y la versión
+        with self.assertNumQueries(2):
+            self.assertEqual(self._feed(HTTP_IF_NONE_MATCH=valor).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        aplicar_estado(tarea, self.hoy, 'completada')
+        self.assertEqual(self._feed(HTTP_IF_NONE_MATCH=valor).status_code, status.HTTP_200_OK)
+
+
+class SincronizacionIncrementalTestCase(APITestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='sync@example.com',
+            nombre='Sync',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.habito = Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=10), creado_por=self.usuario,
+        )
+        self.quieta = Tarea.objects.create(
+            titulo='Sin cambios', categoria='trabajo', fecha_entrega=self.hoy, creado_por=self.usuario,
+        )
+        self.borrable = Tarea.objects.create(
+            titulo='Se borra', categoria='trabajo', fecha_entrega=self.hoy, creado_por=self.usuario,
+        )
+        aplicar_estado(self.habito, self.hoy - timedelta(days=2), 'completada')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=1), 'completada')
+
+        # Todo lo anterior ocurrió hace una hora; el cursor es de hace media
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Tarea.objects.update(actualizado_en=hace_una_hora)
+        OcurrenciaEstado.objects.update(actualizado_en=hace_una_hora)
+        Eliminacion.objects.all().delete()
+        self.cursor = codificar_cursor(timezone.now() - timedelta(minutes=30))
+
+    def test_inicial_devuelve_todo(self):
+        """Test para verificar que sin cursor se devuelven todas las tareas y estados"""
+        respuesta = self.client.get('/api/tareas/cambios/')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(respuesta.data['tareas']), 3)
+        self.assertEqual(len(respuesta.data['ocurrencias']), 2)
+        self.assertTrue(respuesta.data['cursor'])
+
+    def test_solo_cambios_desde_el_cursor(self):
+        """Test para verificar que se devuelven solo las altas, ediciones, borrados y estados nuevos"""
+        nueva = self.client.post(
+            '/api/tareas/', {'titulo': 'Nueva', 'categoria': 'personal'}, format='json'
+        ).data
+        self.client.patch(f'/api/tareas/{self.habito.id_tarea}/', {'titulo': 'Leer'}, format='json')
+        self.client.delete(f'/api/tareas/{self.borrable.id_tarea}/')
+        self.client.post(
+            '/api/tareas/actualizar_ocurrencia/',
+            {'tarea_id': self.habito.id_tarea, 'fecha': self.hoy.isoformat(), 'estado': 'en_proceso'},
+            format='json',
+        )
+        self.client.post(
+            '/api/tareas/actualizar_ocurrencia/',
+            {'tarea_id': self.habito.id_tarea, 'fecha': (self.hoy - timedelta(days=2)).isoformat(), 'estado': 'pendiente'},
+            format='json',
+        )
+
+        with self.assertNumQueries(4):
+            respuesta = self.client.get('/api/tareas/cambios/', {'desde': self.cursor})
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(tarea['id_tarea'] for tarea in respuesta.data['tareas']),
+            sorted([nueva['id_tarea'], self.habito.id_tarea]),
+        )
+        self.assertEqual(respuesta.data['tareas_eliminadas'], [self.borrable.id_tarea])
+        self.assertEqual(
+            [(o['tarea_id'], o['fecha_instancia'], o['estado']) for o in respuesta.data['ocurrencias']],
+            [(self.habito.id_tarea, self.hoy.isoformat(), 'en_proceso')],
+        )
+        self.assertEqual(
+            respuesta.data['ocurrencias_eliminadas'],
+            [{'tarea_id': self.habito.id_tarea, 'fecha': (self.hoy - timedelta(days=2)).isoformat()}],
+        )
+
+        siguiente = self.client.get('/api/tareas/cambios/', {'desde': respuesta.data['cursor']})
+        self.assertEqual(siguiente.status_code, status.HTTP_200_OK)
+        # Solo queda lo que cae dentro del margen de relectura
+        self.assertNotIn(self.quieta.id_tarea, [tarea['id_tarea'] for tarea in siguiente.data['tareas']])
+
+    def test_cursor_invalido_o_caducado(self):
+        """Test para verificar 400 con un cursor ilegible y 410 con uno anterior a la retención"""
+        self.assertEqual(
+            self.client.get('/api/tareas/cambios/', {'desde': 'no-es-un-cursor'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        viejo = codificar_cursor(timezone.now() - timedelta(days=31))
+        self.assertEqual(
+            self.client.get('/api/tareas/cambios/', {'desde': viejo}).status_code,
+            status.HTTP_410_GONE,
+        )
+
+    def test_purgar_lapidas(self):
+        """Test para verificar que el comando borra solo las lápidas vencidas"""
+        borrada = self.borrable.id_tarea
+        self.borrable.delete()
+        Eliminacion.objects.create(
+            usuario=self.usuario, tipo='tarea', tarea_id=123456,
+        )
+        Eliminacion.objects.filter(tarea_id=123456).update(
+            eliminado_en=timezone.now() - timedelta(days=40)
+        )
+
+        salida = StringIO()
+        call_command('purgar_eliminaciones', stdout=salida)
+
+        self.assertIn('1 lápidas borradas', salida.getvalue())
+        self.assertEqual(list(Eliminacion.objects.values_list('tarea_id', flat=True)), [borrada])
+
+
+# Sin hilos aparte: las consultas deben ver la transacción del test con cualquier motor
+@override_settings(ROOT_URLCONF='tarea_api.urls_asgi', TAREAS_CONSULTAS_PARALELAS=False)
+class VistasAsincronasTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='asgi@example.com',
+            nombre='Asgi',
+            password='testpass123'
+        )
+        self.hoy = timezone.localdate()
+        self.habito = Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=20), creado_por=self.usuario,
+        )
+        Tarea.objects.create(
+            titulo='Informe', categoria='trabajo', repeticion='mensual',
+            fecha_entrega=self.hoy - timedelta(days=40), creado_por=self.usuario,
+        )
+        Tarea.objects.create(
+            titulo='Entrega', categoria='trabajo', fecha_entrega=self.hoy, creado_por=self.usuario,
+        )
+        aplicar_estado(self.habito, self.hoy, 'completada')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=1), 'en_proceso', 'a medias')
+        self.cabeceras = {'Authorization': f'Bearer {AccessToken.for_user(self.usuario)}'}
+
+    def _asincrona(self, ruta, parametros=None, cabeceras=None):
+        return async_to_sync(self.async_client.get)(
+            ruta, parametros or {}, headers={**self.cabeceras, **(cabeceras or {})}
+        )
+
+    def _sincrona(self, ruta, parametros=None):
+        self.client.force_authenticate(user=self.usuario)
+        with override_settings(ROOT_URLCONF='tarea_api.urls'):
+            return self.client.get(ruta, parametros or {})
+
+    def test_mismas_respuestas_que_wsgi(self):
+        """Test para verificar que las vistas asíncronas devuelven lo mismo y con el mismo ETag"""
+        ventanas = [
+            (self.hoy - timedelta(days=7), self.hoy + timedelta(days=7)),
+            # Fuera de la ventana de teselas: consultas directas
+            (self.hoy + relativedelta(years=3), self.hoy + relativedelta(years=3, months=1)),
+        ]
+        casos = [('/api/tareas/estadisticas/', {})]
+        for inicio, fin in ventanas:
+            parametros = {'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat()}
+            casos += [('/api/tareas/calendario/', parametros), ('/api/tareas/ocurrencias_rango/', parametros)]
+
+        for ruta, parametros in casos:
+            with self.subTest(ruta=ruta, parametros=parametros):
+                esperada = self._sincrona(ruta, parametros)
+                # Solo el camino asíncrono lee la versión con aobtener_version
+                with mock.patch.object(
+                    vistas_async, 'aobtener_version', wraps=vistas_async.aobtener_version
+                ) as version:
+                    respuesta = self._asincrona(ruta, parametros)
+
+                version.assert_called()
+                self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+                self.assertEqual(json.loads(respuesta.content), json.loads(esperada.content))
+                self.assertEqual(respuesta['ETag'], esperada['ETag'])
+
+    def test_304_y_rutas_delegadas(self):
+        """Test para verificar el 304 y que lo que no es camino rápido lo atiende la vista síncrona"""
+        parametros = {'fecha_inicio': self.hoy.isoformat(), 'fecha_fin': self.hoy.isoformat()}
+        valor = self._asincrona('/api/tareas/ocurrencias_rango/', parametros)['ETag']
+        self.assertEqual(
+            self._asincrona('/api/tareas/ocurrencias_rango/', parametros, {'If-None-Match': valor}).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        sin_credenciales = async_to_sync(self.async_client.get)('/api/tareas/calendario/')
+        self.assertEqual(sin_credenciales.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self._asincrona('/api/tareas/calendario/', {'fecha_inicio': 'ayer', 'fecha_fin': 'hoy'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        ndjson = self._asincrona('/api/tareas/ocurrencias_rango/', {**parametros, 'formato': 'ndjson'})
+        self.assertEqual(ndjson['Content-Type'], 'application/x-ndjson')
+        # El resto de la API sigue disponible bajo ASGI
+        self.assertEqual(self._asincrona('/api/tareas/proximas/').status_code, status.HTTP_200_OK)
+
+    def test_handler_usa_urlconf_asgi(self):
+        """Test para verificar que la aplicación ASGI resuelve con TAREAS_ASGI_URLCONF"""
+        from tarea_api.asgi import application
+
+        request, error = application.create_request(
+            {'type': 'http', 'method': 'GET', 'path': '/api/tareas/calendario/', 'headers': []},
+            StringIO(),
+        )
+        self.assertIsNone(error)
+        self.assertEqual(request.urlconf, 'tarea_api.urls_asgi')
+
+
+class SaludTestCase(APITestCase):
+    def setUp(self):
+        from tarea_api import salud
+
+        salud._migraciones_al_dia = False
+
+    def test_sondas(self):
+        """Test para verificar las sondas de vida y disponibilidad"""
+        self.assertEqual(self.client.get('/api/salud/vivo/').status_code, status.HTTP_200_OK)
+        respuesta = self.client.get('/api/salud/listo/')
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.json(), {'estado': 'listo'})
+
+        with mock.patch('tarea_api.salud.base_de_datos_lista', return_value=False):
+            respuesta = self.client.get('/api/salud/listo/')
+        self.assertEqual(respuesta.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(respuesta.json()['motivo'], 'base_de_datos')
+
+    def test_esperar_db(self):
+        """Test para verificar que esperar_db reintenta y falla al agotar el tiempo"""
+        salida = StringIO()
+        with mock.patch(
+            'tareas.management.commands.esperar_db.base_de_datos_lista',
+            side_effect=[False, False, True],
+        ):
+            call_command('esperar_db', intervalo=0, stdout=salida)
+        self.assertIn('3 intentos', salida.getvalue())
+
+        with mock.patch(
+            'tareas.management.commands.esperar_db.base_de_datos_lista', return_value=False
+        ):
+            with self.assertRaises(CommandError):
+                call_command('esperar_db', timeout=0, intervalo=0, stdout=StringIO())
+
+
+@override_settings(TAREAS_INSTRUMENTACION=True, TAREAS_INSTRUMENTACION_LENTA_MS=60000)
+class InstrumentacionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='instrumentado@example.com', nombre='Instrumentado', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        Tarea.objects.create(
+            titulo='Diaria',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=date(2030, 3, 1),
+            creado_por=self.usuario,
+        )
+
+    def test_server_timing_y_log(self):
+        """Test para verificar la cabecera Server-Timing y la línea de log por petición"""
+        with self.assertLogs('tarea_api.instrumentacion', level='INFO') as registros:
+            respuesta = self.client.get(
+                '/api/tareas/ocurrencias_rango/',
+                {'fecha_inicio': '2030-03-01', 'fecha_fin': '2030-03-10'},
+            )
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+
+        cabecera = respuesta['Server-Timing']
+        self.assertIn('db;dur=', cabecera)
+        self.assertIn('app;dur=', cabecera)
+        self.assertIn('ocurrencias;desc="10"', cabecera)
+
+        self.assertEqual(len(registros.records), 1)
+        linea = json.loads(registros.records[0].getMessage())
+        self.assertEqual(linea['ruta'], '/api/tareas/ocurrencias_rango/')
+        self.assertEqual(linea['ocurrencias'], 10)
+        self.assertGreater(linea['consultas'], 0)
+        self.assertIn(f"{linea['consultas']} consultas", cabecera)
+
+    @override_settings(TAREAS_INSTRUMENTACION_LENTA_MS=0, TAREAS_INSTRUMENTACION_SENTENCIAS=2)
+    def test_peticion_lenta(self):
+        """Test para verificar que las peticiones lentas registran sus sentencias SQL"""
+        with self.assertLogs('tarea_api.instrumentacion', level='WARNING') as registros:
+            self.client.get('/api/tareas/')
+        lenta = json.loads(registros.records[0].getMessage())
+        self.assertTrue(lenta['lenta'])
+        self.assertLessEqual(len(lenta['sentencias']), 2)
+        self.assertIn('SELECT', lenta['sentencias'][0]['sql'])
+
+    @override_settings(TAREAS_INSTRUMENTACION=False)
+    def test_desactivada(self):
+        """Test para verificar que sin TAREAS_INSTRUMENTACION no se añade nada"""
+        respuesta = self.client.get('/api/tareas/')
+        self.assertNotIn('Server-Timing', respuesta)
+
+
+def leer_metricas(texto):
+    """Lector mínimo del formato de Prometheus, como haría el scraper."""
+    muestras = {}
+    for linea in texto.splitlines():
+        if not linea or linea.startswith('#'):
+            continue
+        serie, valor = linea.rsplit(' ', 1)
+        muestras[serie] = float(valor)
+    return muestras
+
+
+@override_settings(TAREAS_METRICAS=True, TAREAS_METRICAS_DIR=None)
+class MetricasTestCase(APITestCase):
+    def setUp(self):
+        from tarea_api import metricas
+
+        self.metricas = metricas
+        metricas.registro.reiniciar()
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='metricas@example.com', nombre='Métricas', password='x'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        Tarea.objects.create(
+            titulo='Diaria',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=date(2030, 1, 1),
+            creado_por=self.usuario,
+        )
+
+    def test_exposicion(self):
+        """Test para verificar las métricas de latencia, consultas, cachés y ocurrencias en /metrics"""
+        ventana = {'fecha_inicio': '2030-03-01', 'fecha_fin': '2030-03-10'}
+        self.client.get('/api/tareas/ocurrencias_rango/', ventana)
+        self.client.get('/api/tareas/estadisticas/')
+        self.client.get('/api/tareas/estadisticas/')
+        self.client.get('/api/tareas/')
+
+        respuesta = self.client.get('/metrics')
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain'))
+        texto = respuesta.content.decode()
+        self.assertIn('# TYPE tarea_api_peticion_segundos histogram', texto)
+        muestras = leer_metricas(texto)
+
+        ruta = 'ruta="tarea-ocurrencias-rango"'
+        self.assertEqual(
+            muestras[f'tarea_api_peticiones_total{{estado="200",metodo="GET",{ruta}}}'], 1
+        )
+        self.assertEqual(muestras[f'tarea_api_ocurrencias_expandidas_total{{{ruta}}}'], 10)
+        self.assertEqual(muestras[f'tarea_api_tareas_por_peticion_sum{{{ruta}}}'], 1)
+        self.assertEqual(muestras['tarea_api_tareas_por_peticion_sum{ruta="tarea-list"}'], 1)
+        self.assertEqual(muestras['tarea_api_tareas_por_peticion_sum{ruta="tarea-estadisticas"}'], 0)
+        self.assertGreater(muestras[f'tarea_api_consultas_por_peticion_sum{{{ruta}}}'], 0)
+        self.assertEqual(
+            muestras['tarea_api_cache_total{cache="estadisticas",resultado="acierto"}'], 1
+        )
+        self.assertEqual(
+            muestras['tarea_api_cache_total{cache="estadisticas",resultado="fallo"}'], 1
+        )
+
+        # Los buckets son acumulativos y +Inf coincide con el total
+        serie = 'metodo="GET",ruta="tarea-estadisticas"'
+        buckets = [
+            valor for clave, valor in muestras.items()
+            if clave.startswith(f'tarea_api_peticion_segundos_bucket{{{serie},')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(
+            muestras[f'tarea_api_peticion_segundos_bucket{{{serie},le="+Inf"}}'],
+            muestras[f'tarea_api_peticion_segundos_count{{{serie}}}'],
+        )
+
+    def test_cortes_por_limite(self):
+        """Test para verificar que se cuentan las expansiones cortadas por MAX_OCCURRENCIAS_SEGURIDAD"""
+        self.client.get(
+            '/api/tareas/ocurrencias_rango/', {'fecha_inicio': '2030-01-01', 'fecha_fin': '2034-12-31'}
+        )
+        muestras = leer_metricas(self.client.get('/metrics').content.decode())
+        self.assertEqual(
+            muestras['tarea_api_cortes_max_ocurrencias_total{ruta="tarea-ocurrencias-rango"}'], 1
+        )
+
+    def test_varios_procesos(self):
+        """Test para verificar que /metrics suma los volcados de todos los workers"""
+        with tempfile.TemporaryDirectory() as directorio, self.settings(TAREAS_METRICAS_DIR=directorio):
+            # Lo que volcó otro worker
+            with open(os.path.join(directorio, 'metricas-1.json'), 'w') as fichero:
+                json.dump(
+                    [['tarea_api_cache_total', [['cache', 'teselas'], ['resultado', 'acierto']], 5]],
+                    fichero,
+                )
+            self.metricas.registro.incrementar('tarea_api_cache_total', 2, cache='teselas', resultado='acierto')
+
+            muestras = leer_metricas(self.client.get('/metrics').content.decode())
+            self.assertEqual(muestras['tarea_api_cache_total{cache="teselas",resultado="acierto"}'], 7)
+            self.assertTrue(os.path.exists(os.path.join(directorio, f'metricas-{os.getpid()}.json')))
+
+            self.metricas.limpiar_directorio()
+            self.assertFalse(os.listdir(directorio))
+
+    def test_workers_retirados(self):
+        """Test para verificar que el fichero de un worker terminado se acumula y se borra"""
+        clave = 'tarea_api_cache_total{cache="teselas",resultado="acierto"}'
+        fila = ['tarea_api_cache_total', [['cache', 'teselas'], ['resultado', 'acierto']], 5]
+        with tempfile.TemporaryDirectory() as directorio, self.settings(TAREAS_METRICAS_DIR=directorio):
+            for pid in (1, 2):
+                with open(os.path.join(directorio, f'metricas-{pid}.json'), 'w') as fichero:
+                    json.dump([fila], fichero)
+            self.metricas.registro.incrementar('tarea_api_cache_total', 2, cache='teselas', resultado='acierto')
+            self.assertEqual(leer_metricas(self.client.get('/metrics').content.decode())[clave], 12)
+
+            self.metricas.retirar_proceso(1)
+            self.metricas.retirar_proceso(2)
+            # Un pid ya retirado (o desconocido) no se suma otra vez
+            self.metricas.retirar_proceso(1)
+
+            self.assertEqual(leer_metricas(self.client.get('/metrics').content.decode())[clave], 12)
+            self.assertEqual(
+                sorted(os.listdir(directorio)),
+                sorted([f'metricas-{os.getpid()}.json', self.metricas.RETIRADOS]),
+            )
+
+    @override_settings(TAREAS_METRICAS_TOKEN='secreto-metricas')
+    def test_solo_red_interna_o_token(self):
+        """Test para verificar que /metrics no existe para peticiones externas sin token"""
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+
+        externa = {'REMOTE_ADDR': '203.0.113.7'}
+        self.assertEqual(self.client.get('/metrics', **externa).status_code, status.HTTP_404_NOT_FOUND)
+        # Un proxy local no convierte en local la petición que reenvía
+        reenviada = {'HTTP_X_FORWARDED_FOR': '203.0.113.7'}
+        self.assertEqual(self.client.get('/metrics', **reenviada).status_code, status.HTTP_404_NOT_FOUND)
+        respuesta = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro', **externa)
+        self.assertEqual(respuesta.status_code, status.HTTP_404_NOT_FOUND)
+
+        respuesta = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto-metricas', **externa)
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+
+    @override_settings(TAREAS_METRICAS=False)
+    def test_desactivadas(self):
+        """Test para verificar que sin TAREAS_METRICAS no hay endpoint"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PerfiladoTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.personal = Usuario.objects.create_user(
+            email='personal@example.com', nombre='Personal', password='x', is_staff=True
+        )
+        self.superusuario = Usuario.objects.create_user(
+            email='super@example.com', nombre='Super', password='x', is_staff=True, is_superuser=True
+        )
+        self.usuario = Usuario.objects.create_user(
+            email='lento@example.com', nombre='Lento', password='x'
+        )
+        Tarea.objects.create(
+            titulo='Diaria',
+            categoria='personal',
+            repeticion='diaria',
+            fecha_entrega=date(2030, 3, 1),
+            creado_por=self.usuario,
+        )
+        self.ventana = {'fecha_inicio': '2030-03-01', 'fecha_fin': '2030-03-31'}
+
+    def test_perfilar_propia(self):
+        """Test para verificar que el personal perfila su propia petición y recibe la respuesta"""
+        Tarea.objects.create(
+            titulo='Propia', categoria='personal', repeticion='diaria',
+            fecha_entrega=date(2030, 3, 1), creado_por=self.personal,
+        )
+        self.client.force_authenticate(user=self.personal)
+        with self.settings(TAREAS_PERFILES_DIR=self.directorio):
+            respuesta = self.client.get('/api/tareas/calendario/', self.ventana, HTTP_X_PERFILAR='1')
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(respuesta.data['instancias_recurrentes']), 31)
+        self.assertTrue(respuesta['X-Perfil'].startswith('calendario-'))
+
+    def test_perfilar_como_usuario(self):
+        """Test para verificar que un superusuario perfila con los datos de otro usuario sin recibirlos"""
+        self.client.force_authenticate(user=self.superusuario)
+        with self.settings(TAREAS_PERFILES_DIR=self.directorio), self.assertLogs('tareas.perfilado') as registro:
+            respuesta = self.client.get(
+                '/api/tareas/calendario/',
+                self.ventana,
+                HTTP_X_PERFILAR='1',
+                HTTP_X_PERFILAR_USUARIO=str(self.usuario.pk),
+            )
+        self.assertEqual(respuesta.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(respuesta.content, b'')
+        self.assertIn(f'superusuario {self.superusuario.pk} como usuario {self.usuario.pk}', registro.output[0])
+
+        nombre = respuesta['X-Perfil']
+        self.assertTrue(nombre.startswith('calendario-') and nombre.endswith('.prof'))
+        estadisticas = pstats.Stats(os.path.join(self.directorio, nombre))
+        funciones = {funcion for _, _, funcion in estadisticas.stats}
+        self.assertIn('_serializar_ocurrencia', funciones)
+        self.assertIn('render', funciones)
+
+        with open(os.path.join(self.directorio, nombre[:-len('.prof')] + '.sql.json'), encoding='utf-8') as fichero:
+            sql = json.load(fichero)
+        self.assertEqual(sql['usuario'], self.usuario.pk)
+        self.assertTrue(sql['consultas'])
+
+    def test_suplantacion_restringida(self):
+        """Test para verificar que suplantar exige superusuario y no vale en ical_enlace, ical ni cambios"""
+        cabeceras = {'HTTP_X_PERFILAR': '1', 'HTTP_X_PERFILAR_USUARIO': str(self.usuario.pk)}
+        with self.settings(TAREAS_PERFILES_DIR=self.directorio):
+            self.client.force_authenticate(user=self.personal)
+            respuesta = self.client.get('/api/tareas/calendario/', self.ventana, **cabeceras)
+            self.assertEqual(respuesta.status_code, status.HTTP_403_FORBIDDEN)
+
+            self.client.force_authenticate(user=self.superusuario)
+            for ruta in ('/api/tareas/ical_enlace/', '/api/tareas/cambios/', '/api/tareas/'):
+                respuesta = self.client.get(ruta, **cabeceras)
+                esperado = status.HTTP_204_NO_CONTENT if ruta == '/api/tareas/' else status.HTTP_403_FORBIDDEN
+                self.assertEqual(respuesta.status_code, esperado, ruta)
+                self.assertNotIn(b'token', respuesta.content)
+
+    def test_solo_personal(self):
+        """Test para verificar que solo el personal puede perfilar y que sin pedirlo no se perfila"""
+        self.client.force_authenticate(user=self.usuario)
+        with self.settings(TAREAS_PERFILES_DIR=self.directorio):
+            respuesta = self.client.get('/api/tareas/calendario/', {**self.ventana, 'perfilar': '1'})
+            self.assertEqual(respuesta.status_code, status.HTTP_403_FORBIDDEN)
+
+            respuesta = self.client.get('/api/tareas/calendario/', self.ventana)
+            self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+            self.assertNotIn('X-Perfil', respuesta)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+class DatosSinteticosTestCase(TestCase):
+    def setUp(self):
+        self.config = sinteticos.Configuracion(usuarios=3, tareas_por_usuario=6, dias_historia=60, semilla=7)
+
+    def test_generar(self):
+        """Test para verificar que el generador crea usuarios, tareas y estados coherentes"""
+        totales = sinteticos.generar(self.config)
+
+        self.assertEqual(totales['usuarios'], 3)
+        self.assertEqual(totales['tareas'], 18)
+        self.assertEqual(sinteticos.emails_existentes().count(), 3)
+        self.assertEqual(OcurrenciaEstado.objects.count(), totales['estados'])
+        self.assertTrue(
+            Usuario.objects.get(email='usuario0@sintetico.invalid').check_password(sinteticos.CONTRASENA)
+        )
+        for estado in OcurrenciaEstado.objects.select_related('tarea')[:50]:
+            self.assertTrue(fecha_corresponde_a_tarea(estado.tarea, estado.fecha))
+        for tarea in Tarea.objects.exclude(repeticion='ninguna'):
+            completadas = TareaCompletada.objects.filter(tarea=tarea).values_list('fecha', flat=True)
+            self.assertEqual(
+                tarea.proxima_ocurrencia,
+                calcular_proxima_ocurrencia(tarea, timezone.localdate(), list(completadas)),
+            )
+
+        # Una segunda tanda continúa la numeración
+        sinteticos.generar(sinteticos.Configuracion(usuarios=1, tareas_por_usuario=1))
+        self.assertTrue(Usuario.objects.filter(email='usuario3@sintetico.invalid').exists())
+
+    def test_borrar(self):
+        """Test para verificar que el borrado solo afecta a los usuarios sintéticos"""
+        otro = Usuario.objects.create_user(email='real@example.com', nombre='Real', password='x')
+        Tarea.objects.create(titulo='Propia', categoria='personal', creado_por=otro)
+        sinteticos.generar(self.config)
+
+        self.assertEqual(sinteticos.borrar(), 3)
+        self.assertEqual(sinteticos.emails_existentes().count(), 0)
+        self.assertEqual(Tarea.objects.count(), 1)
+        self.assertEqual(OcurrenciaEstado.objects.count(), 0)
+
+    def test_benchmark_y_base(self):
+        """Test para verificar el JSON del benchmark y la detección de regresiones"""
+        from .management.commands.benchmark_endpoints import comparar
+
+        sinteticos.generar(self.config)
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'medicion.json')
+            call_command(
+                'benchmark_endpoints', usuarios=2, repeticiones=1, salida=salida, stdout=StringIO()
+            )
+            with open(salida, encoding='utf-8') as fichero:
+                informe = json.load(fichero)
+
+            self.assertIn('accion:calendario (mes)', informe['resultados'])
+            self.assertIn('utils:generar_ocurrencias_en_rango', informe['resultados'])
+            self.assertEqual(
+                sum(medida['errores'] for medida in informe['resultados'].values()), 0
+            )
+
+            # Contra sí misma no hay regresiones
+            call_command(
+                'benchmark_endpoints', usuarios=2, repeticiones=1, solo='utils:fecha',
+                base=salida, umbral=1000, stdout=StringIO(), stderr=StringIO(),
+            )
+
+            base = {'resultados': {'accion:list': {'consultas': 1, 'p50_ms': 1.0}}}
+            actual = {'resultados': {
+                'accion:list': {'consultas': 2, 'p50_ms': 1.5},
+                'accion:nueva': {'consultas': 9, 'p50_ms': 9.0},
+            }}
+            self.assertEqual(len(comparar(actual, base, umbral=0.2)), 2)
+            self.assertEqual(comparar(actual, base, umbral=1.0), ['accion:list: 1 -> 2 consultas'])
+
+            base = {'resultados': {'utils:fecha_corresponde_a_tarea': {'consultas': 0, 'p50_ms': 1e-9}}}
+            with open(salida, 'w', encoding='utf-8') as fichero:
+                json.dump(base, fichero)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark_endpoints', usuarios=2, repeticiones=1, solo='utils:fecha',
+                    base=salida, stdout=StringIO(), stderr=StringIO(),
+                )
+
+
+class PruebaCargaTestCase(LiveServerTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+
+    def test_prueba_carga(self):
+        """Test para verificar que la prueba de carga recorre los escalones sin errores"""
+        sinteticos.generar(sinteticos.Configuracion(usuarios=2, tareas_por_usuario=5, dias_historia=30))
+
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'carga.json')
+            call_command(
+                'prueba_carga',
+                url=self.live_server_url,
+                escalones='1,3',
+                duracion=0.5,
+                salida=salida,
+                stdout=StringIO(),
+            )
+            with open(salida, encoding='utf-8') as fichero:
+                resultados = json.load(fichero)
+
+        self.assertEqual([escalon['concurrencia'] for escalon in resultados], [1, 3])
+        for escalon in resultados:
+            self.assertTrue(escalon['endpoints'])
+            for medida in escalon['endpoints'].values():
+                self.assertEqual(medida['errores'], 0)
+                self.assertLessEqual(medida['p50_ms'], medida['p99_ms'])
+
+    def test_sin_usuarios(self):
+        """Test para verificar que sin usuarios sintéticos la prueba no arranca"""
+        with self.assertRaises(CommandError):
+            call_command('prueba_carga', url=self.live_server_url, stdout=StringIO())
+
+
+@override_settings(TAREAS_ARCHIVO_DIAS=30)
+class ArchivoEstadosTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='archivo@example.com',
+            nombre='Archivo',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.habito = Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=90), creado_por=self.usuario,
+        )
+        aplicar_estado(self.habito, self.hoy - timedelta(days=60), 'completada')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=45), 'en_proceso', 'a medias')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=5), 'completada')
+
+    def _archivar(self, **opciones):
+        salida = StringIO()
+        call_command('archivar_estados', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def _estados(self, inicio, fin):
+        respuesta = self.client.get(
+            '/api/tareas/calendario/',
+            {'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat()},
+        )
+        return {
+            item['fecha_instancia']: (item['estado'], item['notas'])
+            for item in respuesta.data['instancias_recurrentes']
+            if item['estado'] != 'pendiente'
+        }
+
+    def test_archiva_por_lotes_y_reanuda(self):
+        """Test para verificar que el comando mueve por lotes, se reanuda y no cambia la versión"""
+        version = obtener_version(self.usuario.pk)
+
+        self._archivar(lote=1, max_lotes=1)
+        self.assertEqual(OcurrenciaEstadoArchivada.objects.count(), 1)
+        self.assertEqual(OcurrenciaEstado.objects.count(), 2)
+
+        self._archivar(lote=1)
+        self.assertEqual(
+            set(OcurrenciaEstadoArchivada.objects.values_list('fecha', flat=True)),
+            {self.hoy - timedelta(days=60), self.hoy - timedelta(days=45)},
+        )
+        self.assertEqual(
+            list(OcurrenciaEstado.objects.values_list('fecha', flat=True)), [self.hoy - timedelta(days=5)]
+        )
+        archivada = OcurrenciaEstadoArchivada.objects.get(fecha=self.hoy - timedelta(days=45))
+        self.assertEqual((archivada.estado, archivada.notas), ('en_proceso', 'a medias'))
+        self.assertIn('0 estados', self._archivar())
+        self.assertEqual(obtener_version(self.usuario.pk), version)
+        self.assertFalse(Eliminacion.objects.exists())
+
+    def test_ventana_lee_el_archivo_solo_si_cruza_el_corte(self):
+        """Test para verificar que las ventanas antiguas ven lo archivado y las recientes no leen el archivo"""
+        antes = self._estados(self.hoy - timedelta(days=70), self.hoy)
+        caches['teselas'].clear()
+        self._archivar()
+
+        self.assertEqual(self._estados(self.hoy - timedelta(days=70), self.hoy), antes)
+        self.assertEqual(antes[(self.hoy - timedelta(days=45)).isoformat()], ('en_proceso', 'a medias'))
+
+        tabla = OcurrenciaEstadoArchivada._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            recientes = self._estados(self.hoy - timedelta(days=10), self.hoy)
+        self.assertEqual(list(recientes), [(self.hoy - timedelta(days=5)).isoformat()])
+        self.assertFalse(any(tabla in consulta['sql'] for consulta in consultas.captured_queries))
+
+        parametros = {
+            'fecha_inicio': (self.hoy - timedelta(days=70)).isoformat(),
+            'fecha_fin': self.hoy.isoformat(),
+        }
+        json_ = self.client.get('/api/tareas/ocurrencias_rango/', parametros).data
+        ndjson = self.client.get('/api/tareas/ocurrencias_rango/', {**parametros, 'formato': 'ndjson'})
+        lineas = [json.loads(linea) for linea in b''.join(ndjson.streaming_content).splitlines()]
+        self.assertEqual(lineas, json_)
+        self.assertEqual(sum(item['estado'] != 'pendiente' for item in lineas), 3)
+
+    def test_escribir_una_fecha_archivada_la_saca_del_archivo(self):
+        """Test para verificar que cambiar o desmarcar una ocurrencia archivada no deja duplicados"""
+        self._archivar()
+        version = obtener_version(self.usuario.pk)
+
+        aplicar_estado(self.habito, self.hoy - timedelta(days=45), 'completada')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=60), 'pendiente')
+
+        self.assertFalse(OcurrenciaEstadoArchivada.objects.exists())
+        self.assertEqual(
+            OcurrenciaEstado.objects.get(fecha=self.hoy - timedelta(days=45)).estado, 'completada'
+        )
+        self.assertGreater(obtener_version(self.usuario.pk), version)
+        self.assertTrue(
+            Eliminacion.objects.filter(tipo='ocurrencia', fecha=self.hoy - timedelta(days=60)).exists()
+        )
+        estados = self._estados(self.hoy - timedelta(days=70), self.hoy)
+        self.assertEqual(estados[(self.hoy - timedelta(days=45)).isoformat()][0], 'completada')
+        self.assertNotIn((self.hoy - timedelta(days=60)).isoformat(), estados)
+
+    def test_subir_el_corte_devuelve_filas_a_la_tabla_caliente(self):
+        """Test para verificar que con más días de retención el comando restaura lo que ya no toca archivar"""
+        self._archivar()
+        version = obtener_version(self.usuario.pk)
+
+        with override_settings(TAREAS_ARCHIVO_DIAS=50):
+            self._archivar()
+
+        self.assertEqual(
+            list(OcurrenciaEstadoArchivada.objects.values_list('fecha', flat=True)),
+            [self.hoy - timedelta(days=60)],
+        )
+        self.assertTrue(OcurrenciaEstado.objects.filter(fecha=self.hoy - timedelta(days=45)).exists())
+        self.assertGreater(obtener_version(self.usuario.pk), version)
+
+    def test_sincronizacion_inicial_e_ical_incluyen_lo_archivado(self):
+        """Test para verificar que la carga inicial de cambios y el feed iCalendar traen los estados archivados"""
+        self._archivar()
+
+        respuesta = self.client.get('/api/tareas/cambios/')
+        self.assertEqual(
+            [(o['fecha_instancia'], o['estado']) for o in respuesta.data['ocurrencias']],
+            [
+                ((self.hoy - timedelta(days=60)).isoformat(), 'completada'),
+                ((self.hoy - timedelta(days=45)).isoformat(), 'en_proceso'),
+                ((self.hoy - timedelta(days=5)).isoformat(), 'completada'),
+            ],
+        )
+
+        self.client.force_authenticate(user=None)
+        feed = self.client.get('/api/tareas/ical/', {'token': firmar_token(self.usuario)})
+        self.assertEqual(feed.content.decode().count('STATUS:COMPLETED'), 2)
+
+
+@override_settings(TAREAS_COMPLETADAS_COMPACTAS=True)
+class CompletadasCompactasTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches['teselas'].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='bits@example.com',
+            nombre='Bits',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+        self.hoy = timezone.localdate()
+        self.habito = Tarea.objects.create(
+            titulo='Hábito', categoria='personal', repeticion='diaria',
+            fecha_entrega=self.hoy - timedelta(days=9), creado_por=self.usuario,
+        )
+        self.semanal = Tarea.objects.create(
+            titulo='Semanal', categoria='trabajo', repeticion='semanal',
+            fecha_entrega=self.hoy - timedelta(days=35), creado_por=self.usuario,
+        )
+        self.ventana = {
+            'fecha_inicio': (self.hoy - timedelta(days=40)).isoformat(),
+            'fecha_fin': self.hoy.isoformat(),
+        }
+
+    def _marcar(self, tarea, dias_atras, estado='completada', notas=None):
+        datos = {'tarea_id': tarea.id_tarea, 'fecha': (self.hoy - timedelta(days=dias_atras)).isoformat(), 'estado': estado}
+        if notas:
+            datos['notas'] = notas
+        return self.client.post('/api/tareas/actualizar_ocurrencia/', datos, format='json')
+
+    def _historial(self):
+        for dias_atras in (9, 8, 7, 6, 3, 2, 1):
+            aplicar_estado(self.habito, self.hoy - timedelta(days=dias_atras), 'completada')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=5), 'en_proceso')
+        aplicar_estado(self.habito, self.hoy - timedelta(days=4), 'completada', 'con notas')
+        aplicar_estado(self.semanal, self.semanal.fecha_entrega + timedelta(weeks=2), 'completada')
+
+    @staticmethod
+    def _sin_marcas(datos):
+        return [{**item, 'completada_en': None} for item in datos]
+
+    def test_completada_sin_notas_es_un_bit(self):
+        """Test para verificar que solo las completadas sin notas se guardan como bits"""
+        respuesta = self._marcar(self.habito, 2)
+        self.assertEqual(respuesta.data['ocurrencia']['estado'], 'completada')
+        self.assertIsNone(respuesta.data['ocurrencia']['completada_en'])
+        self.assertFalse(OcurrenciaEstado.objects.exists())
+        mapa = CompletadasMes.objects.get()
+        fecha = self.hoy - timedelta(days=2)
+        self.assertEqual((mapa.mes, mapa.dias), (fecha.replace(day=1), 1 << (fecha.day - 1)))
+
+        self._marcar(self.habito, 2, notas='con notas')
+        self.assertFalse(CompletadasMes.objects.exists())
+        self.assertEqual(OcurrenciaEstado.objects.get().notas, 'con notas')
+
+        self._marcar(self.habito, 2)
+        self._marcar(self.habito, 2, 'pendiente')
+        self.assertFalse(OcurrenciaEstado.objects.exists())
+        self.assertFalse(CompletadasMes.objects.exists())
+        self.assertTrue(Eliminacion.objects.filter(tipo='ocurrencia', fecha=fecha).exists())
+
+    def test_lecturas_iguales_con_filas_y_con_bits(self):
+        """Test para verificar que compactar no cambia calendario, NDJSON, ASGI ni el feed salvo completada_en"""
+        with override_settings(TAREAS_COMPLETADAS_COMPACTAS=False):
+            self._historial()
+            antes = self.client.get('/api/tareas/ocurrencias_rango/', self.ventana).data
+            caches['teselas'].clear()
+
+        salida = StringIO()
+        call_command('compactar_completadas', stdout=salida)
+        self.assertIn('8 completadas convertidas', salida.getvalue())
+        self.assertEqual(OcurrenciaEstado.objects.count(), 2)
+
+        despues = self.client.get('/api/tareas/ocurrencias_rango/', self.ventana).data
+        self.assertEqual(self._sin_marcas(despues), self._sin_marcas(antes))
+        con_notas = next(item for item in despues if item['notas'] == 'con notas')
+        self.assertIsNotNone(con_notas['completada_en'])
+
+        ndjson = self.client.get('/api/tareas/ocurrencias_rango/', {**self.ventana, 'formato': 'ndjson'})
+        lineas = [json.loads(linea) for linea in b''.join(ndjson.streaming_content).splitlines()]
+        self.assertEqual(lineas, despues)
+
+        caches['teselas'].clear()
+        asincrona = async_to_sync(self.async_client.get)(
+            '/api/tareas/ocurrencias_rango/',
+            self.ventana,
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.usuario)}'},
+        )
+        self.assertEqual(json.loads(asincrona.content), despues)
+
+        feed = self.client.get('/api/tareas/ical/', {'token': firmar_token(self.usuario)})
+        self.assertEqual(feed.content.decode().count('PERCENT-COMPLETE:100'), 9)
+
+    def test_expandir_deshace_la_compactacion(self):
+        """Test para verificar que --expandir devuelve los bits a filas sin tocar las existentes"""
+        self._historial()
+        self.assertEqual(OcurrenciaEstado.objects.count(), 2)
+
+        call_command('compactar_completadas', expandir=True, stdout=StringIO())
+
+        self.assertFalse(CompletadasMes.objects.exists())
+        self.assertEqual(TareaCompletada.objects.count(), 9)
+        self.assertEqual(TareaCompletada.objects.get(notas='con notas').fecha, self.hoy - timedelta(days=4))
+
+        with override_settings(TAREAS_COMPLETADAS_COMPACTAS=False):
+            with self.assertRaises(CommandError):
+                call_command('compactar_completadas', stdout=StringIO())
+
+    def test_estadisticas_proxima_y_sincronizacion(self):
+        """Test para verificar que el bit de hoy cuenta en estadísticas, próxima ocurrencia y cambios"""
+        cursor = self.client.get('/api/tareas/cambios/').data['cursor']
+        self._marcar(self.habito, 0)
+
+        self.assertEqual(self.client.get('/api/tareas/estadisticas/').data['completadas'], 1)
+        self.habito.refresh_from_db()
+        self.assertEqual(self.habito.proxima_ocurrencia, self.hoy + timedelta(days=1))
+
+        cambios = self.client.get('/api/tareas/cambios/', {'desde': cursor}).data
+        self.assertEqual(
+            [(o['fecha_instancia'], o['estado']) for o in cambios['ocurrencias']],
+            [(self.hoy.isoformat(), 'completada')],
+        )
+
+        cursor = cambios['cursor']
+        self._marcar(self.habito, 0, 'pendiente')
+        cambios = self.client.get('/api/tareas/cambios/', {'desde': cursor}).data
+        self.assertEqual(
+            cambios['ocurrencias_eliminadas'],
+            [{'tarea_id': self.habito.id_tarea, 'fecha': self.hoy.isoformat()}],
+        )
+        self.assertEqual(self.client.get('/api/tareas/estadisticas/').data['completadas'], 0)
+
+    def test_cumplimiento_con_filas_y_con_bits(self):
+        """Test para verificar esperadas, completadas, tasa y racha en los dos modos"""
+        for compactar in (False, True):
+            with self.subTest(compactar=compactar), override_settings(TAREAS_COMPLETADAS_COMPACTAS=compactar):
+                OcurrenciaEstado.objects.all().delete()
+                CompletadasMes.objects.all().delete()
+                self._historial()
+
+                datos = self.client.get(f'/api/tareas/{self.habito.id_tarea}/cumplimiento/').data
+
+                # 10 ocurrencias (hoy incluida): 8 completadas, la de hace 5 días en proceso
+                self.assertEqual((datos['esperadas'], datos['completadas']), (10, 8))
+                self.assertEqual(datos['tasa'], 0.8)
+                # Hoy sigue pendiente y no corta la racha
+                self.assertEqual(datos['racha'], 4)
+
+        unica = Tarea.objects.create(titulo='Única', categoria='trabajo', creado_por=self.usuario)
+        self.assertEqual(
+            self.client.get(f'/api/tareas/{unica.id_tarea}/cumplimiento/').status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_mascara_y_fechas(self):
+        """Test para verificar la máscara de días de un mes y la lectura de sus bits"""
+        mes = date(2024, 2, 1)
+        self.assertEqual(compactas.mascara(mes), (1 << 29) - 1)
+        self.assertEqual(compactas.mascara(mes, date(2024, 2, 3), date(2024, 2, 4)), 0b1100)
+        self.assertEqual(compactas.mascara(mes, date(2024, 3, 1)), 0)
+        self.assertEqual(list(compactas.fechas(mes, 0b101)), [date(2024, 2, 1), date(2024, 2, 3)])
+
+    @override_settings(TAREAS_COMPLETADAS_COMPACTAS=False)
+    def test_benchmark(self):
+        """Test para verificar que el benchmark compara ambos modos y deshace la compactación"""
+        sinteticos.generar(sinteticos.Configuracion(usuarios=2, tareas_por_usuario=4, dias_historia=60, semilla=3))
+        filas = OcurrenciaEstado.objects.count()
+        salida = StringIO()
+
+        call_command('benchmark_completadas', usuarios=2, repeticiones=1, stdout=salida)
+
+        self.assertIn('_mapas_estados p50 (ms)', salida.getvalue())
+        self.assertIn('bytes de estados', salida.getvalue())
+        self.assertEqual(OcurrenciaEstado.objects.count(), filas)
+        self.assertFalse(CompletadasMes.objects.exists())
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import vistas_async
+
+# Se anteponen a las rutas del router solo en tarea_api.urls_asgi
+urlpatterns = [
+	path('calendario/', vistas_async.calendario),
+	path('ocurrencias_rango/', vistas_async.ocurrencias_rango),
+	path('estadisticas/', vistas_async.estadisticas),
+]
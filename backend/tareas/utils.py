@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import heapq
 from dataclasses import dataclass
+from itertools import islice
 from datetime import date, timedelta
-from typing import Iterable, Optional
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
 
 from dateutil.relativedelta import relativedelta
+from django.utils import timezone
 
 from .models import Tarea
 
@@ -37,12 +40,16 @@ def obtener_siguiente_fecha(tarea: Tarea, fecha_actual: date) -> Optional[date]:
     return None
 
 
-def generar_ocurrencias_en_rango(
+def generar_ocurrencias_por_pasos(
     tarea: Tarea,
     fecha_inicio: date,
     fecha_fin: date,
 ) -> Iterable[date]:
-    """Genera las fechas de ocurrencia de una tarea entre dos fechas inclusive."""
+    """Implementación de referencia que avanza fecha a fecha desde el anclaje.
+
+    Se conserva solo para las pruebas diferenciales y el benchmark del motor
+    aritmético; su coste crece con la antigüedad de la tarea.
+    """
     if not tarea.fecha_entrega:
         return []
 
@@ -79,29 +86,170 @@ def generar_ocurrencias_en_rango(
     return fechas
 
 
-def obtener_proxima_ocurrencia(tarea: Tarea, referencia: Optional[date] = None) -> Optional[date]:
-    if not tarea.fecha_entrega:
+# ---------------------------------------------------------------------------
+# Motor aritmético de recurrencias
+#
+# Cada ocurrencia se identifica por su índice k >= 0 respecto a la fecha de
+# anclaje (``fecha_entrega``).  Para reglas basadas en días la fecha es
+# ``anclaje + k * paso``; para la regla mensual se suma ``k * intervalo``
+# meses al anclaje, de modo que el día se recorta al último del mes sin
+# arrastrar el recorte a los meses siguientes (31 ene -> 28 feb -> 31 mar).
+# ---------------------------------------------------------------------------
+
+
+def paso_en_dias(tarea: Tarea) -> Optional[int]:
+    intervalo = tarea.intervalo_repeticion or 1
+
+    if tarea.repeticion in ('diaria', 'personalizada'):
+        return intervalo
+    if tarea.repeticion == 'semanal':
+        return 7 * intervalo
+
+    return None
+
+
+def _meses_entre(inicio: date, fin: date) -> int:
+    return (fin.year - inicio.year) * 12 + (fin.month - inicio.month)
+
+
+def fecha_en_indice(tarea: Tarea, indice: int) -> Optional[date]:
+    """Devuelve la fecha de la ocurrencia número ``indice`` de la tarea."""
+    if not tarea.fecha_entrega or indice < 0:
         return None
 
-    referencia = referencia or date.today()
+    if tarea.repeticion == 'ninguna':
+        return tarea.fecha_entrega if indice == 0 else None
+
+    paso = paso_en_dias(tarea)
+    if paso is not None:
+        return tarea.fecha_entrega + timedelta(days=indice * paso)
+    if tarea.repeticion == 'mensual':
+        intervalo = tarea.intervalo_repeticion or 1
+        return tarea.fecha_entrega + relativedelta(months=indice * intervalo)
+
+    return None
+
+
+def primer_indice_desde(tarea: Tarea, fecha: date) -> Optional[int]:
+    """Índice de la primera ocurrencia en o después de ``fecha`` (sin límite de fin)."""
+    anclaje = tarea.fecha_entrega
+    if not anclaje:
+        return None
+
+    if fecha <= anclaje:
+        return 0
 
     if tarea.repeticion == 'ninguna':
-        return tarea.fecha_entrega if tarea.fecha_entrega >= referencia else None
+        return None
 
-    actual = tarea.fecha_entrega
-    contador = 0
+    paso = paso_en_dias(tarea)
+    if paso is not None:
+        return -(-(fecha - anclaje).days // paso)
 
-    while actual and contador < MAX_OCCURRENCIAS_SEGURIDAD:
-        if tarea.fecha_fin_repeticion and actual > tarea.fecha_fin_repeticion:
-            return None
-        if actual >= referencia:
-            return actual
-        actual = obtener_siguiente_fecha(tarea, actual)
-        contador += 1
+    if tarea.repeticion == 'mensual':
+        intervalo = tarea.intervalo_repeticion or 1
+        indice = max(0, -(-_meses_entre(anclaje, fecha) // intervalo))
+        if fecha_en_indice(tarea, indice) < fecha:
+            indice += 1
+        return indice
 
     return None
 
 
+def iterar_ocurrencias(
+    tarea: Tarea,
+    fecha_inicio: date,
+    fecha_fin: Optional[date] = None,
+) -> Iterator[date]:
+    """Recorre perezosamente las ocurrencias desde ``fecha_inicio``.
+
+    Respeta ``fecha_fin_repeticion``; si ``fecha_fin`` es ``None`` el recorrido
+    solo termina con el fin de la repetición.
+    """
+    limite_superior = fecha_fin
+    if tarea.fecha_fin_repeticion and (
+        limite_superior is None or tarea.fecha_fin_repeticion < limite_superior
+    ):
+        limite_superior = tarea.fecha_fin_repeticion
+
+    indice = primer_indice_desde(tarea, fecha_inicio)
+    if indice is None:
+        return
+
+    if tarea.repeticion == 'ninguna':
+        if limite_superior is None or tarea.fecha_entrega <= limite_superior:
+            yield tarea.fecha_entrega
+        return
+
+    while True:
+        actual = fecha_en_indice(tarea, indice)
+        if actual is None or (limite_superior is not None and actual > limite_superior):
+            return
+        yield actual
+        indice += 1
+
+
+def _con_tarea(tarea: Tarea, fechas: Iterator[date]) -> Iterator[Tuple[date, Tarea]]:
+    for fecha in fechas:
+        yield fecha, tarea
+
+
+def iterar_ocurrencias_ordenadas(
+    tareas: Sequence[Tarea],
+    fecha_inicio: date,
+    fecha_fin: date,
+    limite_por_tarea: Optional[int] = None,
+) -> Iterator[Tuple[date, Tarea]]:
+    """Mezcla perezosa de las ocurrencias de varias tareas en orden ``(fecha, id_tarea)``.
+
+    Cada tarea aporta su recorrido perezoso y ``heapq.merge`` solo mantiene
+    una ocurrencia pendiente por tarea, así que la memoria no depende de la
+    longitud de la ventana.  Con ``limite_por_tarea`` cada tarea aporta solo
+    sus primeras ocurrencias, como ``generar_ocurrencias_en_rango``.
+    """
+    flujos = [
+        _con_tarea(tarea, islice(iterar_ocurrencias(tarea, fecha_inicio, fecha_fin), limite_por_tarea))
+        for tarea in tareas
+        if tarea.fecha_entrega
+    ]
+    return heapq.merge(*flujos, key=lambda par: (par[0], par[1].id_tarea))
+
+
+def generar_ocurrencias_en_rango(
+    tarea: Tarea,
+    fecha_inicio: date,
+    fecha_fin: date,
+) -> Iterable[date]:
+    """Genera las fechas de ocurrencia de una tarea entre dos fechas inclusive.
+
+    El coste es proporcional al número de ocurrencias de la ventana, no a la
+    antigüedad de la tarea; ``MAX_OCCURRENCIAS_SEGURIDAD`` limita el tamaño
+    de la ventana expandida.
+    """
+    if not tarea.fecha_entrega or fecha_fin < fecha_inicio:
+        return []
+
+    fechas = []
+    for fecha in iterar_ocurrencias(tarea, fecha_inicio, fecha_fin):
+        if len(fechas) >= MAX_OCCURRENCIAS_SEGURIDAD:
+            break
+        fechas.append(fecha)
+
+    return fechas
+
+
+def obtener_proxima_ocurrencia(tarea: Tarea, referencia: Optional[date] = None) -> Optional[date]:
+    if not tarea.fecha_entrega:
+        return None
+
+    referencia = referencia or timezone.localdate()
+
+    if tarea.repeticion == 'ninguna':
+        return tarea.fecha_entrega if tarea.fecha_entrega >= referencia else None
+
+    return next(iterar_ocurrencias(tarea, referencia), None)
+
+
 def fecha_corresponde_a_tarea(tarea: Tarea, fecha: date) -> bool:
     if not tarea.fecha_entrega:
         return False
@@ -115,15 +263,15 @@ def fecha_corresponde_a_tarea(tarea: Tarea, fecha: date) -> bool:
     if fecha < tarea.fecha_entrega:
         return False
 
-    actual = tarea.fecha_entrega
-    contador = 0
+    paso = paso_en_dias(tarea)
+    if paso is not None:
+        return (fecha - tarea.fecha_entrega).days % paso == 0
 
-    while actual and contador < MAX_OCCURRENCIAS_SEGURIDAD:
-        if actual == fecha:
-            return True
-        if actual > fecha:
+    if tarea.repeticion == 'mensual':
+        intervalo = tarea.intervalo_repeticion or 1
+        meses = _meses_entre(tarea.fecha_entrega, fecha)
+        if meses % intervalo:
             return False
-        actual = obtener_siguiente_fecha(tarea, actual)
-        contador += 1
+        return fecha_en_indice(tarea, meses // intervalo) == fecha
 
     return False
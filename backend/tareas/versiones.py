@@ -0,0 +1,115 @@
+"""Versión de los datos de cada usuario (tabla ``tareas_version_usuario``).
+
+Cualquier escritura sobre las tareas o los estados de ocurrencia de un usuario
+incrementa su versión; las vistas de lectura derivan de ella sus ETag y la
+caché de estadísticas la usa como parte de la clave.  Leerla cuesta una
+consulta por clave primaria, o ninguna si la caché es compartida entre
+procesos: con ``LocMemCache`` cada worker tendría su propia copia y podría
+responder 304 con datos viejos, así que en ese caso no se cachea.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersionUsuario
+
+
+_BACKENDS_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _clave(usuario_id: int) -> str:
+    return f'tareas:version:{usuario_id}'
+
+
+def cache_compartida() -> bool:
+    configurado = getattr(settings, 'TAREAS_CACHE_VERSIONES', None)
+    if configurado is not None:
+        return configurado
+    return settings.CACHES['default']['BACKEND'] not in _BACKENDS_POR_PROCESO
+
+
+def obtener_version(usuario_id: int) -> int:
+    usar_cache = cache_compartida()
+    if usar_cache:
+        version = cache.get(_clave(usuario_id))
+        if version is not None:
+            return version
+
+    version = (
+        VersionUsuario.objects.filter(usuario_id=usuario_id)
+        .values_list('version', flat=True)
+        .first()
+    ) or 0
+
+    if usar_cache:
+        cache.set(
+            _clave(usuario_id),
+            version,
+            getattr(settings, 'TAREAS_CACHE_VERSIONES_SEGUNDOS', 3600),
+        )
+    return version
+
+
+async def aobtener_version(usuario_id: int) -> int:
+    """Versión asíncrona de ``obtener_version`` para las vistas ASGI."""
+    usar_cache = cache_compartida()
+    if usar_cache:
+        version = await cache.aget(_clave(usuario_id))
+        if version is not None:
+            return version
+
+    version = (
+        await VersionUsuario.objects.filter(usuario_id=usuario_id)
+        .values_list('version', flat=True)
+        .afirst()
+    ) or 0
+
+    if usar_cache:
+        await cache.aset(
+            _clave(usuario_id),
+            version,
+            getattr(settings, 'TAREAS_CACHE_VERSIONES_SEGUNDOS', 3600),
+        )
+    return version
+
+
+def incrementar_version(usuario_id: Optional[int]) -> None:
+    """Marca que los datos de ``usuario_id`` cambiaron."""
+    if usuario_id is None:
+        return
+
+    actualizadas = VersionUsuario.objects.filter(usuario_id=usuario_id).update(
+        version=F('version') + 1, actualizado_en=timezone.now()
+    )
+    if not actualizadas:
+        # Si otra petición crea la fila a la vez, basta con que la versión cambie
+        VersionUsuario.objects.bulk_create(
+            [VersionUsuario(usuario_id=usuario_id, version=1)], ignore_conflicts=True
+        )
+
+    clave = _clave(usuario_id)
+    cache.delete(clave)
+    # Una lectura concurrente pudo volver a cachear la versión anterior antes
+    # del COMMIT
+    transaction.on_commit(lambda: cache.delete(clave))
+
+
+def incrementar_versiones(usuario_ids: Iterable[Optional[int]]) -> None:
+    for usuario_id in set(usuario_ids):
+        incrementar_version(usuario_id)
+
+
+def etag(usuario_id: int, version: int, *partes) -> str:
+    """ETag fuerte para una representación de los datos del usuario."""
+    crudo = '|'.join(str(parte) for parte in (usuario_id, version) + partes)
+    return '"%s"' % hashlib.sha256(crudo.encode()).hexdigest()[:32]
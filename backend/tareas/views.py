@@ -1,22 +1,82 @@
-from datetime import date
-from typing import Dict, Iterable, List
-
-from rest_framework import permissions, status, viewsets
+import heapq
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, FilteredRelation, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-
-from .models import Tarea, TareaCompletada, TareaEnProceso
+from rest_framework.settings import api_settings
+
+from tarea_api.instrumentacion import contar
+
+from . import archivo, compactas, teselas
+from .cache import guardar_estadisticas, obtener_estadisticas
+from .estados import aplicar_estado, aplicar_estados
+from .models import OcurrenciaEstado, Tarea, TareaOcurrencia
+from .ocurrencias_lote import UMBRAL_TAREAS_LOTE, lote_disponible, ocurrencias_con_estados
+from .paginacion import TareaCursorPagination
+from .perfilado import PerfiladoMixin
+from .proxima import actualizar_proxima_ocurrencia, actualizar_proximas_ocurrencias
+from .ical import firmar_token, generar_calendario, usuario_de_token
+from .renderers import ICalRenderer, NDJSONRenderer
 from .serializers import TareaSerializer
+from .sincronizacion import CursorCaducado, cambios_desde, decodificar_cursor
 from .utils import (
+	MAX_OCCURRENCIAS_SEGURIDAD,
 	es_tarea_recurrente,
 	fecha_corresponde_a_tarea,
 	generar_ocurrencias_en_rango,
+	iterar_ocurrencias,
+	iterar_ocurrencias_ordenadas,
 )
+from .versiones import etag, obtener_version
+
+
+ESTADOS_OCURRENCIA = {'pendiente', 'en_proceso', 'completada'}
+MAX_CAMBIOS_LOTE = 500
+# Ocurrencias por trozo del NDJSON y filas por lectura del cursor de estados
+TAMANO_BLOQUE_NDJSON = 500
+
+# Lecturas que responden 304 si el ETag enviado coincide con la versión actual
+ACCIONES_CONDICIONALES = {
+	'list',
+	'retrieve',
+	'estadisticas',
+	'proximas',
+	'calendario',
+	'ocurrencias_por_fecha',
+	'ocurrencias_rango',
+	'ocurrencias_hoy',
+	'ical',
+	'cambios',
+	'cumplimiento',
+}
 
 
-class TareaViewSet(viewsets.ModelViewSet):
+class NoModificado(APIException):
+	status_code = status.HTTP_304_NOT_MODIFIED
+
+	def __init__(self, etag):
+		super().__init__()
+		self.etag = etag
+
+
+class TareaViewSet(PerfiladoMixin, viewsets.ModelViewSet):
 	serializer_class = TareaSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = TareaCursorPagination
+	filter_backends = [filters.OrderingFilter]
+	ordering_fields = ['proxima_ocurrencia', 'fecha_creacion', 'fecha_entrega', 'titulo']
 
 	def get_queryset(self):
 		return (
@@ -24,39 +84,296 @@ class TareaViewSet(viewsets.ModelViewSet):
 			.order_by('-fecha_creacion')
 		)
 
+	def filter_queryset(self, queryset):
+		queryset = super().filter_queryset(queryset)
+		if self.action != 'list':
+			return queryset
+
+		for parametro, lookup in (
+			('proxima_desde', 'proxima_ocurrencia__gte'),
+			('proxima_hasta', 'proxima_ocurrencia__lte'),
+		):
+			valor = self.request.query_params.get(parametro)
+			if valor:
+				try:
+					queryset = queryset.filter(**{lookup: date.fromisoformat(valor)})
+				except ValueError:
+					raise ValidationError({parametro: 'Formato de fecha inválido. Use YYYY-MM-DD'})
+
+		return queryset
+
+	def get_serializer(self, *args, **kwargs):
+		# Tareas cargadas por list, retrieve y las ediciones (Server-Timing y /metrics)
+		if args:
+			contar('tareas', len(args[0]) if kwargs.get('many') else 1)
+		return super().get_serializer(*args, **kwargs)
+
 	def perform_create(self, serializer):
 		serializer.save(creado_por=self.request.user)
 
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs)
+		self.version_datos = None
+		self.etag = None
+		if request.method != 'GET' or self.action not in ACCIONES_CONDICIONALES:
+			return
+
+		self.usuario_datos = request.user.pk
+		if self.action == 'ical':
+			self.usuario_datos = usuario_de_token(request.query_params.get('token', ''))
+			if self.usuario_datos is None:
+				raise PermissionDenied('Token de calendario inválido.')
+
+		# Se comprueba antes de consultar o expandir nada: una sola lectura
+		# por clave primaria (o ninguna con caché compartida)
+		self.version_datos = obtener_version(self.usuario_datos)
+		self.etag = self._etag_lectura(request.query_params, request.accepted_renderer.format)
+		enviados = parse_etags(request.headers.get('If-None-Match', ''))
+		if '*' in enviados or self.etag in enviados:
+			raise NoModificado(self.etag)
+
+	def _etag_lectura(self, parametros, formato: str) -> str:
+		return etag(
+			self.usuario_datos,
+			self.version_datos,
+			timezone.localdate().isoformat(),
+			self.action,
+			sorted(self.kwargs.items()),
+			sorted(parametros.lists()),
+			formato,
+		)
+
+	def handle_exception(self, exc):
+		if isinstance(exc, NoModificado):
+			return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': exc.etag})
+		return super().handle_exception(exc)
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		if getattr(self, 'etag', None) and response.status_code in (200, 304):
+			response['ETag'] = self.etag
+			# Que el navegador revalide siempre en lugar de reutilizar la copia
+			patch_cache_control(response, private=True, no_cache=True)
+		return response
+
 	@action(detail=False, methods=['get'])
 	def estadisticas(self, request):
-		queryset = self.get_queryset()
-
-		pendientes = queryset.filter(estado='pendiente', repeticion='ninguna').count()
-		en_proceso = queryset.filter(estado='en_proceso', repeticion='ninguna').count()
-		completadas = queryset.filter(estado='completada', repeticion='ninguna').count()
-
-		hoy = date.today()
-		tareas_recurrentes = queryset.exclude(repeticion='ninguna')
-		if tareas_recurrentes.exists():
-			estados_recurrentes = self._mapas_estados(list(tareas_recurrentes), hoy, hoy)
-			for tarea in tareas_recurrentes:
-				key = (tarea.id_tarea, hoy)
-				if key in estados_recurrentes['completadas']:
-					completadas += 1
-				elif key in estados_recurrentes['en_proceso']:
-					en_proceso += 1
-				else:
-					pendientes += 1
+		hoy = timezone.localdate()
+		datos = obtener_estadisticas(request.user.pk, self.version_datos, hoy)
+		if datos is None:
+			consulta, agregados = self._consulta_estadisticas(hoy)
+			datos = self._resumir_estadisticas(consulta.aggregate(**agregados))
+			guardar_estadisticas(request.user.pk, self.version_datos, hoy, datos)
+
+		return Response(datos)
+
+	def _consulta_estadisticas(self, hoy: date):
+		"""Consulta y agregados que cuentan todo en una sola sentencia.
+
+		Las tareas sin repetición se cuentan por su ``estado``; las recurrentes
+		por el estado de su ocurrencia de hoy, unido con un LEFT JOIN filtrado
+		contra las filas de ``tareas_ocurrencia_estado`` de ``hoy``.  Con
+		completadas compactas cuenta también el bit de hoy, en una subconsulta.
+		"""
+		unica = Q(repeticion='ninguna')
+		completada_hoy = Q(estado_hoy__estado='completada')
+		en_proceso_hoy = Q(estado_hoy__estado='en_proceso')
+		pendiente_hoy = Q(estado_hoy__id__isnull=True)
+		if compactas.habilitadas():
+			completada_compacta = compactas.completada_el(hoy)
+			completada_hoy |= Q(completada_compacta)
+			pendiente_hoy &= ~Q(completada_compacta)
+
+		consulta = (
+			self.get_queryset()
+			.order_by()
+			.annotate(
+				estado_hoy=FilteredRelation(
+					'estados_ocurrencia',
+					condition=Q(estados_ocurrencia__fecha=hoy),
+				),
+			)
+		)
+		agregados = {
+			'pendientes_unicas': Count('pk', filter=unica & Q(estado='pendiente')),
+			'en_proceso_unicas': Count('pk', filter=unica & Q(estado='en_proceso')),
+			'completadas_unicas': Count('pk', filter=unica & Q(estado='completada')),
+			'completadas_recurrentes': Count('pk', filter=~unica & completada_hoy),
+			'en_proceso_recurrentes': Count('pk', filter=~unica & en_proceso_hoy),
+			'pendientes_recurrentes': Count('pk', filter=~unica & pendiente_hoy),
+			'total': Count('pk'),
+		}
+		return consulta, agregados
+
+	@staticmethod
+	def _resumir_estadisticas(conteos: Dict[str, int]) -> Dict[str, int]:
+		return {
+			'pendientes': conteos['pendientes_unicas'] + conteos['pendientes_recurrentes'],
+			'en_proceso': conteos['en_proceso_unicas'] + conteos['en_proceso_recurrentes'],
+			'completadas': conteos['completadas_unicas'] + conteos['completadas_recurrentes'],
+			'total': conteos['total'],
+		}
+
+	@action(detail=False, methods=['get'])
+	def proximas(self, request):
+		try:
+			limite = min(int(request.query_params.get('limite', 20)), 100)
+		except ValueError:
+			return Response(
+				{'error': 'El parámetro limite debe ser un número entero'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		tareas = list(
+			self.get_queryset()
+			.filter(proxima_ocurrencia__isnull=False)
+			.order_by('proxima_ocurrencia', 'id_tarea')[:max(limite, 0)]
+		)
+		contar('tareas', len(tareas))
+		return Response(TareaSerializer(tareas, many=True).data)
+
+	@action(detail=True, methods=['get'])
+	def cumplimiento(self, request, pk=None):
+		"""Ocurrencias esperadas, completadas, tasa y racha de una tarea recurrente.
+
+		La ventana es ``fecha_inicio``..``fecha_fin``; por defecto el último año
+		hasta hoy.
+		"""
+		tarea = self.get_object()
+		contar('tareas')
+		if tarea.repeticion == 'ninguna':
+			return Response(
+				{'error': 'Solo las tareas recurrentes tienen cumplimiento.'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		hoy = timezone.localdate()
+		try:
+			fecha_fin = date.fromisoformat(request.query_params.get('fecha_fin') or hoy.isoformat())
+			fecha_inicio = date.fromisoformat(
+				request.query_params.get('fecha_inicio') or (fecha_fin - timedelta(days=364)).isoformat()
+			)
+		except ValueError:
+			return Response(
+				{'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		if fecha_fin < fecha_inicio:
+			return Response(
+				{'error': 'La fecha_fin debe ser igual o posterior a fecha_inicio'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
 
 		return Response(
 			{
-				'pendientes': pendientes,
-				'en_proceso': en_proceso,
-				'completadas': completadas,
-				'total': queryset.count(),
+				'tarea_id': tarea.id_tarea,
+				'fecha_inicio': fecha_inicio.isoformat(),
+				'fecha_fin': fecha_fin.isoformat(),
+				**compactas.cumplimiento(tarea, fecha_inicio, fecha_fin, hoy),
 			}
 		)
 
+	@action(
+		detail=False,
+		methods=['get'],
+		url_path='cache_teselas',
+		permission_classes=[permissions.IsAdminUser],
+	)
+	def cache_teselas(self, request):
+		"""Aciertos y fallos de la caché de teselas mensuales, según las métricas."""
+		return Response(teselas.contadores())
+
+	@action(detail=False, methods=['get'])
+	def cambios(self, request):
+		"""Tareas y estados creados, modificados o eliminados desde ``?desde=<cursor>``.
+
+		Sin ``desde`` devuelve todo (sincronización inicial).  El cliente guarda
+		el ``cursor`` de la respuesta para la siguiente llamada.
+		"""
+		desde = None
+		if request.query_params.get('desde'):
+			try:
+				desde = decodificar_cursor(request.query_params['desde'])
+			except ValueError:
+				raise ValidationError({'desde': 'Cursor inválido.'})
+
+		try:
+			cambios = cambios_desde(request.user.pk, desde)
+		except CursorCaducado:
+			return Response(
+				{'error': 'El cursor es demasiado antiguo; vuelva a cargar sin desde.'},
+				status=status.HTTP_410_GONE,
+			)
+		contar('tareas', len(cambios['tareas']))
+
+		return Response(
+			{
+				'cursor': cambios['cursor'],
+				'tareas': TareaSerializer(cambios['tareas'], many=True).data,
+				'tareas_eliminadas': cambios['tareas_eliminadas'],
+				'ocurrencias': [
+					self._payload_ocurrencia(
+						estado.tarea,
+						estado.fecha,
+						estado if estado.estado == 'completada' else None,
+						estado if estado.estado == 'en_proceso' else None,
+					)
+					for estado in cambios['ocurrencias']
+				],
+				'ocurrencias_eliminadas': [
+					{'tarea_id': item['tarea_id'], 'fecha': item['fecha'].isoformat()}
+					for item in cambios['ocurrencias_eliminadas']
+				],
+			}
+		)
+
+	@action(detail=False, methods=['get', 'post'], url_path='ical_enlace')
+	def ical_enlace(self, request):
+		"""URL de suscripción al feed iCalendar del usuario, con su token firmado.
+
+		``POST`` rota el secreto del token: los enlaces anteriores dejan de valer.
+		"""
+		url = self.reverse_action(self.ical.url_name)
+		token = firmar_token(request.user, rotar=request.method == 'POST')
+		return Response({'url': request.build_absolute_uri(f'{url}?token={token}')})
+
+	@action(
+		detail=False,
+		methods=['get'],
+		url_path='ical',
+		authentication_classes=[],
+		permission_classes=[permissions.AllowAny],
+		renderer_classes=[JSONRenderer, ICalRenderer],
+	)
+	def ical(self, request):
+		"""Feed iCalendar: un VTODO con RRULE por tarea más los estados de ocurrencias recientes."""
+		desde = timezone.localdate() - timedelta(days=getattr(settings, 'TAREAS_ICAL_DIAS_ESTADOS', 365))
+		tareas = list(Tarea.objects.filter(creado_por_id=self.usuario_datos, activa=True).order_by('id_tarea'))
+		contar('tareas', len(tareas))
+		estados = archivo.estados(
+			Q(tarea__creado_por_id=self.usuario_datos, tarea__activa=True)
+			& ~Q(tarea__repeticion='ninguna'),
+			desde,
+		).order_by('tarea_id', 'fecha')
+		if compactas.habilitadas():
+			estados = heapq.merge(
+				estados,
+				sorted(
+					compactas.como_estados(
+						compactas.mapas_en(
+							Q(tarea__creado_por_id=self.usuario_datos, tarea__activa=True), desde
+						),
+						desde,
+					),
+					key=lambda item: (item.tarea_id, item.fecha),
+				),
+				key=lambda item: (item.tarea_id, item.fecha),
+			)
+		return HttpResponse(
+			generar_calendario(tareas, estados),
+			content_type=f'{ICalRenderer.media_type}; charset=utf-8',
+		)
+
 	@action(detail=False, methods=['get'])
 	def calendario(self, request):
 		fecha_inicio_str = request.query_params.get('fecha_inicio')
@@ -77,33 +394,23 @@ class TareaViewSet(viewsets.ModelViewSet):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		tareas_usuario = list(self.get_queryset())
-		mapas = self._mapas_estados(tareas_usuario, fecha_inicio, fecha_fin)
+		instancias, tareas_normales = self._ocurrencias_por_teselas(fecha_inicio, fecha_fin)
 
-		instancias = self._generar_payload_ocurrencias(
-			tareas_usuario, fecha_inicio, fecha_fin, mapas
+		tareas_normales.sort(
+			key=lambda tarea: datetime.fromisoformat(tarea['fecha_creacion']), reverse=True
 		)
-
-		tareas_normales = [
-			tarea
-			for tarea in tareas_usuario
-			if tarea.repeticion == 'ninguna'
-			and tarea.fecha_entrega
-			and fecha_inicio <= tarea.fecha_entrega <= fecha_fin
-		]
-
 		instancias.sort(key=lambda item: (item['fecha_instancia'], item['tarea_id']))
 
 		return Response(
 			{
 				'instancias_recurrentes': instancias,
-				'tareas_normales': TareaSerializer(tareas_normales, many=True).data,
+				'tareas_normales': tareas_normales,
 			}
 		)
 
 	@action(detail=False, methods=['get'], url_path='ocurrencias_por_fecha')
 	def ocurrencias_por_fecha(self, request):
-		fecha_str = request.query_params.get('fecha', date.today().isoformat())
+		fecha_str = request.query_params.get('fecha', timezone.localdate().isoformat())
 		try:
 			fecha = date.fromisoformat(fecha_str)
 		except ValueError:
@@ -112,16 +419,19 @@ class TareaViewSet(viewsets.ModelViewSet):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		tareas_usuario = list(self.get_queryset())
-		mapas = self._mapas_estados(tareas_usuario, fecha, fecha)
-		instancias = self._generar_payload_ocurrencias(tareas_usuario, fecha, fecha, mapas)
+		_, instancias = self._instancias_en_ventana(fecha, fecha)
 
 		return Response(instancias)
 
-	@action(detail=False, methods=['get'], url_path='ocurrencias_rango')
+	@action(
+		detail=False,
+		methods=['get'],
+		url_path='ocurrencias_rango',
+		renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer],
+	)
 	def ocurrencias_rango(self, request):
-		fecha_inicio_str = request.query_params.get('fecha_inicio', date.today().isoformat())
-		fecha_fin_str = request.query_params.get('fecha_fin', date.today().isoformat())
+		fecha_inicio_str = request.query_params.get('fecha_inicio', timezone.localdate().isoformat())
+		fecha_fin_str = request.query_params.get('fecha_fin', timezone.localdate().isoformat())
 
 		try:
 			fecha_inicio = date.fromisoformat(fecha_inicio_str)
@@ -138,21 +448,21 @@ class TareaViewSet(viewsets.ModelViewSet):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		tareas_usuario = list(self.get_queryset())
-		mapas = self._mapas_estados(tareas_usuario, fecha_inicio, fecha_fin)
-		instancias = self._generar_payload_ocurrencias(
-			tareas_usuario, fecha_inicio, fecha_fin, mapas
-		)
+		if request.query_params.get('formato') == 'ndjson' or request.accepted_renderer.format == 'ndjson':
+			return StreamingHttpResponse(
+				self._lineas_ndjson(fecha_inicio, fecha_fin),
+				content_type=NDJSONRenderer.media_type,
+			)
+
+		instancias, _ = self._ocurrencias_por_teselas(fecha_inicio, fecha_fin)
 
 		instancias.sort(key=lambda item: (item['fecha_instancia'], item['tarea_id']))
 		return Response(instancias)
 
 	@action(detail=False, methods=['get'], url_path='ocurrencias_hoy')
 	def ocurrencias_hoy(self, request):
-		hoy = date.today()
-		tareas_usuario = list(self.get_queryset())
-		mapas = self._mapas_estados(tareas_usuario, hoy, hoy)
-		instancias = self._generar_payload_ocurrencias(tareas_usuario, hoy, hoy, mapas)
+		hoy = timezone.localdate()
+		_, instancias = self._instancias_en_ventana(hoy, hoy)
 
 		pendientes = [
 			instancia
@@ -186,6 +496,7 @@ class TareaViewSet(viewsets.ModelViewSet):
 
 		try:
 			tarea = self.get_queryset().get(id_tarea=tarea_id)
+			contar('tareas')
 		except Tarea.DoesNotExist:
 			return Response(
 				{'error': 'Tarea no encontrada'},
@@ -198,38 +509,313 @@ class TareaViewSet(viewsets.ModelViewSet):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		if nuevo_estado not in {'pendiente', 'en_proceso', 'completada'}:
+		if nuevo_estado not in ESTADOS_OCURRENCIA:
 			return Response(
 				{'error': 'Estado inválido'},
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		TareaCompletada.objects.filter(tarea=tarea, fecha=fecha).delete()
-		TareaEnProceso.objects.filter(tarea=tarea, fecha=fecha).delete()
-
-		if nuevo_estado == 'completada':
-			TareaCompletada.objects.create(tarea=tarea, fecha=fecha, notas=notas or None)
-			if tarea.repeticion == 'ninguna':
-				tarea.estado = 'completada'
-				tarea.save(update_fields=['estado'])
-		elif nuevo_estado == 'en_proceso':
-			TareaEnProceso.objects.create(tarea=tarea, fecha=fecha, notas=notas or None)
-			if tarea.repeticion == 'ninguna':
-				tarea.estado = 'en_proceso'
-				tarea.save(update_fields=['estado'])
-		else:
-			if tarea.repeticion == 'ninguna':
-				tarea.estado = 'pendiente'
-				tarea.save(update_fields=['estado'])
+		fila = aplicar_estado(tarea, fecha, nuevo_estado, notas)
+		if tarea.repeticion == 'ninguna':
+			tarea.estado = nuevo_estado
+			tarea.save(update_fields=['estado', 'actualizado_en'])
 
-		mapas = self._mapas_estados([tarea], fecha, fecha)
-		ocurrencia = self._generar_payload_ocurrencias([tarea], fecha, fecha, mapas)
-		respuesta = ocurrencia[0] if ocurrencia else {}
+		actualizar_proxima_ocurrencia(tarea)
+
+		respuesta = self._payload_ocurrencia(
+			tarea,
+			fecha,
+			fila if nuevo_estado == 'completada' else None,
+			fila if nuevo_estado == 'en_proceso' else None,
+		)
 
 		return Response(
 			{'mensaje': 'Estado de ocurrencia actualizado', 'ocurrencia': respuesta}
 		)
 
+	@action(detail=False, methods=['post'], url_path='actualizar_ocurrencias_lote')
+	def actualizar_ocurrencias_lote(self, request):
+		"""Aplica varios cambios de estado de ocurrencias en una sola petición.
+
+		Espera ``{"cambios": [{"tarea_id", "fecha", "estado", "notas"?}, ...]}``.
+		Los cambios válidos se aplican juntos en una transacción; los inválidos
+		se devuelven en ``errores`` con su índice sin bloquear al resto.
+		"""
+		cambios = request.data.get('cambios')
+		if not isinstance(cambios, list) or not cambios:
+			return Response(
+				{'error': 'Se requiere una lista no vacía en cambios'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		if len(cambios) > MAX_CAMBIOS_LOTE:
+			return Response(
+				{'error': f'Se admiten como máximo {MAX_CAMBIOS_LOTE} cambios por petición'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		errores = []
+		validos = []
+		for indice, cambio in enumerate(cambios):
+			if not isinstance(cambio, dict):
+				errores.append({'indice': indice, 'error': 'Cada cambio debe ser un objeto'})
+				continue
+			if not cambio.get('tarea_id') or not cambio.get('fecha') or not cambio.get('estado'):
+				errores.append({'indice': indice, 'error': 'Se requieren tarea_id, fecha y estado'})
+				continue
+			try:
+				fecha = date.fromisoformat(str(cambio['fecha']))
+				tarea_id = int(cambio['tarea_id'])
+			except (TypeError, ValueError):
+				errores.append({'indice': indice, 'error': 'Formato de fecha o tarea_id inválido'})
+				continue
+			if cambio['estado'] not in ESTADOS_OCURRENCIA:
+				errores.append({'indice': indice, 'error': 'Estado inválido'})
+				continue
+			validos.append((indice, tarea_id, fecha, cambio['estado'], cambio.get('notas', '')))
+
+		tareas = self.get_queryset().in_bulk({tarea_id for _, tarea_id, _, _, _ in validos})
+		contar('tareas', len(tareas))
+
+		aplicables = []
+		for indice, tarea_id, fecha, estado, notas in validos:
+			tarea = tareas.get(tarea_id)
+			if tarea is None:
+				errores.append({'indice': indice, 'error': 'Tarea no encontrada'})
+			elif not fecha_corresponde_a_tarea(tarea, fecha):
+				errores.append(
+					{'indice': indice, 'error': 'La fecha no corresponde a la recurrencia de la tarea.'}
+				)
+			else:
+				aplicables.append((tarea, fecha, estado, notas))
+
+		ocurrencias = []
+		if aplicables:
+			with transaction.atomic():
+				filas = aplicar_estados(aplicables)
+
+				ahora = timezone.now()
+				unicas = {}
+				for tarea, _, estado, _ in aplicables:
+					if tarea.repeticion == 'ninguna':
+						tarea.estado = estado
+						tarea.actualizado_en = ahora
+						unicas[tarea.pk] = tarea
+				Tarea.objects.bulk_update(unicas.values(), ['estado', 'actualizado_en'])
+
+				actualizar_proximas_ocurrencias(list({t.pk: t for t, _, _, _ in aplicables}.values()))
+
+			for (tarea_id, fecha), fila in filas.items():
+				ocurrencias.append(
+					self._payload_ocurrencia(
+						tareas[tarea_id],
+						fecha,
+						fila if fila and fila.estado == 'completada' else None,
+						fila if fila and fila.estado == 'en_proceso' else None,
+					)
+				)
+
+		errores.sort(key=lambda item: item['indice'])
+		return Response({'ocurrencias': ocurrencias, 'errores': errores})
+
+	def _instancias_en_ventana(
+		self, fecha_inicio: date, fecha_fin: date
+	) -> Tuple[List[Tarea], List[Dict]]:
+		"""Ocurrencias de la ventana para el usuario actual.
+
+		Las tareas materializadas en toda la ventana se leen con un recorrido
+		por rango sobre ``tareas_ocurrencias``; el resto se poda en SQL con
+		``en_ventana`` y se expande en vivo.
+		"""
+		materializadas, en_vivo = self._consultas_ventana(fecha_inicio, fecha_fin)
+		materializadas = list(materializadas)
+		en_vivo = list(en_vivo)
+
+		tareas = self._tareas_de_ventana(materializadas, en_vivo)
+		mapas = self._mapas_estados(tareas, fecha_inicio, fecha_fin)
+		return tareas, self._armar_instancias(materializadas, en_vivo, fecha_inicio, fecha_fin, mapas)
+
+	def _consultas_ventana(self, fecha_inicio: date, fecha_fin: date):
+		"""Ocurrencias materializadas y tareas a expandir en vivo, sin evaluar."""
+		materializadas = (
+			TareaOcurrencia.objects.filter(
+				creado_por=self.request.user,
+				fecha__gte=fecha_inicio,
+				fecha__lte=fecha_fin,
+				tarea__activa=True,
+				tarea__materializada_desde__lte=fecha_inicio,
+				tarea__materializada_hasta__gte=fecha_fin,
+			)
+			.select_related('tarea')
+			.order_by('fecha', '-tarea__fecha_creacion')
+		)
+		en_vivo = (
+			self.get_queryset()
+			.en_ventana(fecha_inicio, fecha_fin)
+			.exclude(materializada_desde__lte=fecha_inicio, materializada_hasta__gte=fecha_fin)
+		)
+		return materializadas, en_vivo
+
+	def _estados_de_usuario(self, fecha_inicio: date, fecha_fin: date):
+		"""Estados de la ventana filtrados por usuario: no dependen de las tareas leídas."""
+		return archivo.estados(
+			Q(tarea__creado_por=self.request.user, tarea__activa=True), fecha_inicio, fecha_fin
+		)
+
+	def _compactas_de_usuario(self, fecha_inicio: date, fecha_fin: date):
+		"""Mapas de completadas compactas de la ventana, como ``_estados_de_usuario``.
+
+		Sin ``TAREAS_COMPLETADAS_COMPACTAS`` es una consulta vacía que no llega
+		a la base de datos.
+		"""
+		consulta = compactas.mapas_en(
+			Q(tarea__creado_por=self.request.user, tarea__activa=True), fecha_inicio, fecha_fin
+		)
+		return consulta if compactas.habilitadas() else consulta.none()
+
+	@staticmethod
+	def _tareas_de_ventana(materializadas: List[TareaOcurrencia], en_vivo: List[Tarea]) -> List[Tarea]:
+		tareas = {ocurrencia.tarea_id: ocurrencia.tarea for ocurrencia in materializadas}
+		tareas.update((tarea.id_tarea, tarea) for tarea in en_vivo)
+		contar('tareas', len(tareas))
+		return list(tareas.values())
+
+	def _armar_instancias(
+		self,
+		materializadas: List[TareaOcurrencia],
+		en_vivo: List[Tarea],
+		fecha_inicio: date,
+		fecha_fin: date,
+		mapas: Dict[str, Dict],
+	) -> List[Dict]:
+		instancias = [
+			self._serializar_ocurrencia(ocurrencia.tarea, ocurrencia.fecha, mapas)
+			for ocurrencia in materializadas
+		]
+		instancias.extend(
+			self._generar_payload_ocurrencias(en_vivo, fecha_inicio, fecha_fin, mapas)
+		)
+		return instancias
+
+	def _ocurrencias_por_teselas(
+		self, fecha_inicio: date, fecha_fin: date
+	) -> Tuple[List[Dict], List[Dict]]:
+		"""Instancias y tareas sin repetición serializadas de la ventana, armadas con teselas mensuales.
+
+		Los meses que faltan en caché se calculan por tramos consecutivos con
+		una sola expansión cada uno.  Fuera de la ventana cacheable se calcula
+		directamente.
+		"""
+		if fecha_fin < fecha_inicio:
+			return [], []
+
+		meses = teselas.meses_cacheables(fecha_inicio, fecha_fin)
+		if meses is None:
+			return self._ocurrencias_sin_teselas(fecha_inicio, fecha_fin)
+
+		usuario_id = self.request.user.pk
+		guardadas = teselas.leer(usuario_id, meses)
+		faltantes = [mes for mes in meses if mes not in guardadas]
+		if faltantes:
+			nuevas = {}
+			for inicio_tramo, fin_tramo in teselas.tramos(faltantes):
+				nuevas.update(
+					teselas.repartir(
+						inicio_tramo,
+						fin_tramo,
+						*self._ocurrencias_sin_teselas(inicio_tramo, fin_tramo),
+					)
+				)
+			guardadas.update(nuevas)
+			# Si hubo una escritura mientras se calculaba, no se guarda nada
+			if self.version_datos is not None and obtener_version(usuario_id) == self.version_datos:
+				teselas.guardar(usuario_id, nuevas)
+
+		return self._recortar_teselas(meses, guardadas, fecha_inicio, fecha_fin)
+
+	@staticmethod
+	def _recortar_teselas(
+		meses: List[date], guardadas: Dict[date, Dict], fecha_inicio: date, fecha_fin: date
+	) -> Tuple[List[Dict], List[Dict]]:
+		desde, hasta = fecha_inicio.isoformat(), fecha_fin.isoformat()
+		instancias = [
+			instancia
+			for mes in meses
+			for instancia in guardadas[mes]['instancias']
+			if desde <= instancia['fecha_instancia'] <= hasta
+		]
+		tareas_normales = [
+			tarea
+			for mes in meses
+			for tarea in guardadas[mes]['tareas_normales']
+			if desde <= tarea['fecha_entrega'] <= hasta
+		]
+		return instancias, tareas_normales
+
+	def _ocurrencias_sin_teselas(
+		self, fecha_inicio: date, fecha_fin: date
+	) -> Tuple[List[Dict], List[Dict]]:
+		tareas, instancias = self._instancias_en_ventana(fecha_inicio, fecha_fin)
+		return instancias, self._serializar_tareas_normales(tareas, fecha_inicio, fecha_fin)
+
+	@staticmethod
+	def _serializar_tareas_normales(tareas: List[Tarea], fecha_inicio: date, fecha_fin: date) -> List[Dict]:
+		tareas_normales = [
+			tarea
+			for tarea in tareas
+			if tarea.repeticion == 'ninguna'
+			and tarea.fecha_entrega
+			and fecha_inicio <= tarea.fecha_entrega <= fecha_fin
+		]
+		return list(TareaSerializer(tareas_normales, many=True).data)
+
+	def _lineas_ndjson(self, fecha_inicio: date, fecha_fin: date) -> Iterator[bytes]:
+		"""Ocurrencias de la ventana como NDJSON, ya en orden ``(fecha, tarea_id)``.
+
+		Las ocurrencias salen de la mezcla perezosa de las expansiones de cada
+		tarea y los estados de un cursor ordenado igual, así que se cruzan
+		avanzando ambos a la vez.  Solo las tareas del usuario quedan en
+		memoria.  Cada tarea aporta como mucho ``MAX_OCCURRENCIAS_SEGURIDAD``
+		ocurrencias, igual que en la respuesta JSON.
+		"""
+		tareas = list(self.get_queryset().en_ventana(fecha_inicio, fecha_fin).order_by())
+		contar('tareas', len(tareas))
+		estados = (
+			self._estados_de_usuario(fecha_inicio, fecha_fin)
+			.order_by('fecha', 'tarea_id')
+			.iterator(chunk_size=TAMANO_BLOQUE_NDJSON)
+		)
+		if compactas.habilitadas():
+			estados = heapq.merge(
+				estados,
+				compactas.como_estados(self._compactas_de_usuario(fecha_inicio, fecha_fin), fecha_inicio, fecha_fin),
+				key=lambda item: (item.fecha, item.tarea_id),
+			)
+		estado = next(estados, None)
+		codificar = json.JSONEncoder(ensure_ascii=False).encode
+
+		bloque = []
+		for fecha, tarea in iterar_ocurrencias_ordenadas(
+			tareas, fecha_inicio, fecha_fin, MAX_OCCURRENCIAS_SEGURIDAD
+		):
+			clave = (fecha, tarea.id_tarea)
+			while estado is not None and (estado.fecha, estado.tarea_id) < clave:
+				estado = next(estados, None)
+
+			completada = en_proceso = None
+			if estado is not None and (estado.fecha, estado.tarea_id) == clave:
+				if estado.estado == 'completada':
+					completada = estado
+				else:
+					en_proceso = estado
+
+			bloque.append(codificar(self._payload_ocurrencia(tarea, fecha, completada, en_proceso)))
+			if len(bloque) >= TAMANO_BLOQUE_NDJSON:
+				yield ('\n'.join(bloque) + '\n').encode()
+				bloque = []
+
+		if bloque:
+			yield ('\n'.join(bloque) + '\n').encode()
+
 	def _mapas_estados(
 		self, tareas: List[Tarea], fecha_inicio: date, fecha_fin: date
 	) -> Dict[str, Dict]:
@@ -238,20 +824,25 @@ class TareaViewSet(viewsets.ModelViewSet):
 
 		ids = [t.id_tarea for t in tareas]
 
-		completadas = {
-			(item.tarea_id, item.fecha): item
-			for item in TareaCompletada.objects.filter(
-				tarea_id__in=ids, fecha__gte=fecha_inicio, fecha__lte=fecha_fin
-			)
-		}
-		en_proceso = {
-			(item.tarea_id, item.fecha): item
-			for item in TareaEnProceso.objects.filter(
-				tarea_id__in=ids, fecha__gte=fecha_inicio, fecha__lte=fecha_fin
+		# Un solo recorrido de tareas_ocurrencia_estado (más el archivo si la
+		# ventana empieza antes del corte); se reparte en los dos mapas que
+		# esperan los payloads
+		mapas = self._repartir_estados(
+			archivo.estados(Q(tarea_id__in=ids), fecha_inicio, fecha_fin)
+		)
+		if compactas.habilitadas():
+			compactas.completar_mapas(
+				mapas, compactas.mapas_en(Q(tarea_id__in=ids), fecha_inicio, fecha_fin), fecha_inicio, fecha_fin
 			)
-		}
+		return mapas
 
-		return {'completadas': completadas, 'en_proceso': en_proceso}
+	@staticmethod
+	def _repartir_estados(estados: Iterable[OcurrenciaEstado]) -> Dict[str, Dict]:
+		mapas = {'completadas': {}, 'en_proceso': {}}
+		destino = {'completada': mapas['completadas'], 'en_proceso': mapas['en_proceso']}
+		for item in estados:
+			destino[item.estado][(item.tarea_id, item.fecha)] = item
+		return mapas
 
 	def _generar_payload_ocurrencias(
 		self,
@@ -259,6 +850,27 @@ class TareaViewSet(viewsets.ModelViewSet):
 		fecha_inicio: date,
 		fecha_fin: date,
 		mapas_estados: Dict[str, Dict],
+	) -> List[Dict]:
+		tareas = list(tareas)
+		if lote_disponible() and len(tareas) >= UMBRAL_TAREAS_LOTE:
+			instancias = [
+				self._payload_ocurrencia(tarea, fecha, completada, en_proceso, fecha_iso)
+				for tarea, fecha, fecha_iso, completada, en_proceso in ocurrencias_con_estados(
+					tareas, fecha_inicio, fecha_fin, mapas_estados
+				)
+			]
+		else:
+			instancias = self._generar_payload_por_tarea(tareas, fecha_inicio, fecha_fin, mapas_estados)
+
+		contar('ocurrencias', len(instancias))
+		return instancias
+
+	def _generar_payload_por_tarea(
+		self,
+		tareas: Iterable[Tarea],
+		fecha_inicio: date,
+		fecha_fin: date,
+		mapas_estados: Dict[str, Dict],
 	) -> List[Dict]:
 		instancias: List[Dict] = []
 
@@ -277,7 +889,12 @@ class TareaViewSet(viewsets.ModelViewSet):
 			if not es_tarea_recurrente(tarea):
 				continue
 
-			for fecha in generar_ocurrencias_en_rango(tarea, fecha_inicio, fecha_fin):
+			fechas = generar_ocurrencias_en_rango(tarea, fecha_inicio, fecha_fin)
+			if len(fechas) >= MAX_OCCURRENCIAS_SEGURIDAD and next(
+				iterar_ocurrencias(tarea, fechas[-1] + timedelta(days=1), fecha_fin), None
+			):
+				contar('cortes')
+			for fecha in fechas:
 				instancias.append(
 					self._serializar_ocurrencia(tarea, fecha, mapas_estados)
 				)
@@ -288,32 +905,41 @@ class TareaViewSet(viewsets.ModelViewSet):
 		self, tarea: Tarea, fecha: date, mapas_estados: Dict[str, Dict]
 	) -> Dict:
 		key = (tarea.id_tarea, fecha)
-		completada = mapas_estados['completadas'].get(key)
-		en_proceso = mapas_estados['en_proceso'].get(key)
+		return self._payload_ocurrencia(
+			tarea,
+			fecha,
+			mapas_estados['completadas'].get(key),
+			mapas_estados['en_proceso'].get(key),
+		)
 
+	def _payload_ocurrencia(
+		self, tarea: Tarea, fecha: date, completada, en_proceso, fecha_iso: str = None
+	) -> Dict:
+		fecha_iso = fecha_iso or fecha.isoformat()
 		estado = 'pendiente'
 		marca_tiempo = None
 		notas = None
 
 		if completada:
 			estado = 'completada'
-			marca_tiempo = completada.completada_en.isoformat()
+			# Las completadas compactas no guardan el instante
+			marca_tiempo = completada.marcada_en.isoformat() if completada.marcada_en else None
 			notas = completada.notas
 		elif en_proceso:
 			estado = 'en_proceso'
-			marca_tiempo = en_proceso.iniciada_en.isoformat()
+			marca_tiempo = en_proceso.marcada_en.isoformat()
 			notas = en_proceso.notas
 		elif tarea.repeticion == 'ninguna':
 			estado = tarea.estado
 
 		return {
-			'id_instancia': f"{tarea.id_tarea}-{fecha.isoformat()}",
+			'id_instancia': f"{tarea.id_tarea}-{fecha_iso}",
 			'tarea_id': tarea.id_tarea,
 			'tarea_titulo': tarea.titulo,
 			'tarea_descripcion': tarea.descripcion,
 			'tarea_categoria': tarea.categoria,
 			'tarea_repeticion': tarea.repeticion,
-			'fecha_instancia': fecha.isoformat(),
+			'fecha_instancia': fecha_iso,
 			'estado': estado,
 			'completada_en': marca_tiempo,
 			'notas': notas,
@@ -0,0 +1,221 @@
+"""Versiones asíncronas de ``calendario``, ``ocurrencias_rango`` y ``estadisticas``.
+
+Solo se enrutan bajo ASGI (``tarea_api.urls_asgi``).  Las ocurrencias
+materializadas, las tareas a expandir en vivo y los estados de la ventana se
+leen a la vez; la expansión y los payloads reutilizan los métodos de
+``TareaViewSet``, así que las respuestas (y sus ETag) son las mismas que bajo
+WSGI.  Lo que se sale del camino rápido (sin credenciales, parámetros
+inválidos, NDJSON, API navegable, perfilado...) lo atiende la vista síncrona.
+"""
+import asyncio
+from datetime import date, datetime
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+from . import compactas, perfilado, teselas
+from .cache import aguardar_estadisticas, aobtener_estadisticas
+from .versiones import aobtener_version
+from .views import TareaViewSet
+
+
+def consultas_paralelas() -> bool:
+	"""Si las consultas de una petición se lanzan en hilos (y conexiones) distintos.
+
+	Con SQLite no aporta nada y el hilo aparte no vería la transacción de los
+	tests, así que por defecto solo se activa con otros motores.
+	"""
+	configurado = getattr(settings, 'TAREAS_CONSULTAS_PARALELAS', None)
+	if configurado is not None:
+		return configurado
+	return connection.vendor != 'sqlite'
+
+
+def _evaluar(queryset) -> list:
+	try:
+		return list(queryset)
+	finally:
+		# Fuera del ciclo de la petición nadie cierra la conexión de este hilo
+		close_old_connections()
+
+
+async def _lista(queryset) -> list:
+	if consultas_paralelas():
+		return await sync_to_async(_evaluar, thread_sensitive=False)(queryset)
+	return [fila async for fila in queryset]
+
+
+async def _autenticar(request):
+	for clase in TareaViewSet.authentication_classes:
+		try:
+			resultado = await sync_to_async(clase().authenticate)(request)
+		except AuthenticationFailed:
+			return None
+		if resultado is not None:
+			return resultado[0]
+	return None
+
+
+def _camino_rapido(request) -> bool:
+	aceptados = request.headers.get('Accept', '')
+	return (
+		request.method == 'GET'
+		and 'format' not in request.GET
+		and 'formato' not in request.GET
+		and 'text/html' not in aceptados
+		and 'ndjson' not in aceptados
+		and not perfilado.solicitado(request)
+	)
+
+
+def _con_cabeceras(respuesta: HttpResponse, valor_etag: str) -> HttpResponse:
+	respuesta['ETag'] = valor_etag
+	patch_cache_control(respuesta, private=True, no_cache=True)
+	patch_vary_headers(respuesta, ['Accept'])
+	return respuesta
+
+
+def vista_async(accion: str):
+	"""Convierte ``calcular(vista, request)`` en una vista ASGI de ``accion``.
+
+	Autentica, responde 304 con el mismo ETag que la vista síncrona y
+	serializa con ``JSONRenderer``.  Si ``calcular`` devuelve ``None`` la
+	petición pasa a la vista síncrona.
+	"""
+	vista_sincrona = sync_to_async(TareaViewSet.as_view({'get': accion}))
+
+	def decorador(calcular):
+		@wraps(calcular)
+		async def envoltura(request):
+			usuario = await _autenticar(request) if _camino_rapido(request) else None
+			if usuario is None:
+				return await vista_sincrona(request)
+
+			request.user = usuario
+			vista = TareaViewSet(request=request, action=accion, format_kwarg=None, args=(), kwargs={})
+			vista.usuario_datos = usuario.pk
+			vista.version_datos = await aobtener_version(usuario.pk)
+			vista.etag = vista._etag_lectura(request.GET, JSONRenderer.format)
+
+			enviados = parse_etags(request.headers.get('If-None-Match', ''))
+			if '*' in enviados or vista.etag in enviados:
+				return _con_cabeceras(HttpResponseNotModified(), vista.etag)
+
+			datos = await calcular(vista, request)
+			if datos is None:
+				return await vista_sincrona(request)
+			return _con_cabeceras(
+				HttpResponse(JSONRenderer().render(datos), content_type='application/json'),
+				vista.etag,
+			)
+
+		return envoltura
+
+	return decorador
+
+
+def _ventana(request, por_defecto: Optional[str] = None) -> Optional[Tuple[date, date]]:
+	try:
+		fecha_inicio = date.fromisoformat(request.GET.get('fecha_inicio', por_defecto))
+		fecha_fin = date.fromisoformat(request.GET.get('fecha_fin', por_defecto))
+	except (TypeError, ValueError):
+		return None
+	if fecha_fin < fecha_inicio:
+		return None
+	return fecha_inicio, fecha_fin
+
+
+async def _ocurrencias_sin_teselas(
+	vista: TareaViewSet, fecha_inicio: date, fecha_fin: date
+) -> Tuple[List[Dict], List[Dict]]:
+	materializadas, en_vivo = vista._consultas_ventana(fecha_inicio, fecha_fin)
+	materializadas, en_vivo, estados, mapas_bits = await asyncio.gather(
+		_lista(materializadas),
+		_lista(en_vivo),
+		_lista(vista._estados_de_usuario(fecha_inicio, fecha_fin)),
+		_lista(vista._compactas_de_usuario(fecha_inicio, fecha_fin)),
+	)
+
+	tareas = vista._tareas_de_ventana(materializadas, en_vivo)
+	mapas = compactas.completar_mapas(
+		vista._repartir_estados(estados), mapas_bits, fecha_inicio, fecha_fin
+	)
+	instancias = vista._armar_instancias(materializadas, en_vivo, fecha_inicio, fecha_fin, mapas)
+	return instancias, vista._serializar_tareas_normales(tareas, fecha_inicio, fecha_fin)
+
+
+async def _ocurrencias_por_teselas(
+	vista: TareaViewSet, fecha_inicio: date, fecha_fin: date
+) -> Tuple[List[Dict], List[Dict]]:
+	"""Igual que ``TareaViewSet._ocurrencias_por_teselas``; los tramos que faltan se calculan a la vez."""
+	meses = teselas.meses_cacheables(fecha_inicio, fecha_fin)
+	if meses is None:
+		return await _ocurrencias_sin_teselas(vista, fecha_inicio, fecha_fin)
+
+	usuario_id = vista.usuario_datos
+	guardadas = await sync_to_async(teselas.leer)(usuario_id, meses)
+	faltantes = teselas.tramos(mes for mes in meses if mes not in guardadas)
+	if faltantes:
+		calculados = await asyncio.gather(
+			*(_ocurrencias_sin_teselas(vista, inicio, fin) for inicio, fin in faltantes)
+		)
+		nuevas = {}
+		for (inicio, fin), resultado in zip(faltantes, calculados):
+			nuevas.update(teselas.repartir(inicio, fin, *resultado))
+		guardadas.update(nuevas)
+		# Si hubo una escritura mientras se calculaba, no se guarda nada
+		if await aobtener_version(usuario_id) == vista.version_datos:
+			await sync_to_async(teselas.guardar)(usuario_id, nuevas)
+
+	return vista._recortar_teselas(meses, guardadas, fecha_inicio, fecha_fin)
+
+
+@vista_async('calendario')
+async def calendario(vista, request):
+	if 'fecha_inicio' not in request.GET or 'fecha_fin' not in request.GET:
+		return None
+	ventana = _ventana(request)
+	if ventana is None:
+		return None
+
+	instancias, tareas_normales = await _ocurrencias_por_teselas(vista, *ventana)
+	tareas_normales.sort(
+		key=lambda tarea: datetime.fromisoformat(tarea['fecha_creacion']), reverse=True
+	)
+	instancias.sort(key=lambda item: (item['fecha_instancia'], item['tarea_id']))
+	return {
+		'instancias_recurrentes': instancias,
+		'tareas_normales': tareas_normales,
+	}
+
+
+@vista_async('ocurrencias_rango')
+async def ocurrencias_rango(vista, request):
+	ventana = _ventana(request, timezone.localdate().isoformat())
+	if ventana is None:
+		return None
+
+	instancias, _ = await _ocurrencias_por_teselas(vista, *ventana)
+	instancias.sort(key=lambda item: (item['fecha_instancia'], item['tarea_id']))
+	return instancias
+
+
+@vista_async('estadisticas')
+async def estadisticas(vista, request):
+	hoy = timezone.localdate()
+	usuario_id = vista.usuario_datos
+	datos = await aobtener_estadisticas(usuario_id, vista.version_datos, hoy)
+	if datos is None:
+		consulta, agregados = vista._consulta_estadisticas(hoy)
+		datos = vista._resumir_estadisticas(await consulta.aaggregate(**agregados))
+		await aguardar_estadisticas(usuario_id, vista.version_datos, hoy, datos)
+	return datos
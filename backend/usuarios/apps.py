@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class UsuariosConfig(AppConfig):
+    name = 'usuarios'
+
+    def ready(self):
+        from . import signals  # noqa: F401
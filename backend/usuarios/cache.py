@@ -0,0 +1,90 @@
+"""Cachés en memoria del proceso para el camino de autenticación.
+
+- Usuarios por id, con su rol, durante ``USUARIOS_CACHE_AUTENTICACION_SEGUNDOS``.
+  Las señales los invalidan al guardar un ``Usuario`` o un ``Rol`` en este
+  proceso; en los demás workers caducan con el TTL, por eso es corto.
+- Roles por nombre, para todo el proceso: casi nunca cambian y las altas de
+  usuarios los piden siempre.
+
+Solo se guardan filas confirmadas (``transaction.on_commit``): un rol o un
+usuario creado en una transacción que luego se deshace no queda en caché.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from django.conf import settings
+from django.db import transaction
+from tarea_api.instrumentacion import contar_cache
+
+from .models import Rol, Usuario
+
+
+_cerrojo = threading.Lock()
+_usuarios: 'OrderedDict[str, tuple]' = OrderedDict()
+_roles: Dict[str, Rol] = {}
+# Cambia con cada invalidación: una lectura que empezó antes no se guarda
+_generacion = 0
+
+
+def _segundos() -> float:
+    return getattr(settings, 'USUARIOS_CACHE_AUTENTICACION_SEGUNDOS', 30)
+
+
+def _guardar_usuario(usuario: Usuario, generacion: int) -> None:
+    with _cerrojo:
+        if generacion != _generacion:
+            return
+        _usuarios[str(usuario.pk)] = (time.monotonic() + _segundos(), usuario)
+        _usuarios.move_to_end(str(usuario.pk))
+        while len(_usuarios) > getattr(settings, 'USUARIOS_CACHE_AUTENTICACION_MAX', 10000):
+            _usuarios.popitem(last=False)
+
+
+def obtener_usuario(usuario_id: int) -> Usuario:
+    """Usuario con su rol; lanza ``Usuario.DoesNotExist`` si no existe.
+
+    Devuelve una copia: cada petición puede modificar la suya sin afectar a
+    las demás.
+    """
+    with _cerrojo:
+        # El claim del token puede venir como texto
+        entrada = _usuarios.get(str(usuario_id))
+        generacion = _generacion
+    if entrada is not None and entrada[0] > time.monotonic():
+        contar_cache('usuarios', 1)
+        return copy.copy(entrada[1])
+
+    contar_cache('usuarios', 0, 1)
+    usuario = Usuario.objects.select_related('rol').get(pk=usuario_id)
+    if _segundos() > 0:
+        transaction.on_commit(lambda: _guardar_usuario(usuario, generacion))
+    return copy.copy(usuario)
+
+
+def invalidar_usuario(usuario_id: int) -> None:
+    global _generacion
+    with _cerrojo:
+        _generacion += 1
+        _usuarios.pop(str(usuario_id), None)
+
+
+def obtener_rol(nombre: str) -> Rol:
+    rol = _roles.get(nombre)
+    if rol is not None:
+        return rol
+
+    rol, _ = Rol.objects.get_or_create(nombre=nombre)
+    transaction.on_commit(lambda: _roles.setdefault(nombre, rol))
+    return rol
+
+
+def limpiar() -> None:
+    """Vacía ambas cachés (cambios de roles y tests)."""
+    global _generacion
+    with _cerrojo:
+        _generacion += 1
+        _usuarios.clear()
+        _roles.clear()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='ical_secreto',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
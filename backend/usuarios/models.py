@@ -2,8 +2,17 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
 
+class RolManager(models.Manager):
+    def por_nombre(self, nombre):
+        """Rol con ese nombre, creándolo si no existe; se cachea para todo el proceso."""
+        from .cache import obtener_rol
+
+        return obtener_rol(nombre)
+
 class Rol(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
+
+    objects = RolManager()
     
     class Meta:
         db_table = 'roles'
@@ -12,6 +21,10 @@ class Rol(models.Model):
         return self.nombre
 
 class UsuarioManager(BaseUserManager):
+    def get_by_natural_key(self, username):
+        # El login devuelve el rol en el token y en la respuesta
+        return self.select_related('rol').get(**{self.model.USERNAME_FIELD: username})
+
     def create_user(self, email, nombre=None, password=None, **extra_fields):
         if not email:
             raise ValueError('El email debe ser proporcionado')
@@ -19,8 +32,7 @@ class UsuarioManager(BaseUserManager):
         
         # Asignar rol 'usuario' por defecto si no se especifica
         if 'rol' not in extra_fields:
-            rol_usuario, _ = Rol.objects.get_or_create(nombre='usuario')
-            extra_fields['rol'] = rol_usuario
+            extra_fields['rol'] = Rol.objects.por_nombre('usuario')
             
         user = self.model(email=email, nombre=nombre, **extra_fields)
         user.set_password(password)
@@ -32,8 +44,7 @@ class UsuarioManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', True)
         
         # Asignar rol 'admin' a superusuarios
-        rol_admin, _ = Rol.objects.get_or_create(nombre='admin')
-        extra_fields['rol'] = rol_admin
+        extra_fields['rol'] = Rol.objects.por_nombre('admin')
         
         if extra_fields.get('is_staff') is not True:
             raise ValueError('Superuser debe tener is_staff=True')
@@ -50,6 +61,8 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     # campos necesarios por Django admin
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # Secreto del token del feed iCalendar; cambiarlo revoca los enlaces emitidos
+    ical_secreto = models.CharField(max_length=32, blank=True, default='')
 
     objects = UsuarioManager()
 
@@ -14,8 +14,7 @@ class RegistroSerializer(serializers.ModelSerializer):
         password = validated_data.pop('password')
         
         # Asignar rol 'usuario' por defecto
-        rol_usuario, _ = Rol.objects.get_or_create(nombre='usuario')
-        validated_data['rol'] = rol_usuario
+        validated_data['rol'] = Rol.objects.por_nombre('usuario')
         
         user = Usuario(**validated_data)
         user.set_password(password)
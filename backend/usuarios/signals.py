@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Rol, Usuario
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_cacheado(sender, instance, **kwargs):
+    cache.invalidar_usuario(instance.pk)
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+def invalidar_roles_cacheados(sender, instance, **kwargs):
+    # Los usuarios cacheados llevan su rol cargado
+    cache.limpiar()
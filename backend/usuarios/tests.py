@@ -1,5 +1,11 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache as cache_usuarios
+from .models import Rol
 
 class UsuarioTestCase(TestCase):
     def test_crear_usuario(self):
@@ -10,3 +16,65 @@ class UsuarioTestCase(TestCase):
             password="1234",
         )
         self.assertEqual(usuario.email, "prueba@example.com")
+
+
+class AutenticacionCacheadaTestCase(APITestCase):
+    def setUp(self):
+        cache_usuarios.limpiar()
+        self.addCleanup(cache_usuarios.limpiar)
+        self.usuario = get_user_model().objects.create_user(
+            email="cache@example.com",
+            nombre="Cache",
+            password="testpass123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuario)}')
+
+    def _perfil(self):
+        # Las cachés solo guardan filas confirmadas: se ejecutan los on_commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get('/api/usuarios/me/')
+
+    def test_get_autenticado_sin_consultas_con_cache_caliente(self):
+        """Test para verificar que con la caché caliente autenticar no consulta la base de datos"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self._perfil().status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            respuesta = self._perfil()
+        self.assertEqual(respuesta.data['rol'], 'usuario')
+
+    def test_guardar_usuario_invalida(self):
+        """Test para verificar que guardar el usuario o un rol invalida la caché"""
+        self._perfil()
+
+        self.usuario.nombre = "Renombrado"
+        self.usuario.save()
+        self.assertEqual(self._perfil().data['nombre'], "Renombrado")
+
+        rol = self.usuario.rol
+        rol.nombre = 'miembro'
+        rol.save()
+        self.assertEqual(self._perfil().data['rol'], 'miembro')
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self._perfil().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_roles_cacheados_en_altas(self):
+        """Test para verificar que las altas no vuelven a consultar el rol"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Rol.objects.por_nombre('usuario')
+
+        with self.assertNumQueries(1):
+            get_user_model().objects.create_user(email="otro@example.com", nombre="Otro", password="x")
+
+    def test_login_sin_consultas_extra_de_rol(self):
+        """Test para verificar que el login obtiene el rol con el usuario"""
+        with self.assertNumQueries(1):
+            respuesta = self.client.post(
+                '/api/usuarios/login/',
+                {'email': 'cache@example.com', 'password': 'testpass123'},
+                format='json',
+            )
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['rol'], 'usuario')